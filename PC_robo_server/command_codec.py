@@ -0,0 +1,63 @@
+import struct
+import base64
+import numpy as np
+
+# Command packet: header, then one little-endian float32 per device in the order of the device index sent with the
+# GPIO_setups, NaN for a device without a command yet.
+# header: magic, version, device count, sequence number, setups_id (CTime_ID of the GPIO_setups), event_ns (monotonic
+# stamp of the snapshot), send_ns (stamped by the sender, 0 if not traced)
+HEADER = struct.Struct('<2sBBIqqq')
+MAGIC = b'GC'
+VERSION = 1
+SEND_NS_OFFSET = HEADER.size - 8
+
+def packet_header(packet):
+    magic, version, count, seq, setups_id, event_ns, send_ns = HEADER.unpack_from(packet)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f'Not a command packet of version {VERSION}')
+    return {'count': count, 'seq': seq, 'setups_id': setups_id, 'event_ns': event_ns, 'send_ns': send_ns}
+
+def stamp_send(packet, send_ns):
+    stamped = bytearray(packet)
+    struct.pack_into('<q', stamped, SEND_NS_OFFSET, send_ns)
+    return bytes(stamped)
+
+def to_text(packet):
+    # NetGear return_data goes out as JSON
+    return base64.b64encode(packet).decode('ascii')
+
+class CommandEncoder(object):
+    """
+    Encodes {device_name: value} snapshots into command packets with the device index of one GPIO_setups handshake.
+    devices is the index (GPIO_setups names in order), setups_id the CTime_ID the GPIO_setups are sent with; the robot
+    drops packets of another setups_id. Values of names not in the index are dropped.
+    """
+    def __init__(self, devices, setups_id):
+        self.devices = list(devices)
+        self.setups_id = setups_id
+        self.index = {name: index for index, name in enumerate(self.devices)}
+        self.seq = 0
+        self.unknown_names = set()
+
+    def values(self, command_values):
+        values = np.full(len(self.devices), np.nan, dtype='<f4')
+        for name, value in command_values.items():
+            index = self.index.get(name)
+            if index is None:
+                self.unknown_names.add(name)
+            else:
+                values[index] = value
+        return values
+
+    def encode(self, command_values, event_ns=0):
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        values = command_values if isinstance(command_values, np.ndarray) else self.values(command_values)
+        return HEADER.pack(MAGIC, VERSION, len(self.devices), self.seq, self.setups_id, event_ns, 0) + values.astype('<f4').tobytes()
+
+    def decode_values(self, packet):
+        """Values of packet as a writable float32 array in index order."""
+        return np.frombuffer(packet, dtype='<f4', count=len(self.devices), offset=HEADER.size).copy()
+
+    def replace_values(self, packet, values):
+        """packet with the same header and new values."""
+        return packet[:HEADER.size] + values.astype('<f4').tobytes()
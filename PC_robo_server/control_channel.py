@@ -0,0 +1,44 @@
+import zmq
+import uuid
+import time
+from command_codec import stamp_send
+
+class ControlSender(object):
+    """
+    Sending end of the optional control channel: a ZMQ PUSH socket bound on the PC, separate from the NetGear video link.
+    Command packets carry their sequence number and session (setups_id) and go out as they are, dict snapshots get a
+    session id and a sequence number, so the robot can discard stale ones.
+    Only the newest unsent snapshot is queued (ZMQ_CONFLATE), commands never wait behind video frames or older commands.
+    Sends never block: while no robot is connected a snapshot is counted in dropped instead, the next one replaces it.
+    """
+    def __init__(self, options):
+        self.context = zmq.Context.instance()
+        self.socket = self.context.socket(zmq.PUSH)
+        self.socket.setsockopt(zmq.CONFLATE, 1)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.bind(f"tcp://{options.get('bind_address', '*')}:{options['port']}")
+        self.session = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.dropped = 0
+
+    def _send(self, send_funct, message):
+        try:
+            send_funct(message, flags=zmq.NOBLOCK)
+            return True
+        except zmq.Again:
+            self.dropped += 1
+            return False
+
+    def send(self, ctrl_proc_msg):
+        if isinstance(ctrl_proc_msg, bytes):
+            self._send(self.socket.send, stamp_send(ctrl_proc_msg, time.monotonic_ns()))
+            return
+        self.seq += 1
+        snapshot = dict(ctrl_proc_msg, session=self.session, seq=self.seq)
+        if 'trace' in snapshot:
+            snapshot['trace'] = dict(snapshot['trace'], send_ns=time.monotonic_ns())
+        if self._send(self.socket.send_json, snapshot):
+            return self.seq
+
+    def close(self):
+        self.socket.close()
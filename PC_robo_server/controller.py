@@ -3,35 +3,28 @@
 # add in ControllerTransformer XYfunct that is triggered by 2 different controlls
 
 import inputs
-from functools import partial
 import time
-import importlib
-
-def get_value_from_nested_dict(nested_dict, target_key):
-    for key, value in nested_dict.items():
-        if isinstance(value, dict):
-            if target_key in value:
-                return key, value[target_key]
-    return None
+import numpy as np
 
 class Controller(object):
     def __init__(self, gamepad=None):
         self.controls_states = {}
         self.last_event = {}
+        self.last_events = {}
+        self.last_events_ns = None
         self.gamepad = gamepad
         if not gamepad:
             self._get_gamepad()
 
     def _get_gamepad(self):
         """Get a gamepad object."""
-        while True:
-            importlib.reload(inputs)
-            try:
-                self.gamepad = inputs.devices.gamepads[0]
-                break
-            except IndexError:
-                print("No gamepad found.")
-                time.sleep(1)
+        gamepads = inputs.devices.gamepads
+        while not gamepads:
+            print("No gamepad found.")
+            time.sleep(1)
+            # a new DeviceManager rescans the input devices, no module reload needed
+            gamepads = inputs.DeviceManager().gamepads
+        self.gamepad = gamepads[0]
 
     def add_unknown_event(self, event, key):
         """Deal with unknown events."""
@@ -53,112 +46,164 @@ class Controller(object):
             self.add_unknown_event(event, key)
         return {key : event.state}
 
+    def read_events(self):
+        """Read once and merge the events like process_events(), raises inputs.UnpluggedError when the gamepad is gone."""
+        self.last_events = {}
+        events = self.gamepad.read()
+        self.last_events_ns = time.monotonic_ns()
+        for event in events:
+            self.last_event = self.process_event(event)
+            if self.last_event:
+                self.last_events.update(self.last_event)
+        return self.last_events
+
     def process_events(self):
-        """Process available events."""
+        """Process available events, last_events holds the merged state of every control changed in this read."""
         try:
-            events = self.gamepad.read()
+            return self.read_events()
         except EOFError:
-            events = []
+            self.last_events = {}
         except inputs.UnpluggedError:
             print("Gamepad disconnected")
+            self.last_events = {}
             time.sleep(1)
-            return
-        for event in events:
-            self.last_event = self.process_event(event)
+        return self.last_events
 
-class ControllerTransformer(object):
+def XY_mix(X_value, Y_value, max_turn_L, max_turn_R):
+    # Left and Right outputs of an XYfunct pair: X_value < 0 turns left, the inner wheel moves towards 0 by max_turn * |X|
+    if X_value >= 0:
+        if Y_value >= 0:
+            return Y_value, Y_value - max_turn_R * X_value
+        return Y_value, Y_value + max_turn_R * X_value
+    if Y_value >= 0:
+        return Y_value + max_turn_L * X_value, Y_value
+    return Y_value - max_turn_L * X_value, Y_value
+
+def _exact_writer(return_name):
+    def write(outputs, value):
+        outputs[return_name] = value
+    return write
+
+def _normalization_writer(return_name, ctrl_min, ctrl_span, out_min, out_span):
+    def write(outputs, value):
+        outputs[return_name] = out_min + (value - ctrl_min) / ctrl_span * out_span
+    return write
+
+def _XY_writer(state, axis, ctrl_min, ctrl_span, out_min, out_span, max_turn_L, max_turn_R, return_name, return_only_value):
+    left_name, right_name = f'{return_name}_Left', f'{return_name}_Right'
+    def write(outputs, value):
+        state[axis] = out_min + (value - ctrl_min) / ctrl_span * out_span
+        left, right = XY_mix(state[0], state[1], max_turn_L, max_turn_R)
+        if return_only_value:
+            outputs[left_name] = left
+            outputs[right_name] = right
+        else:
+            outputs[return_name] = {left_name: left, right_name: right}
+    return write
+
+class TransformTable(object):
+    """
+    controls_GPIO compiled once. Every control gets a row of (ctrl_min, ctrl_span, out_min, out_span), exact_func rows
+    pass the value through, XYfunct controls are paired by return_name into (X row, Y row, max_turn_L, max_turn_R).
+    writers holds the same coefficients bound per control, writer(outputs, value) stores the transformed value(s) in
+    outputs; ControllerTransformer uses them for the events of one read. transform() maps whole state vectors (raw control
+    values in `controls` order) to the `outputs` with NumPy, with the operations of the writers and XY_mix in the same
+    order so the results are identical. The two axes of an XYfunct share the held X and Y values.
+    """
     def __init__(self, transform_json):
-        self.transform_json = transform_json
-        self.last_transformed_values = {}
-        self._prepare_transform_json()
-
-    def normalization_func(self, key_value, ctrl_json):
-        return ctrl_json['output_range']["min"] + (key_value[1] - ctrl_json['ctrl_range']['min']) / (ctrl_json['ctrl_range']["max"] - ctrl_json['ctrl_range']['min']) * (ctrl_json['output_range']["max"] - ctrl_json['output_range']["min"])
-    
-    def exact_func(self, key_value):
-        return key_value[1]
-
-    class XY_transformation(object):
-        def __init__(self):
-            self.ctrl_json = {}
-            self.X_value = 0
-            self.Y_value = 0
-            self.max_turn_L = 0
-            self.max_turn_R = 0
-            self.return_name_prefix = ''
-
-        def normalization_func(self, value, ctrl_json):
-            return ctrl_json['output_range']["min"] + (value - ctrl_json['ctrl_range']['min']) / (ctrl_json['ctrl_range']["max"] - ctrl_json['ctrl_range']['min']) * (ctrl_json['output_range']["max"] - ctrl_json['output_range']["min"])
-
-        def XY_transformed(self, key_value = None, ctrl_json = None):
-            if ctrl_json is not None:
-                self.ctrl_json.update(ctrl_json)
-                name, axis = get_value_from_nested_dict(ctrl_json, 'XYfunct_axis')
-                if axis == 'X':
-                    self.X_name = name
-                elif axis == 'Y':
-                    self.Y_name = name
-                _, max_turn_LR = get_value_from_nested_dict(ctrl_json, 'max_turn_LR')
-                self.max_turn_L, self.max_turn_R = max_turn_LR
-                _, self.return_name_prefix = get_value_from_nested_dict(ctrl_json, 'return_name')
-                return
-
-            if self.X_name == key_value[0]:
-                self.X_value = self.normalization_func(key_value[1], self.ctrl_json[key_value[0]])
-                
-            elif self.Y_name == key_value[0]:
-                self.Y_value = self.normalization_func(key_value[1], self.ctrl_json[key_value[0]])
-
-            if self.X_value >= 0:
-                if self.Y_value >= 0:
-                    return {f"{self.return_name_prefix}_Left": self.Y_value, f"{self.return_name_prefix}_Right": self.Y_value - self.max_turn_R * self.X_value}
+        self.controls = []
+        self.writers = {}
+        coefficients = []
+        direct_rows = []
+        pairs = {}
+        for key, ctrl_json in transform_json.items():
+            used_funct = ctrl_json['used_funct']
+            if used_funct == 'exact_func':
+                self.writers[key] = _exact_writer(ctrl_json['return_name'])
+                direct_rows.append((len(self.controls), ctrl_json['return_name']))
+                coefficients.append((0, 1, 0, 1))
+            elif used_funct in ('normalization_func', 'XYfunct'):
+                ctrl_min = ctrl_json['ctrl_range']['min']
+                ctrl_span = ctrl_json['ctrl_range']['max'] - ctrl_min
+                out_min = ctrl_json['output_range']['min']
+                out_span = ctrl_json['output_range']['max'] - out_min
+                if used_funct == 'normalization_func':
+                    self.writers[key] = _normalization_writer(ctrl_json['return_name'], ctrl_min, ctrl_span, out_min, out_span)
+                    direct_rows.append((len(self.controls), ctrl_json['return_name']))
                 else:
-                    return {f"{self.return_name_prefix}_Left": self.Y_value, f"{self.return_name_prefix}_Right": self.Y_value + self.max_turn_R * self.X_value}
+                    pair = pairs.setdefault(ctrl_json['return_name'], {'state': [0, 0]})
+                    pair[ctrl_json['XYfunct_axis']] = len(self.controls)
+                    max_turn_L, max_turn_R = ctrl_json['max_turn_LR']
+                    self.writers[key] = _XY_writer(pair['state'], 0 if ctrl_json['XYfunct_axis'] == 'X' else 1,
+                                                   ctrl_min, ctrl_span, out_min, out_span, max_turn_L, max_turn_R,
+                                                   ctrl_json['return_name'], ctrl_json.get('return_only_value', False))
+                    pair['max_turn_LR'] = (max_turn_L, max_turn_R)
+                coefficients.append((ctrl_min, ctrl_span, out_min, out_span))
             else:
-                if self.Y_value >= 0:
-                    return {f"{self.return_name_prefix}_Left": self.Y_value + self.max_turn_L * self.X_value,f"{self.return_name_prefix}_Right": self.Y_value}
-                else:
-                    return {f"{self.return_name_prefix}_Left": self.Y_value - self.max_turn_L * self.X_value, f"{self.return_name_prefix}_Right": self.Y_value}
+                continue
+            self.controls.append(key)
+        for return_name, pair in pairs.items():
+            if 'X' not in pair or 'Y' not in pair:
+                raise ValueError(f'XYfunct {return_name} needs an X and a Y axis')
+        self.ctrl_min, self.ctrl_span, self.out_min, self.out_span = np.array(coefficients, dtype=np.float64).reshape(-1, 4).T
+        self.direct_rows = np.array([row for row, _ in direct_rows], dtype=np.intp)
+        self.X_rows = np.array([pair['X'] for pair in pairs.values()], dtype=np.intp)
+        self.Y_rows = np.array([pair['Y'] for pair in pairs.values()], dtype=np.intp)
+        self.max_turn_L, self.max_turn_R = np.array([pair['max_turn_LR'] for pair in pairs.values()], dtype=np.float64).reshape(-1, 2).T
+        self.outputs = ([name for _, name in direct_rows] + [f'{name}_Left' for name in pairs] +
+                        [f'{name}_Right' for name in pairs])
 
+    def state_vector(self, controls_states, default=0):
+        """Raw control values of a Controller.controls_states in `controls` order, default for the ones not seen yet."""
+        return np.array([controls_states.get(key, default) for key in self.controls], dtype=np.float64)
 
+    def transform(self, states):
+        """Outputs of one state vector or of an (n, controls) array of them, last axis in `outputs` order."""
+        normalized = self.out_min + (np.asarray(states, dtype=np.float64) - self.ctrl_min) / self.ctrl_span * self.out_span
+        X_value = normalized[..., self.X_rows]
+        Y_value = normalized[..., self.Y_rows]
+        # XY_mix on arrays: the inner wheel moves towards 0 by max_turn * |X|, the sign of Y keeps the direction
+        Y_sign = np.where(Y_value >= 0, 1.0, -1.0)
+        left = np.where(X_value >= 0, Y_value, Y_value + Y_sign * self.max_turn_L * X_value)
+        right = np.where(X_value >= 0, Y_value - Y_sign * self.max_turn_R * X_value, Y_value)
+        return np.concatenate((normalized[..., self.direct_rows], left, right), axis=-1)
 
-    def _prepare_transform_json(self):
-        temp_functions = {}
-        for each in self.transform_json:
-            if self.transform_json[each]['used_funct'] == "normalization_func":
-                self.transform_json[each]['funct'] = partial(self.normalization_func, ctrl_json=self.transform_json[each])
-            elif self.transform_json[each]['used_funct'] == "exact_func":
-                self.transform_json[each]['funct'] = partial(self.exact_func)
-            elif self.transform_json[each]['used_funct'] == "XYfunct":
-                if self.transform_json[each]['return_name'] not in temp_functions:
-                    temp_functions[self.transform_json[each]['return_name']] = ControllerTransformer.XY_transformation().XY_transformed
-                if self.transform_json[each]['return_name'] in temp_functions:
-                    self.transform_json[each]['funct'] = temp_functions[self.transform_json[each]['return_name']]
-                    self.transform_json[each]['funct'](ctrl_json={each: self.transform_json[each]})
-            
+class ControllerTransformer(object):
+    def __init__(self, transform_json):
+        self.transform_json = transform_json
+        self.last_transformed_values = {}
+        self.table = TransformTable(transform_json)
 
     def transform_ke(self, event_dict):
-        # returns key-event, where event is transformed trough funct defined
+        # returns key-event, where event is transformed trough the writer of the key
         for key, value in event_dict.items():
-            if key not in self.transform_json:
-                transformed_value = value
-                self.last_transformed_values[key] = transformed_value
-                return {key: transformed_value}
-            elif 'funct' in self.transform_json[key]:
-                transformed_value = self.transform_json[key]['funct'](value)
-                self.last_transformed_values[key] = transformed_value
-                return {key: transformed_value}
-            
+            if key not in self.table.writers:
+                self.last_transformed_values[key] = value
+                return {key: value}
+            transformed_values = {}
+            self.table.writers[key](transformed_values, value)
+            transformed_value = next(iter(transformed_values.values())) if len(transformed_values) == 1 else transformed_values
+            self.last_transformed_values[key] = transformed_value
+            return {key: transformed_value}
+
     def transform_ep(self, event_dict):
-        # returns key-event, where key is the return_name defined and event is transformed trough funct defined
+        # returns key-event, where key is the return_name defined and event is transformed trough the writer of the key
+        for key, value in event_dict.items():
+            if key in self.table.writers:
+                transformed_values = {}
+                self.table.writers[key](transformed_values, value)
+                self.last_transformed_values.update(transformed_values)
+                return transformed_values
+
+    def transform_batch(self, event_dict):
+        # transforms every control of one read and returns only the outputs whose value changed
+        previous_values = dict(self.last_transformed_values)
+        writers = self.table.writers
         for key, value in event_dict.items():
-            if key in self.transform_json:
-                transformed_value = self.transform_json[key]['funct']((key, value))
-                if "return_only_value" in self.transform_json[key] and self.transform_json[key]["return_only_value"]:
-                    self.last_transformed_values.update(transformed_value)
-                    return transformed_value
-                self.last_transformed_values[self.transform_json[key]['return_name']] = transformed_value
-                return {self.transform_json[key]['return_name']: transformed_value}
+            if key in writers:
+                writers[key](self.last_transformed_values, value)
+        return {name: value for name, value in self.last_transformed_values.items()
+                if name not in previous_values or previous_values[name] != value}
 
 def main():
     GPIO_ctrls = {
@@ -221,12 +266,12 @@ def main():
     ctrltrans = ControllerTransformer(GPIO_ctrls)
     while True:
         controller.process_events()
-        if controller.last_event is not None:
+        if controller.last_events:
             print('-------------')
-            print(f'controller.last_event=> {controller.last_event}')
+            print(f'controller.last_events=> {controller.last_events}')
             print(f'controller.controls_state=> {controller.controls_states}')
-            transformed_last_event = ctrltrans.transform_ep(controller.last_event)
-            print(f'transformed_last_event= {transformed_last_event}')
+            changed_values = ctrltrans.transform_batch(controller.last_events)
+            print(f'changed_values= {changed_values}')
             print(f'last_transformed_values= {ctrltrans.last_transformed_values}')
             print('-------------')
 
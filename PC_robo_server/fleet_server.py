@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import asyncio
+import threading
+import concurrent.futures
+import cv2
+from vidgear.gears import NetGear
+from controller import ControllerTransformer
+from gamepad_input import GamepadInput
+from frame_pipeline import LatestFrameSlot, FrameRotator, TileFrameAssembler, H264FrameDecoder, decode_frame
+from tracing import Tracer
+from link_session import LinkSession
+
+class RobotSession(object):
+    """
+    One robot of the fleet: its NetGear link, command mapping, newest frame and stats.
+    Options of a robot entry in configs.json fleet.robots override the top level netgear_options, GPIO_setups and controls_GPIO.
+    """
+    def __init__(self, robot_options, configs):
+        self.name = robot_options['name']
+        self.netgear_options = dict(configs['netgear_options'], **robot_options.get('netgear_options', {}))
+        self.link_session = LinkSession(robot_options.get('GPIO_setups', configs['GPIO_setups']), configs.get('heartbeat', {}))
+        self.ctrltrans = ControllerTransformer(robot_options.get('controls_GPIO', configs['controls_GPIO']))
+        self.gamepad = robot_options.get('gamepad', 0)
+        tracing_options = configs.get('tracing', {'enabled': False})
+        # every robot gets a tracer for its stats, the overlay follows the tracing options
+        self.tracer = Tracer(tracing_options)
+        self.overlay_enabled = tracing_options['enabled'] and self.tracer.overlay_enabled
+        self.frame_slot = LatestFrameSlot()
+        self.frame_rotator = FrameRotator()
+        self.stream_decoders = (TileFrameAssembler(), H264FrameDecoder())
+        self.ctrl_proc_msg = None
+        self.client = None
+
+    def on_events(self, events, events_ns):
+        changed_values = self.ctrltrans.transform_batch(events)
+        if changed_values:
+            self.ctrl_proc_msg = {
+                'CTime_ID': time.monotonic_ns(),
+                'GPIO_command': dict(self.ctrltrans.last_transformed_values),
+                'trace': {'event_ns': events_ns}
+            }
+
+    def on_received(self, received_data):
+        other_received_data, frame = received_data
+        frame_stamp = self.tracer.on_frame_received(other_received_data, frame) if frame is not None else None
+        assembled_frame = frame
+        for stream_decoder in self.stream_decoders:
+            assembled_frame = stream_decoder.apply(assembled_frame, other_received_data)
+        if assembled_frame is None and frame is not None:
+            return
+        frame = assembled_frame
+        if self.frame_slot.put((other_received_data, frame, frame_stamp)):
+            self.tracer.on_frame_dropped()
+
+    def prepare_frame(self, received_item):
+        other_received_data, frame, frame_stamp = received_item
+        frame = self.frame_rotator.rotate(decode_frame(frame, other_received_data), other_received_data)
+        if self.overlay_enabled:
+            frame = self.tracer.overlay(frame)
+        return frame
+
+    def summary(self):
+        return dict(self.tracer.summary(), reconnects=self.link_session.reconnects,
+                    **self.stream_decoders[0].stats(), **self.stream_decoders[1].stats())
+
+class FleetServer(object):
+    """
+    Drives several robots from one process on one asyncio loop.
+    Each robot has a link task around its blocking NetGear recv (run in a thread pool), the reads of every gamepad
+    (GamepadInput) go to the robots mapped to its slot. One display task shows the newest frame of each
+    robot and one stats task prints and dumps per-robot stats.
+    """
+    def __init__(self, configs):
+        fleet_options = configs['fleet']
+        self.stats_interval_s = fleet_options.get('stats_interval_s', 5)
+        self.stats_path = fleet_options.get('stats_path', 'fleet_stats.json')
+        self.sessions = [RobotSession(robot_options, configs) for robot_options in fleet_options['robots']]
+        self.gamepad_input = GamepadInput(configs.get('gamepad', {}))
+        # two blocking calls per robot at most: recv and decode
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=2 * len(self.sessions) + 2)
+        self.loop = None
+        self.stop_event = None
+
+    def _run(self, function, *args):
+        return self.loop.run_in_executor(self.executor, function, *args)
+
+    def _connect(self, session):
+        session.client = NetGear(**session.netgear_options)
+        session.link_session.on_connect()
+        for stream_decoder in session.stream_decoders:
+            stream_decoder.reset()
+
+    async def _link(self, session):
+        link_session = session.link_session
+        while not self.stop_event.is_set():
+            await self._run(self._connect, session)
+            while not self.stop_event.is_set():
+                return_data = session.tracer.stamp_return_data(link_session.return_data(session.ctrl_proc_msg))
+                try:
+                    received_data = await asyncio.wait_for(self._run(session.client.recv, return_data), link_session.timeout_s)
+                except asyncio.TimeoutError:
+                    print(f"{session.name}: no data for {link_session.timeout_s} seconds, reconnecting NetGear...")
+                    break
+                if not received_data:
+                    break
+                link_session.on_frame(received_data[0])
+                session.on_received(received_data)
+            # close() also ends a recv still blocked in the thread pool
+            await self._run(session.client.close)
+            if not self.stop_event.is_set():
+                link_session.reconnects += 1
+                await asyncio.sleep(link_session.reconnect_delay_s)
+
+    def _dispatch_gamepads(self, sessions_by_gamepad):
+        # one thread hands the reads of every gamepad to the robots mapped to its slot
+        while not self.stop_event.is_set():
+            gamepad_read = self.gamepad_input.get(timeout=0.5)
+            if gamepad_read is None:
+                continue
+            slot, events, read_ns = gamepad_read
+            for session in sessions_by_gamepad.get(slot, []):
+                try:
+                    self.loop.call_soon_threadsafe(session.on_events, dict(events), read_ns)
+                except RuntimeError:
+                    # loop already closed on shutdown
+                    return
+
+    def _start_gamepads(self):
+        sessions_by_gamepad = {}
+        for session in self.sessions:
+            if session.gamepad is not None:
+                sessions_by_gamepad.setdefault(session.gamepad, []).append(session)
+        self.gamepad_input.start()
+        threading.Thread(target=self._dispatch_gamepads, args=(sessions_by_gamepad,), daemon=True).start()
+
+    async def _display(self):
+        while not self.stop_event.is_set():
+            received_items = [(session, session.frame_slot.take(timeout=0)) for session in self.sessions]
+            received_items = [(session, received_item) for session, received_item in received_items if received_item]
+            # frames of different robots are decoded in parallel, imshow stays on the loop thread
+            frames = await asyncio.gather(*[self._run(session.prepare_frame, received_item) for session, received_item in received_items])
+            for (session, received_item), frame in zip(received_items, frames):
+                cv2.imshow(f"Robo Output Frame {session.name}", frame)
+                if received_item[2]:
+                    session.tracer.on_frame_displayed(received_item[2])
+            # check for 'q' key to quit
+            if cv2.waitKey(1) == ord('q'):
+                self.stop_event.set()
+            if not received_items:
+                await asyncio.sleep(0.002)
+        cv2.destroyAllWindows()
+
+    def summary(self):
+        robots = {session.name: session.summary() for session in self.sessions}
+        return {'robots': robots, 'total_fps': round(sum(robot['fps'] for robot in robots.values()), 2),
+                'gamepad_input': self.gamepad_input.summary()}
+
+    def dump(self):
+        temp_path = self.stats_path + '.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(self.summary(), file, indent=2)
+        os.replace(temp_path, self.stats_path)
+
+    async def _stats(self):
+        while not self.stop_event.is_set():
+            await asyncio.sleep(self.stats_interval_s)
+            summary = self.summary()
+            for name, robot in summary['robots'].items():
+                print(f"{name}: fps {robot['fps']} dropped {robot['frames_dropped']} "
+                      f"send_to_apply p50 {robot['latency']['send_to_apply']['p50_ms']} ms reconnects {robot['reconnects']}")
+            await self._run(self.dump)
+
+    def _wait_for_enter(self):
+        input("Press Enter to terminate the fleet server...\n")
+        self.stop_event.set()
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.stop_event = threading.Event()
+        self._start_gamepads()
+        tasks = [asyncio.create_task(self._link(session)) for session in self.sessions]
+        tasks += [asyncio.create_task(self._display()), asyncio.create_task(self._stats())]
+        threading.Thread(target=self._wait_for_enter, daemon=True).start()
+        while not self.stop_event.is_set():
+            await asyncio.sleep(0.1)
+        for task in tasks:
+            task.cancel()
+        for session in self.sessions:
+            if session.client:
+                await self._run(session.client.close)
+        self.dump()
+
+def main(configs):
+    fleet_server = FleetServer(configs)
+    asyncio.run(fleet_server.run())
+    fleet_server.executor.shutdown(wait=False)
+    print("Fleet server terminated.")
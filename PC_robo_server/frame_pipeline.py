@@ -0,0 +1,165 @@
+import threading
+import numpy as np
+import cv2
+import simplejpeg
+
+def decode_frame(frame, message):
+    # frames JPEG encoded by the robot's adaptive video arrive as 1-D byte arrays described by message['video_params']
+    if frame is None:
+        return np.zeros((480, 640, 3), dtype=np.uint8)
+    if frame.ndim == 1 and message and 'video_params' in message:
+        video_params = message['video_params']
+        frame = simplejpeg.decode_jpeg(frame, colorspace=video_params['colorspace'], fastdct=True)
+        if video_params['scale'] > 1:
+            frame = cv2.resize(frame, tuple(video_params['frame_size']), interpolation=cv2.INTER_LINEAR)
+    return frame
+
+class LatestFrameSlot(object):
+    """
+    Hand-off of received frames from the NetGear receive thread to the display loop, latest frame wins.
+    A frame that is replaced before the display loop took it counts as dropped, the receive thread never waits for display.
+    """
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._item = None
+        self.received = 0
+        self.dropped = 0
+        self.displayed = 0
+
+    def put(self, item):
+        """Store item as the newest frame, return True if an undisplayed frame was dropped for it."""
+        with self._condition:
+            dropped = self._item is not None
+            self._item = item
+            self.received += 1
+            self.dropped += dropped
+            self._condition.notify()
+        return dropped
+
+    def take(self, timeout=None):
+        """Return the newest frame not taken yet, None if none arrives within timeout."""
+        with self._condition:
+            if self._item is None:
+                self._condition.wait(timeout)
+            item, self._item = self._item, None
+            if item is not None:
+                self.displayed += 1
+            return item
+
+    def stats(self):
+        return {'frames_received': self.received, 'frames_dropped': self.dropped, 'frames_displayed': self.displayed}
+
+class TileFrameAssembler(object):
+    """
+    Rebuilds the frames of the robot's tile video in a persistent buffer.
+    Every message has to be applied in order, so this runs in the receive thread: a keyframe replaces the buffer, a delta
+    frame writes its tiles into it. Deltas before the first keyframe are skipped. Other frames pass through unchanged.
+    """
+    def __init__(self):
+        self._buffer = None
+        self.keyframes = 0
+        self.delta_frames = 0
+        self.skipped = 0
+
+    def reset(self):
+        """Drop the buffer on a new connection, deltas are skipped until the next keyframe."""
+        self._buffer = None
+
+    def apply(self, frame, message):
+        """Return a copy of the rebuilt frame, None while waiting for a keyframe."""
+        video_params = message.get('video_params') if isinstance(message, dict) else None
+        if frame is None or not video_params or video_params.get('encoding') != 'tiles':
+            return frame
+        tile_size = video_params['tile_size']
+        width, height = video_params['frame_size']
+        if video_params['keyframe']:
+            decoded = simplejpeg.decode_jpeg(frame, colorspace=video_params['colorspace'], fastdct=True)
+            padded_shape = (-(-height // tile_size) * tile_size, -(-width // tile_size) * tile_size, decoded.shape[2])
+            if self._buffer is None or self._buffer.shape != padded_shape:
+                self._buffer = np.zeros(padded_shape, dtype=np.uint8)
+            self._buffer[:height, :width] = decoded
+            self.keyframes += 1
+        elif self._buffer is None or self._buffer.shape[0] < height or self._buffer.shape[1] < width:
+            self.skipped += 1
+            return None
+        else:
+            if video_params['tiles']:
+                strip = simplejpeg.decode_jpeg(frame, colorspace=video_params['colorspace'], fastdct=True)
+                tile_cols = self._buffer.shape[1] // tile_size
+                rows, cols = np.divmod(np.asarray(video_params['tiles']), tile_cols)
+                tiles_view = self._buffer.reshape(self._buffer.shape[0] // tile_size, tile_size, tile_cols, tile_size, self._buffer.shape[2])
+                tiles_view[rows, :, cols] = strip.reshape(len(rows), tile_size, tile_size, strip.shape[2])
+            self.delta_frames += 1
+        # the display loop and the relay get their own copy, the next delta already writes into the buffer
+        return self._buffer[:height, :width].copy()
+
+    def stats(self):
+        return {'tile_keyframes': self.keyframes, 'tile_delta_frames': self.delta_frames, 'tile_frames_skipped': self.skipped}
+
+class H264FrameDecoder(object):
+    """
+    Decodes the H.264 stream of the robot's hardware encoder with PyAV, needed only for camera_config encoder h264.
+    Like tile video every buffer has to be decoded in order, so this runs in the receive thread. Buffers before the first
+    keyframe or after a decode error up to the next keyframe are skipped. Other frames pass through unchanged.
+    """
+    def __init__(self):
+        self._av = None
+        self._codec = None
+        self.decoded = 0
+        self.skipped = 0
+        self.errors = 0
+
+    def reset(self):
+        """Drop the decoder on a new connection, buffers are skipped until the next keyframe."""
+        self._codec = None
+
+    def apply(self, frame, message):
+        """Return the decoded BGR frame, None while waiting for a keyframe."""
+        video_params = message.get('video_params') if isinstance(message, dict) else None
+        if frame is None or not video_params or video_params.get('encoding') != 'h264':
+            return frame
+        if self._codec is None:
+            if not video_params['keyframe']:
+                self.skipped += 1
+                return None
+            if self._av is None:
+                import av
+                self._av = av
+            self._codec = self._av.CodecContext.create('h264', 'r')
+        decoded = None
+        try:
+            # one buffer of the hardware encoder is one whole frame, no parser needed
+            for video_frame in self._codec.decode(self._av.Packet(frame.tobytes())):
+                decoded = video_frame.to_ndarray(format='bgr24')
+        except self._av.error.FFmpegError as exp:
+            print(f"H.264 decode error, waiting for the next keyframe: {exp}")
+            self._codec = None
+            self.errors += 1
+            return None
+        if decoded is None:
+            self.skipped += 1
+            return None
+        self.decoded += 1
+        return decoded
+
+    def stats(self):
+        return {'h264_frames_decoded': self.decoded, 'h264_frames_skipped': self.skipped, 'h264_decode_errors': self.errors}
+
+def camera_rotated(message):
+    # robots rotating with libcamera report it, older robots send the camera image upside down
+    return isinstance(message, dict) and message.get('camera_rotation') == 180
+
+class FrameRotator(object):
+    """
+    Rotates frames by 180 degrees in one pass into a reused contiguous buffer, ready for imshow and overlays.
+    Frames the robot's camera already rotated pass through.
+    """
+    def __init__(self):
+        self._buffer = None
+
+    def rotate(self, frame, message=None):
+        if camera_rotated(message):
+            return frame
+        if self._buffer is None or self._buffer.shape != frame.shape or self._buffer.dtype != frame.dtype:
+            self._buffer = frame.copy()
+        return cv2.flip(frame, -1, dst=self._buffer)
@@ -0,0 +1,135 @@
+import queue
+import threading
+import numpy as np
+import inputs
+from controller import Controller
+from tracing import LatencyHistogram
+
+def scan_gamepads():
+    # a new DeviceManager rescans the input devices, no module reload needed
+    return inputs.DeviceManager().gamepads
+
+def device_key(gamepad):
+    try:
+        return gamepad.get_char_device_path()
+    except AttributeError:
+        return id(gamepad)
+
+class PollingStats(object):
+    """Read intervals of one gamepad: polling rate, jitter (standard deviation) and interval percentiles."""
+    def __init__(self):
+        self.reads = 0
+        self.events = 0
+        self.intervals = LatencyHistogram()
+        self._last_read_ns = None
+        self._mean_ns = 0.0
+        self._m2 = 0.0
+
+    def on_connect(self):
+        # the time unplugged is not a read interval
+        self._last_read_ns = None
+
+    def on_read(self, read_ns, events):
+        self.reads += 1
+        self.events += events
+        if self._last_read_ns is not None:
+            interval_ns = read_ns - self._last_read_ns
+            self.intervals.record(interval_ns)
+            # Welford running variance
+            count = self.intervals.total
+            delta = interval_ns - self._mean_ns
+            self._mean_ns += delta / count
+            self._m2 += delta * (interval_ns - self._mean_ns)
+        self._last_read_ns = read_ns
+
+    def summary(self):
+        count = self.intervals.total
+        return {'reads': self.reads, 'events': self.events,
+                'poll_hz': round(1e9 / self._mean_ns, 1) if count else None,
+                'jitter_ms': round(np.sqrt(self._m2 / count) / 1e6, 3) if count else None,
+                'interval_ms': {key: value for key, value in self.intervals.summary().items() if key != 'count'}}
+
+class GamepadInput(object):
+    """
+    Event-driven input layer: every gamepad is read on its own thread and the merged control states of each read arrive
+    as (slot, events, read_ns) on a queue, so the consumer never blocks in gamepad.read().
+    Gamepads keep their slot while plugged in, an unplugged gamepad frees its slot. The devices are scanned once at start
+    and then only while no gamepad is attached or fewer than before an unplug, every rescan_interval_s until it is back.
+    scan_gamepads can be replaced by a replayed event source.
+    """
+    def __init__(self, options=None, scan_gamepads=scan_gamepads):
+        options = options or {}
+        self.rescan_interval_s = options.get('rescan_interval_s', 1)
+        self.max_gamepads = options.get('max_gamepads', 4)
+        self.scan_gamepads = scan_gamepads
+        self.events = queue.SimpleQueue()
+        self.stats = {}
+        self.connects = 0
+        self._slots = {}
+        # most gamepads attached at once, a rescan looks for the ones unplugged since
+        self._expected = 0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._watch_devices, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+
+    def get(self, timeout=None):
+        """Return the next (slot, events, read_ns), None if nothing arrives within timeout (0: do not wait)."""
+        try:
+            return self.events.get(timeout=timeout) if timeout != 0 else self.events.get_nowait()
+        except queue.Empty:
+            return None
+
+    def connected(self):
+        with self._lock:
+            return sorted(self._slots.values())
+
+    def _watch_devices(self):
+        while not self._stop_event.is_set():
+            with self._lock:
+                missing = not self._slots or len(self._slots) < self._expected
+            if missing:
+                try:
+                    gamepads = self.scan_gamepads()
+                except OSError:
+                    gamepads = []
+                for gamepad in gamepads:
+                    self._attach(gamepad)
+            self._stop_event.wait(self.rescan_interval_s)
+
+    def _attach(self, gamepad):
+        key = device_key(gamepad)
+        with self._lock:
+            if key in self._slots or len(self._slots) >= self.max_gamepads:
+                return
+            slot = min(set(range(self.max_gamepads)) - set(self._slots.values()))
+            self._slots[key] = slot
+            self._expected = max(self._expected, len(self._slots))
+            self.connects += 1
+        self.stats.setdefault(slot, PollingStats()).on_connect()
+        print(f"Gamepad {slot} connected: {getattr(gamepad, 'name', key)}")
+        threading.Thread(target=self._read_gamepad, args=(gamepad, key, slot), daemon=True).start()
+
+    def _read_gamepad(self, gamepad, key, slot):
+        controller = Controller(gamepad=gamepad)
+        try:
+            while not self._stop_event.is_set():
+                events = controller.read_events()
+                read_ns = controller.last_events_ns
+                self.stats[slot].on_read(read_ns, len(events))
+                if events:
+                    self.events.put((slot, events, read_ns))
+        except (inputs.UnpluggedError, OSError, EOFError):
+            print(f"Gamepad {slot} disconnected")
+        finally:
+            with self._lock:
+                del self._slots[key]
+
+    def summary(self):
+        return {'connected': self.connected(), 'connects': self.connects,
+                'gamepads': {slot: stats.summary() for slot, stats in self.stats.items()}}
@@ -0,0 +1,43 @@
+import time
+import uuid
+from command_codec import to_text
+
+class LinkSession(object):
+    """
+    PC side of one robot link across NetGear reconnects.
+    The GPIO_setups message gets one CTime_ID for the lifetime of the session and is sent as return_data until the robot
+    reports it in message['session']['setups_id'], then the commands follow. A reconnect to a robot that still has these
+    setups resumes with the commands at once, a restarted robot gets the setups again.
+    The setups carry the device index of the command packets, packets go out as base64 text (return_data is JSON).
+    Frames are the heartbeat: no frame for timeout_s means the link is lost.
+    Every frame is answered with a dict, at least the session, a None reply on the robot means the frame was lost.
+    """
+    def __init__(self, GPIO_setups, options, setups_id=None):
+        self.session_id = uuid.uuid4().hex[:8]
+        self.setups_msg = {'CTime_ID': setups_id or time.monotonic_ns(), 'GPIO_setups': GPIO_setups,
+                           'device_index': list(GPIO_setups)}
+        self.timeout_s = options.get('timeout_s', 2)
+        self.reconnect_delay_s = options.get('reconnect_delay_s', 0.2)
+        self.robot_setups_id = None
+        self.last_frame_time = time.monotonic()
+        self.reconnects = 0
+        self.setups_sent = 0
+
+    def on_connect(self):
+        self.last_frame_time = time.monotonic()
+
+    def on_frame(self, message):
+        self.last_frame_time = time.monotonic()
+        if isinstance(message, dict) and 'session' in message:
+            self.robot_setups_id = message['session'].get('setups_id')
+
+    def expired(self):
+        return time.monotonic() - self.last_frame_time > self.timeout_s
+
+    def return_data(self, ctrl_proc_msg):
+        if self.robot_setups_id != self.setups_msg['CTime_ID']:
+            self.setups_sent += 1
+            return dict(self.setups_msg, session=self.session_id)
+        if isinstance(ctrl_proc_msg, bytes):
+            return {'command_packet': to_text(ctrl_proc_msg), 'session': self.session_id}
+        return dict(ctrl_proc_msg, session=self.session_id) if ctrl_proc_msg else {'session': self.session_id}
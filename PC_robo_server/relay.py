@@ -0,0 +1,160 @@
+import json
+import threading
+import collections
+import http.server
+import socketserver
+import zmq
+import simplejpeg
+from frame_pipeline import LatestFrameSlot, camera_rotated
+
+VIEWER_PAGE = b"""<html><body style="margin:0;background:#000">
+<img src="/stream" style="transform:rotate(%ddeg);max-width:100%%">
+</body></html>"""
+
+class Subscriber(object):
+    """Bounded queue of one viewer, the oldest payload is dropped when the viewer falls behind."""
+    def __init__(self, queue_size):
+        self._condition = threading.Condition()
+        self._payloads = collections.deque(maxlen=queue_size)
+        self.sent = 0
+        self.dropped = 0
+
+    def put(self, payload):
+        with self._condition:
+            self.dropped += len(self._payloads) == self._payloads.maxlen
+            self._payloads.append(payload)
+            self._condition.notify()
+
+    def get(self, timeout=None):
+        with self._condition:
+            if not self._payloads:
+                self._condition.wait(timeout)
+            if not self._payloads:
+                return None
+            self.sent += 1
+            return self._payloads.popleft()
+
+class _MJPEGServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class _MJPEGHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/':
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.end_headers()
+            self.wfile.write(VIEWER_PAGE % (0 if self.server.relay.camera_rotated else 180))
+            return
+        if self.path != '/stream':
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
+        self.end_headers()
+        subscriber = self.server.relay.subscribe()
+        try:
+            while not self.server.relay.closed:
+                payload = subscriber.get(timeout=1)
+                if payload is None:
+                    continue
+                self.wfile.write(b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n' % len(payload))
+                self.wfile.write(payload)
+                self.wfile.write(b'\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.server.relay.unsubscribe(subscriber)
+
+    def log_message(self, format, *args):
+        pass
+
+class FrameRelay(object):
+    """
+    Rebroadcasts the robot video to extra local viewers, as MJPEG over HTTP and/or on a ZMQ PUB socket.
+    JPEG payloads from the robot's adaptive video are forwarded as they arrived, frames NetGear already decoded are
+    encoded once for all viewers. Frames are unrotated, viewers rotate them by 180 degrees like the PC display unless the
+    robot's camera already did.
+    The receive thread only hands the newest frame over, a slow viewer drops frames from its own bounded queue
+    (ZMQ: send high water mark) and never delays the robot link.
+    """
+    def __init__(self, options):
+        self.queue_size = options.get('queue_size', 2)
+        self.jpeg_quality = options.get('jpeg_quality', 80)
+        self.closed = False
+        self.frames_relayed = 0
+        self.frames_encoded = 0
+        self.camera_rotated = False
+        self._frame_slot = LatestFrameSlot()
+        self._subscribers = []
+        self._subscribers_lock = threading.Lock()
+        self.http_server = None
+        self.pub_socket = None
+        if options.get('http_port'):
+            self.http_server = _MJPEGServer((options.get('bind_address', ''), int(options['http_port'])), _MJPEGHandler)
+            self.http_server.relay = self
+            threading.Thread(target=self.http_server.serve_forever, daemon=True).start()
+        if options.get('zmq_port'):
+            self.pub_socket = zmq.Context.instance().socket(zmq.PUB)
+            self.pub_socket.setsockopt(zmq.SNDHWM, self.queue_size)
+            self.pub_socket.setsockopt(zmq.LINGER, 0)
+            self.pub_socket.bind(f"tcp://{options.get('bind_address') or '*'}:{options['zmq_port']}")
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def subscribe(self):
+        subscriber = Subscriber(self.queue_size)
+        with self._subscribers_lock:
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._subscribers_lock:
+            self._subscribers.remove(subscriber)
+
+    def publish(self, frame, message):
+        """Called from the receive thread with every received frame, returns at once."""
+        if frame is not None:
+            self._frame_slot.put((frame, message))
+
+    def _payload(self, frame, message):
+        if frame.ndim == 1 and message and 'video_params' in message:
+            return frame.data, message['video_params']
+        self.frames_encoded += 1
+        colorspace = 'BGR' if frame.shape[2] == 3 else 'BGRX'
+        return simplejpeg.encode_jpeg(frame, quality=self.jpeg_quality, colorspace=colorspace, fastdct=True), None
+
+    def _run(self):
+        while not self.closed:
+            received_item = self._frame_slot.take(timeout=0.5)
+            if received_item is None:
+                continue
+            payload, video_params = self._payload(*received_item)
+            self.camera_rotated = camera_rotated(received_item[1])
+            with self._subscribers_lock:
+                subscribers = list(self._subscribers)
+            for subscriber in subscribers:
+                subscriber.put(payload)
+            if self.pub_socket:
+                metadata = {'rotate_180': not self.camera_rotated, 'video_params': video_params}
+                try:
+                    self.pub_socket.send_multipart([json.dumps(metadata).encode(), payload], flags=zmq.NOBLOCK, copy=False)
+                except zmq.Again:
+                    pass
+            self.frames_relayed += 1
+
+    def stats(self):
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        return {'frames_relayed': self.frames_relayed, 'frames_encoded': self.frames_encoded,
+                'frames_dropped': self._frame_slot.dropped, 'http_viewers': len(subscribers),
+                'http_viewer_drops': [subscriber.dropped for subscriber in subscribers]}
+
+    def close(self):
+        self.closed = True
+        self._thread.join(timeout=2)
+        if self.http_server:
+            self.http_server.shutdown()
+            self.http_server.server_close()
+        if self.pub_socket:
+            self.pub_socket.close()
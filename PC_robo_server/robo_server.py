@@ -1,72 +1,202 @@
 from vidgear.gears import NetGear
-import numpy as np
 import cv2
 import multiprocessing
-import datetime
-from controller import Controller, ControllerTransformer
+import threading
+from controller import ControllerTransformer
+from gamepad_input import GamepadInput
+from control_channel import ControlSender
+from command_codec import CommandEncoder
+from tracing import Tracer
+import fleet_server
+from frame_pipeline import LatestFrameSlot, FrameRotator, TileFrameAssembler, H264FrameDecoder, decode_frame
+from vision import VisionStage
+from relay import FrameRelay
+from link_session import LinkSession
 import time
 import json
+import sys
 
 def controller_process(shared_variable):
     controls_GPIO = shared_variable['controls_GPIO']
-    controller = Controller()
+    gamepad_options = shared_variable['gamepad']
+    gamepad_input = GamepadInput(gamepad_options).start()
     ctrltrans = ControllerTransformer(controls_GPIO)
+    command_encoder = CommandEncoder(**shared_variable['command_layout'])
+    control_sender = ControlSender(shared_variable['control_channel']) if shared_variable['control_channel']['enabled'] else None
+    stats_interval_s = gamepad_options.get('stats_interval_s', 10)
+    next_stats_time = time.monotonic() + stats_interval_s
 
     while True:
-        controller.process_events()
-        ctrl_proc_msg = {
-            'CTime_ID': datetime.datetime.now().isoformat(),
-            'GPIO_command': ctrltrans.transform_ep(controller.last_event) if controller.last_event else ctrltrans.last_transformed_values
-        }
-        shared_variable['ctrl_proc_msg'] = ctrl_proc_msg
-        print(ctrl_proc_msg)
+        # reads arrive from the gamepad threads, the loop never blocks in gamepad.read()
+        gamepad_read = gamepad_input.get(timeout=0.5)
+        if time.monotonic() >= next_stats_time:
+            next_stats_time = time.monotonic() + stats_interval_s
+            print(f"Gamepad input: {gamepad_input.summary()}")
+            if control_sender and control_sender.dropped:
+                print(f"Control channel: {control_sender.dropped} commands dropped while no robot was connected")
+        if gamepad_read is None:
+            continue
+        slot, events, read_ns = gamepad_read
+        if slot != gamepad_options.get('index', 0):
+            continue
+        # all events of one read are applied together, a snapshot is published only when an output changed
+        changed_values = ctrltrans.transform_batch(events)
+        if not changed_values:
+            continue
+        # one packet with every output in the device index order of the GPIO_setups
+        ctrl_proc_msg = command_encoder.encode(ctrltrans.last_transformed_values, event_ns=read_ns)
+        if control_sender:
+            # commands go out at their own rate, NetGear return_data keeps carrying the GPIO_setups
+            control_sender.send(ctrl_proc_msg)
+        else:
+            shared_variable['ctrl_proc_msg'] = ctrl_proc_msg
+
+def receive_frames(shared_variable, tracer, frame_slot, stream_decoders, stop_event, relay=None, vision=None):
+    # network side of client_data_process: receives and hands over the newest frame, never waits for display
+    link_session = LinkSession(shared_variable['GPIO_setups'], shared_variable['heartbeat'],
+                               setups_id=shared_variable['command_layout']['setups_id'])
+    command_encoder = CommandEncoder(**shared_variable['command_layout'])
+    client_lock = threading.Lock()
+    clients = []
 
-def client_data_process(shared_variable):
     def client_connect():
-        netgear_options = shared_variable['netgear_options']
-        GPIO_setups = shared_variable['GPIO_setups']
-        client = NetGear(**netgear_options)
-        received_data = client.recv(return_data=shared_variable['ctrl_proc_msg'])
+        with client_lock:
+            clients[:] = [NetGear(**shared_variable['netgear_options'])]
+            link_session.on_connect()
+            # frames of the old connection may have been lost, tile deltas and H.264 wait for the next keyframe
+            for stream_decoder in stream_decoders:
+                stream_decoder.reset()
+            return clients[0]
+
+    def watch_link():
+        # recv blocks until a frame arrives, closing the client ends it once the robot went silent
+        while not stop_event.wait(link_session.timeout_s / 4):
+            with client_lock:
+                if clients and link_session.expired():
+                    print(f"No data from server for {link_session.timeout_s} seconds, reconnecting NetGear...")
+                    clients[0].close()
+                    clients.clear()
+
+    client = client_connect()
+    threading.Thread(target=watch_link, daemon=True).start()
+
+    while not stop_event.is_set():
+        ctrl_proc_msg = shared_variable['ctrl_proc_msg']
+        if vision:
+            ctrl_proc_msg = vision.merge_command(ctrl_proc_msg, command_encoder)
+        if tracer:
+            ctrl_proc_msg = tracer.stamp_command(ctrl_proc_msg)
+        return_data = link_session.return_data(ctrl_proc_msg)
+        return_data = tracer.stamp_return_data(return_data) if tracer else return_data
+        received_data = client.recv(return_data=return_data)
         if received_data:
-            shared_variable['ctrl_proc_msg'] = {'CTime_ID':f'{datetime.datetime.now()}','GPIO_setups': GPIO_setups}
-        return client
-    
-    client = client_connect()    
-    last_received_data = datetime.datetime.now()
+            other_received_data, frame = received_data
+            link_session.on_frame(other_received_data)
+            frame_stamp = None
+            if tracer and frame is not None:
+                frame_stamp = tracer.on_frame_received(other_received_data, frame)
+            # tile video deltas and H.264 frames are decoded here, in order, the display loop may skip frames
+            assembled_frame = frame
+            for stream_decoder in stream_decoders:
+                assembled_frame = stream_decoder.apply(assembled_frame, other_received_data)
+            if assembled_frame is None and frame is not None:
+                # waiting for a keyframe
+                continue
+            frame = assembled_frame
+            if frame_slot.put((other_received_data, frame, frame_stamp)) and tracer:
+                tracer.on_frame_dropped()
+            if relay:
+                relay.publish(frame, other_received_data)
+        elif not stop_event.is_set():
+            # the session is kept, a robot that still has the GPIO_setups gets the commands right away
+            time.sleep(link_session.reconnect_delay_s)
+            link_session.reconnects += 1
+            client = client_connect()
+
+    with client_lock:
+        for each_client in clients:
+            each_client.close()
+
+def client_data_process(shared_variable):
+    tracer = Tracer(shared_variable['tracing']) if shared_variable['tracing']['enabled'] else None
+    frame_slot = LatestFrameSlot()
+    frame_rotator = FrameRotator()
+    stream_decoders = (TileFrameAssembler(), H264FrameDecoder())
+    relay = FrameRelay(shared_variable['relay']) if shared_variable['relay']['enabled'] else None
+    vision = VisionStage(shared_variable['vision']) if shared_variable['vision']['enabled'] else None
+    stop_event = threading.Event()
+    receiver = threading.Thread(target=receive_frames, args=(shared_variable, tracer, frame_slot, stream_decoders, stop_event, relay, vision), daemon=True)
+    receiver.start()
+    next_stats_time = time.monotonic() + 5
 
     while True:
-        received_data = client.recv(return_data=shared_variable['ctrl_proc_msg'])
-        if received_data:
-            last_received_data = datetime.datetime.now()
-            other_received_data, frame = received_data
-            frame = frame if frame is not None else np.zeros((480, 640, 3))
-            frame = frame[::-1, ::-1, :]    # rotate frame
+        # decodes and shows only the newest frame, older ones were dropped by frame_slot
+        received_item = frame_slot.take(timeout=0.05)
+        frame_stamp = None
+        if received_item:
+            other_received_data, frame, frame_stamp = received_item
+            frame = decode_frame(frame, other_received_data)
+            frame = frame_rotator.rotate(frame, other_received_data)
+            if vision:
+                # the plugins see the frame upright, as displayed, before any overlay
+                vision.publish(frame)
+                vision.poll_results()
+                frame = vision.overlay(frame)
+            if tracer and tracer.overlay_enabled:
+                frame = tracer.overlay(frame)
             cv2.imshow("Robo Output Frame", frame)
-        else:
-            print('Waiting for data from server...')
-            if datetime.datetime.now() > last_received_data + datetime.timedelta(seconds=5):
-                print(f"Waiting for server for 1 seconds and reconnecting NetGear...")
-                time.sleep(1)
-                client = client_connect() 
 
         # check for 'q' key to quit
         if cv2.waitKey(1) == ord('q'):
             break
-
+        if tracer:
+            if frame_stamp:
+                tracer.on_frame_displayed(frame_stamp)
+            tracer.maybe_dump()
+        if time.monotonic() >= next_stats_time:
+            next_stats_time = time.monotonic() + 5
+            shared_variable['frame_stats'] = dict(frame_slot.stats(), **stream_decoders[0].stats(), **stream_decoders[1].stats())
+            print(f"Frames: {shared_variable['frame_stats']}")
+            if relay:
+                print(f"Relay: {relay.stats()}")
+            if vision:
+                print(f"Vision: {vision.stats()}")
+
+    stop_event.set()
+    receiver.join(timeout=2)
+    if relay:
+        relay.close()
+    if vision:
+        vision.close()
+    if tracer:
+        tracer.dump()
     cv2.destroyAllWindows()
 
-def main():
+def main(config_path='configs.json'):
 
-    with open('configs.json', 'r') as file:
+    with open(config_path, 'r') as file:
         configs = json.load(file)
 
+    if configs.get('fleet', {}).get('enabled'):
+        fleet_server.main(configs)
+        return
+
     manager = multiprocessing.Manager()
     shared_variable = manager.dict()
 
     shared_variable['ctrl_proc_msg'] = None
     shared_variable['netgear_options'] = configs["netgear_options"]
     shared_variable['GPIO_setups'] = configs["GPIO_setups"]
+    # device index and CTime_ID of the GPIO_setups handshake, shared by the command packets of both processes
+    shared_variable['command_layout'] = {'devices': list(configs["GPIO_setups"]), 'setups_id': time.monotonic_ns()}
     shared_variable['controls_GPIO'] = configs["controls_GPIO"]
+    shared_variable['control_channel'] = configs.get("control_channel", {'enabled': False})
+    shared_variable['tracing'] = configs.get("tracing", {'enabled': False})
+    shared_variable['relay'] = configs.get("relay", {'enabled': False})
+    shared_variable['vision'] = configs.get("vision", {'enabled': False})
+    shared_variable['heartbeat'] = configs.get("heartbeat", {})
+    shared_variable['gamepad'] = configs.get("gamepad", {})
+    shared_variable['frame_stats'] = {}
 
     processes = [
         multiprocessing.Process(target=client_data_process, args=(shared_variable,)),
@@ -85,4 +215,4 @@ def main():
     print("Processes terminated.")
 
 if __name__ == '__main__':
-    main()
+    main(sys.argv[1] if len(sys.argv) > 1 else 'configs.json')
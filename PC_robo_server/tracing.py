@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import cv2
+import numpy as np
+from command_codec import packet_header, stamp_send
+
+class LatencyHistogram(object):
+    """
+    HDR-style log-linear histogram of latencies in microseconds.
+    Values below 128 us get their own bucket, above that every power of two is split in 64 buckets, so any recorded value
+    is reported within 1.6 % while the whole range up to days fits in 2048 counters.
+    """
+    SUB_BUCKET_BITS = 7
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+    HALF_BUCKETS = SUB_BUCKETS // 2
+    BUCKETS = 2048
+
+    def __init__(self):
+        self.counts = np.zeros(self.BUCKETS, dtype=np.int64)
+        self.total = 0
+        self.max_us = 0
+
+    def _index(self, value_us):
+        if value_us < self.SUB_BUCKETS:
+            return value_us
+        shift = value_us.bit_length() - self.SUB_BUCKET_BITS
+        return min(self.SUB_BUCKETS + (shift - 1) * self.HALF_BUCKETS + (value_us >> shift) - self.HALF_BUCKETS, self.BUCKETS - 1)
+
+    def _bucket_range(self, index):
+        if index < self.SUB_BUCKETS:
+            return index, 1
+        shift = (index - self.SUB_BUCKETS) // self.HALF_BUCKETS + 1
+        return ((index - self.SUB_BUCKETS) % self.HALF_BUCKETS + self.HALF_BUCKETS) << shift, 1 << shift
+
+    def record(self, value_ns):
+        value_us = max(int(value_ns) // 1000, 0)
+        self.counts[self._index(value_us)] += 1
+        self.total += 1
+        self.max_us = max(self.max_us, value_us)
+
+    def percentile(self, percent):
+        """Value in microseconds below which percent of the recorded values fall, None when empty."""
+        if not self.total:
+            return None
+        target = max(int(np.ceil(percent / 100 * self.total)), 1)
+        index = int(np.searchsorted(np.cumsum(self.counts), target))
+        lowest, width = self._bucket_range(index)
+        return min(lowest + (width - 1) / 2, self.max_us)
+
+    def summary(self):
+        to_ms = lambda value_us: round(value_us / 1000, 2) if value_us is not None else None
+        return {'count': self.total, 'p50_ms': to_ms(self.percentile(50)), 'p90_ms': to_ms(self.percentile(90)),
+                'p99_ms': to_ms(self.percentile(99)), 'max_ms': to_ms(self.max_us if self.total else None)}
+
+class Tracer(object):
+    """
+    End-to-end latency tracing on the PC from the time.monotonic_ns() stamps both sides put in their messages.
+    Robot stamps are moved to the PC clock with the clock_offset_ns the robot estimates from the trace_echo it gets back.
+
+    Frame path:   capture -> send (robot) -> recv -> display (PC)
+    Command path: gamepad event -> command send (PC) -> GPIO apply (robot)
+    glass_to_glass is capture to display, stick_to_wheel is gamepad event to GPIO apply.
+    """
+    STAGES = ('capture_to_send', 'send_to_recv', 'recv_to_display', 'glass_to_glass',
+              'event_to_send', 'send_to_apply', 'stick_to_wheel')
+
+    def __init__(self, options):
+        self.overlay_enabled = options.get('overlay', True)
+        self.dump_path = options.get('dump_path', 'trace_stats.json')
+        self.dump_interval_s = options.get('dump_interval_s', 5)
+        self.histograms = {stage: LatencyHistogram() for stage in self.STAGES}
+        self.clock_offset_ns = None
+        self.frames_received = 0
+        self.frames_displayed = 0
+        self.frames_dropped = 0
+        self.camera_frames_displayed = 0
+        self.wire_frames = 0
+        self.wire_bytes = 0
+        self._start_ns = time.monotonic_ns()
+        self._first_camera_frame_ns = None
+        self._next_dump_ns = self._start_ns + int(self.dump_interval_s * 1e9)
+        self._frame_echo = None
+        self._last_gpio_event_ns = None
+        self._command_id = None
+        self._command_send_ns = None
+
+    def on_frame_received(self, message, frame, recv_ns=None):
+        """Record a received frame as NetGear returned it, return the stamp to hand to on_frame_displayed() with the frame."""
+        recv_ns = recv_ns or time.monotonic_ns()
+        self.frames_received += 1
+        if frame.ndim == 1 and isinstance(message, dict) and 'video_params' in message:
+            # encoded on the robot (adaptive, tile or camera encoder), the payload is what crossed the link. Frames
+            # NetGear JPEG compressed arrive decoded, their wire size is unknown here
+            self.wire_frames += 1
+            self.wire_bytes += frame.nbytes
+        trace = message.get('trace') if isinstance(message, dict) else None
+        if not trace:
+            return (None, recv_ns)
+        self.clock_offset_ns = trace.get('clock_offset_ns')
+        self._frame_echo = {'send_ns': trace['send_ns'], 'recv_ns': recv_ns}
+        capture_ns = trace.get('capture_ns')
+        if capture_ns:
+            self.histograms['capture_to_send'].record(trace['send_ns'] - capture_ns)
+            self._first_camera_frame_ns = self._first_camera_frame_ns or recv_ns
+        if self.clock_offset_ns is not None:
+            self.histograms['send_to_recv'].record(recv_ns - (trace['send_ns'] + self.clock_offset_ns))
+        gpio_data = message.get('gpio_data')
+        if gpio_data and gpio_data.get('event_ns') != self._last_gpio_event_ns:
+            self._last_gpio_event_ns = gpio_data.get('event_ns')
+            self._on_gpio_applied(gpio_data)
+        return (capture_ns, recv_ns)
+
+    def on_frame_dropped(self):
+        self.frames_dropped += 1
+
+    def on_frame_displayed(self, frame_stamp, display_ns=None):
+        display_ns = display_ns or time.monotonic_ns()
+        capture_ns, recv_ns = frame_stamp
+        self.frames_displayed += 1
+        self.histograms['recv_to_display'].record(display_ns - recv_ns)
+        if capture_ns:
+            self.camera_frames_displayed += 1
+        if capture_ns and self.clock_offset_ns is not None:
+            self.histograms['glass_to_glass'].record(display_ns - (capture_ns + self.clock_offset_ns))
+
+    def _on_gpio_applied(self, gpio_data):
+        event_ns, send_ns = gpio_data.get('event_ns'), gpio_data.get('send_ns')
+        if event_ns and send_ns:
+            self.histograms['event_to_send'].record(send_ns - event_ns)
+        if self.clock_offset_ns is None:
+            return
+        apply_ns = gpio_data['apply_ns'] + self.clock_offset_ns
+        if send_ns:
+            self.histograms['send_to_apply'].record(apply_ns - send_ns)
+        if event_ns:
+            self.histograms['stick_to_wheel'].record(apply_ns - event_ns)
+
+    def stamp_command(self, command_packet):
+        """Return command_packet with the time it was first sent as send_ns."""
+        if command_packet is None:
+            return None
+        seq = packet_header(command_packet)['seq']
+        if seq != self._command_id:
+            self._command_id = seq
+            self._command_send_ns = time.monotonic_ns()
+        return stamp_send(command_packet, self._command_send_ns)
+
+    def stamp_return_data(self, ctrl_proc_msg):
+        """Return the NetGear return_data for ctrl_proc_msg with the command send stamp and the echo for clock sync."""
+        return_data = dict(ctrl_proc_msg) if ctrl_proc_msg else {}
+        if 'trace' in return_data:
+            if return_data['CTime_ID'] != self._command_id:
+                self._command_id = return_data['CTime_ID']
+                self._command_send_ns = time.monotonic_ns()
+            if 'send_ns' not in return_data['trace']:
+                return_data['trace'] = dict(return_data['trace'], send_ns=self._command_send_ns)
+        if self._frame_echo:
+            return_data['trace_echo'] = self._frame_echo
+        return return_data
+
+    def summary(self):
+        now_ns = time.monotonic_ns()
+        elapsed_s = (now_ns - self._start_ns) / 1e9
+        # blank frames sent while the camera starts do not count for fps
+        camera_s = (now_ns - self._first_camera_frame_ns) / 1e9 if self._first_camera_frame_ns else 0
+        return {'elapsed_s': round(elapsed_s, 2),
+                'fps': round(self.camera_frames_displayed / camera_s, 2) if camera_s else 0,
+                'frames_received': self.frames_received,
+                'frames_displayed': self.frames_displayed,
+                'frames_dropped': self.frames_dropped,
+                'bytes_per_frame': round(self.wire_bytes / self.wire_frames) if self.wire_frames else None,
+                'clock_offset_ns': self.clock_offset_ns,
+                'latency': {stage: histogram.summary() for stage, histogram in self.histograms.items()}}
+
+    def overlay(self, frame):
+        """Draw glass-to-glass and stick-to-wheel p50/p99 on frame, which must be contiguous and writable."""
+        lines = []
+        for stage in ('glass_to_glass', 'stick_to_wheel'):
+            summary = self.histograms[stage].summary()
+            lines.append(f"{stage} p50 {summary['p50_ms']} ms p99 {summary['p99_ms']} ms")
+        for i, line in enumerate(lines):
+            cv2.putText(frame, line, (10, 20 + 20 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1, cv2.LINE_AA)
+        return frame
+
+    def maybe_dump(self):
+        if time.monotonic_ns() >= self._next_dump_ns:
+            self._next_dump_ns = time.monotonic_ns() + int(self.dump_interval_s * 1e9)
+            self.dump()
+
+    def dump(self):
+        temp_path = self.dump_path + '.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(self.summary(), file, indent=2)
+        os.replace(temp_path, self.dump_path)
@@ -0,0 +1,277 @@
+import sys
+import time
+import queue
+import importlib
+import multiprocessing
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+from tracing import LatencyHistogram
+
+class VisionPlugin(object):
+    """
+    Base class of the analyzers run by VisionStage.
+    process() runs in a worker process on a copy of the newest frame (as displayed, upright) and returns a result dict.
+    A 'GPIO_command' entry of the result ({device_name: value}) is merged into the commands sent to the robot when the
+    plugin is configured with merge_command. draw() runs in the display loop with the newest result.
+    """
+    def __init__(self, options):
+        self.options = options
+
+    def process(self, frame):
+        raise NotImplementedError
+
+    def draw(self, frame, result):
+        pass
+
+class VisionFrameRing(object):
+    """
+    Displayed frames shared with the vision workers, latest frame wins (the PC side of the robot's FrameRingBuffer).
+    Shared memory layout: int64 header [write_seq, slot_seq_0 .. slot_seq_N-1, capture_ns_0 .. capture_ns_N-1] followed by
+    the frame slots, capture_ns is when the frame was written. A slot_seq of -1 means the slot is being written.
+    """
+    def __init__(self, shape, slots=4, name=None):
+        self.shape = tuple(shape)
+        self.slots = slots
+        header_nbytes = (1 + 2 * slots) * np.dtype(np.int64).itemsize
+        self._owner = name is None
+        if self._owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=header_nbytes + slots * int(np.prod(self.shape)))
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            if sys.version_info < (3, 13):
+                # attaching registers the segment again, the tracker would then unlink it when this process exits
+                resource_tracker.unregister(self.shm._name, 'shared_memory')
+        self._header = np.ndarray((1 + 2 * slots,), dtype=np.int64, buffer=self.shm.buf)
+        self._frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self.shm.buf, offset=header_nbytes)
+        if self._owner:
+            self._header[:] = 0
+            self._header[1:1 + slots] = -1
+
+    def __reduce__(self):
+        # workers attach to the same segment by name instead of copying it
+        return (self.__class__, (self.shape, self.slots, self.shm.name))
+
+    def write(self, frame):
+        seq = int(self._header[0]) + 1
+        index = seq % self.slots
+        self._header[1 + index] = -1
+        np.copyto(self._frames[index], frame, casting='unsafe')
+        self._header[1 + self.slots + index] = time.monotonic_ns()
+        self._header[1 + index] = seq
+        self._header[0] = seq
+
+    def read_latest(self):
+        """Return (seq, frame) of the newest frame, a view into shared memory, (0, None) before the first one."""
+        seq = int(self._header[0])
+        if seq == 0:
+            return 0, None
+        return seq, self._frames[seq % self.slots]
+
+    def capture_ns(self, seq):
+        return int(self._header[1 + self.slots + seq % self.slots])
+
+    def is_current(self, seq):
+        """True while the slot of seq has not been reused by the writer."""
+        return int(self._header[1 + seq % self.slots]) == seq
+
+    def close(self):
+        self._header = None
+        self._frames = None
+        self.shm.close()
+
+    def unlink(self):
+        if self._owner:
+            self.shm.unlink()
+
+def load_plugin(plugin_options):
+    # "module.Class", the module is imported from the PC_robo_server directory or anywhere on sys.path
+    module_name, class_name = plugin_options['plugin'].rsplit('.', 1)
+    return getattr(importlib.import_module(module_name), class_name)(plugin_options.get('options', {}))
+
+def vision_worker(plugin_options, frame_ring, claimed_seq, results, stop_event):
+    # works on the newest frame no other worker of the plugin has claimed, frames published meanwhile are skipped
+    plugin = load_plugin(plugin_options)
+    name = plugin_options['name']
+    # results not collected yet must not keep this process from exiting
+    results.cancel_join_thread()
+    while not stop_event.is_set():
+        seq, shared_frame = frame_ring.read_latest()
+        with claimed_seq.get_lock():
+            claimed = seq > claimed_seq.value
+            if claimed:
+                skipped = seq - claimed_seq.value - 1
+                claimed_seq.value = seq
+        if not claimed:
+            time.sleep(0.001)
+            continue
+        start_ns = time.monotonic_ns()
+        frame = shared_frame.copy()
+        # read before the check, once process() runs the slot may hold a newer frame
+        published_ns = frame_ring.capture_ns(seq)
+        if not frame_ring.is_current(seq):
+            # the display loop reused the slot during the copy
+            results.put((name, seq, None, start_ns, start_ns, skipped + 1, None))
+            continue
+        try:
+            result = plugin.process(frame)
+        except Exception as exp:
+            print(f"Vision plugin {name} failed: {exp}")
+            result = None
+        results.put((name, seq, published_ns, start_ns, time.monotonic_ns(), skipped, result))
+    frame_ring.close()
+
+class PluginStats(object):
+    def __init__(self):
+        self.results = 0
+        self.skipped = 0
+        self.errors = 0
+        self.lag = LatencyHistogram()
+        self.process_time = LatencyHistogram()
+        self._start_ns = time.monotonic_ns()
+
+    def on_result(self, published_ns, start_ns, done_ns, skipped, result):
+        self.skipped += skipped
+        if published_ns is None:
+            return
+        if result is None:
+            self.errors += 1
+            return
+        self.results += 1
+        self.lag.record(done_ns - published_ns)
+        self.process_time.record(done_ns - start_ns)
+
+    def summary(self):
+        elapsed_s = (time.monotonic_ns() - self._start_ns) / 1e9
+        return {'results': self.results, 'results_per_s': round(self.results / elapsed_s, 1), 'frames_skipped': self.skipped,
+                'errors': self.errors, 'lag': self.lag.summary(), 'process': self.process_time.summary()}
+
+class VisionStage(object):
+    """
+    Runs the configured VisionPlugins next to the display loop without slowing it or the robot link.
+    publish() copies each displayed frame into a shared memory ring, every plugin has its own worker processes that
+    always take the newest frame, a plugin slower than the video skips frames instead of queueing them.
+    poll_results() collects the results in the display loop, overlay() draws them and merge_command() (called from the
+    receive thread) merges the fresh GPIO_command results into the commands for the robot.
+    A result for a frame older than max_result_age_s is dropped, outputs it drove go back to the gamepad value or 0.
+    """
+    def __init__(self, options):
+        self.frame_slots = options.get('frame_slots', 4)
+        self.max_result_age_ns = int(options.get('max_result_age_s', 0.5) * 1e9)
+        self.plugin_options = []
+        for plugin_options in options['plugins']:
+            plugin_options = dict(plugin_options)
+            plugin_options.setdefault('name', plugin_options['plugin'].rsplit('.', 1)[1])
+            self.plugin_options.append(plugin_options)
+        # instances in this process only draw the overlays
+        self.plugins = {plugin_options['name']: load_plugin(plugin_options) for plugin_options in self.plugin_options}
+        self.stats_by_plugin = {name: PluginStats() for name in self.plugins}
+        self.latest = {}
+        self.frames_published = 0
+        self.frame_ring = None
+        self.results = multiprocessing.Queue()
+        self.stop_event = None
+        self.processes = []
+        self.claimed_seqs = []
+        self._commands = {}
+        self._driven_outputs = frozenset()
+        self._vision_packet = None
+
+    def _start(self, shape):
+        self._stop_workers()
+        self.frame_ring = VisionFrameRing(shape, slots=self.frame_slots)
+        self.stop_event = multiprocessing.Event()
+        # kept here, a started Process drops its args and a freed Value would be reused for the next plugin
+        self.claimed_seqs = []
+        for plugin_options in self.plugin_options:
+            claimed_seq = multiprocessing.Value('q', 0)
+            self.claimed_seqs.append(claimed_seq)
+            for _ in range(plugin_options.get('workers', 1)):
+                process = multiprocessing.Process(target=vision_worker, daemon=True,
+                                                  args=(plugin_options, self.frame_ring, claimed_seq, self.results, self.stop_event))
+                process.start()
+                self.processes.append(process)
+
+    def publish(self, frame):
+        """Hand the displayed frame to the plugins, workers are (re)started for the first frame or a new frame size."""
+        if self.frame_ring is None or self.frame_ring.shape != frame.shape:
+            self._start(frame.shape)
+        self.frame_ring.write(frame)
+        self.frames_published += 1
+
+    def poll_results(self):
+        while True:
+            try:
+                name, seq, published_ns, start_ns, done_ns, skipped, result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.stats_by_plugin[name].on_result(published_ns, start_ns, done_ns, skipped, result)
+            # workers of one plugin may finish out of order
+            if result is not None and seq > self.latest.get(name, (0,))[0]:
+                self.latest[name] = (seq, published_ns, result)
+        commands = {}
+        for plugin_options in self.plugin_options:
+            name = plugin_options['name']
+            if plugin_options.get('merge_command') and name in self.latest and 'GPIO_command' in self.latest[name][2]:
+                commands[name] = (self.latest[name][1], self.latest[name][2]['GPIO_command'])
+        # replaced as a whole, the receive thread reads them without a lock
+        self._driven_outputs = self._driven_outputs.union(*(gpio_command for _, gpio_command in commands.values()))
+        self._commands = commands
+
+    def fresh_results(self):
+        now_ns = time.monotonic_ns()
+        return {name: result for name, (seq, published_ns, result) in self.latest.items()
+                if now_ns - published_ns <= self.max_result_age_ns}
+
+    def overlay(self, frame):
+        fresh_results = self.fresh_results()
+        for plugin_options in self.plugin_options:
+            result = fresh_results.get(plugin_options['name'])
+            if result is not None and plugin_options.get('overlay', True):
+                self.plugins[plugin_options['name']].draw(frame, result)
+        return frame
+
+    def merge_command(self, command_packet, command_encoder):
+        """command_packet with the fresh GPIO_command results merged in, a new packet if there was none."""
+        if not self._driven_outputs:
+            return command_packet
+        now_ns = time.monotonic_ns()
+        vision_command = {}
+        for published_ns, gpio_command in self._commands.values():
+            if now_ns - published_ns <= self.max_result_age_ns:
+                vision_command.update(gpio_command)
+        values = command_encoder.decode_values(command_packet) if command_packet else command_encoder.values({})
+        # an output whose result went stale must not keep the last vision value
+        for name in self._driven_outputs:
+            index = command_encoder.index.get(name)
+            if index is not None and np.isnan(values[index]):
+                values[index] = 0
+        for name, value in vision_command.items():
+            index = command_encoder.index.get(name)
+            if index is not None:
+                values[index] = value
+        if command_packet is None:
+            # a new packet only when the values change, the robot skips repeated return_data
+            if self._vision_packet is None or self._vision_packet[0] != values.tobytes():
+                self._vision_packet = (values.tobytes(), command_encoder.encode(values))
+            return self._vision_packet[1]
+        return command_encoder.replace_values(command_packet, values)
+
+    def stats(self):
+        return {'frames_published': self.frames_published,
+                'plugins': {name: stats.summary() for name, stats in self.stats_by_plugin.items()}}
+
+    def _stop_workers(self):
+        if self.stop_event:
+            self.stop_event.set()
+        for process in self.processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+        if self.frame_ring:
+            self.frame_ring.close()
+            self.frame_ring.unlink()
+            self.frame_ring = None
+
+    def close(self):
+        self._stop_workers()
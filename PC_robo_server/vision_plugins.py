@@ -0,0 +1,59 @@
+import numpy as np
+import cv2
+from vision import VisionPlugin
+
+class LineFollower(VisionPlugin):
+    """
+    Follows a dark line on the floor: the centroid of the dark pixels in the bottom roi_fraction of the frame steers the
+    wheels, the offset from the frame center (-1 left .. 1 right) is added to the left and subtracted from the right.
+    Without a line both wheels stop.
+    """
+    def __init__(self, options):
+        super().__init__(options)
+        self.roi_fraction = options.get('roi_fraction', 0.3)
+        self.threshold = options.get('threshold', 60)
+        self.min_pixels = options.get('min_pixels', 200)
+        self.speed = options.get('speed', 0.4)
+        self.gain = options.get('gain', 0.6)
+        self.left_output = options.get('left_output', 'wheels_Left')
+        self.right_output = options.get('right_output', 'wheels_Right')
+
+    def process(self, frame):
+        roi_top = int(frame.shape[0] * (1 - self.roi_fraction))
+        gray = cv2.cvtColor(frame[roi_top:], cv2.COLOR_BGR2GRAY if frame.shape[2] == 3 else cv2.COLOR_BGRA2GRAY)
+        _, mask = cv2.threshold(gray, self.threshold, 1, cv2.THRESH_BINARY_INV)
+        moments = cv2.moments(mask, binaryImage=True)
+        if moments['m00'] < self.min_pixels:
+            return {'found': False, 'roi_top': roi_top, 'GPIO_command': {self.left_output: 0, self.right_output: 0}}
+        center_x = moments['m10'] / moments['m00']
+        offset = 2 * center_x / frame.shape[1] - 1
+        left = float(np.clip(self.speed + self.gain * offset, -1, 1))
+        right = float(np.clip(self.speed - self.gain * offset, -1, 1))
+        return {'found': True, 'roi_top': roi_top, 'x': round(center_x), 'offset': round(offset, 3),
+                'GPIO_command': {self.left_output: round(left, 2), self.right_output: round(right, 2)}}
+
+    def draw(self, frame, result):
+        cv2.line(frame, (0, result['roi_top']), (frame.shape[1], result['roi_top']), (255, 255, 0), 1)
+        if result['found']:
+            cv2.line(frame, (result['x'], result['roi_top']), (result['x'], frame.shape[0]), (0, 255, 255), 2)
+
+class ArucoDetector(VisionPlugin):
+    """Finds ArUco markers of one dictionary, returns their ids and corner points."""
+    def __init__(self, options):
+        super().__init__(options)
+        dictionary = cv2.aruco.getPredefinedDictionary(getattr(cv2.aruco, options.get('dictionary', 'DICT_4X4_50')))
+        self.detector = cv2.aruco.ArucoDetector(dictionary, cv2.aruco.DetectorParameters())
+
+    def process(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY if frame.shape[2] == 3 else cv2.COLOR_BGRA2GRAY)
+        corners, ids, _ = self.detector.detectMarkers(gray)
+        if ids is None:
+            return {'markers': []}
+        return {'markers': [{'id': int(marker_id), 'corners': marker_corners.reshape(4, 2).round(1).tolist()}
+                            for marker_id, marker_corners in zip(ids.flatten(), corners)]}
+
+    def draw(self, frame, result):
+        for marker in result['markers']:
+            points = np.array(marker['corners'], dtype=np.int32)
+            cv2.polylines(frame, [points], True, (0, 255, 0), 2)
+            cv2.putText(frame, str(marker['id']), tuple(points[0]), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
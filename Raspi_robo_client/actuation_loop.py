@@ -0,0 +1,112 @@
+import math
+import time
+
+class ActuationLoop(object):
+    """
+    Writes the outputs at a fixed rate instead of whenever a command arrives. Commands only set the targets, every tick
+    moves each output towards its target within the optional limits of its GPIO_setups entry:
+    max_rate (value units per second, -1..1 is 2 units) and max_accel (units per second squared).
+    Outputs without limits jump to their target at the next tick.
+    GPIO_process sleeps until time_to_deadline() and calls run_due(). A tick later than one period counts the skipped
+    deadlines as missed and the next tick keeps to the period grid instead of catching up with a burst of ticks.
+    """
+    def __init__(self, options, gpio_controller):
+        self.period_ns = int(1e9 / options.get('rate_hz', 100))
+        self.gpio_controller = gpio_controller
+        self.targets = {}
+        self.velocities = {}
+        self.next_deadline_ns = time.monotonic_ns() + self.period_ns
+        self.last_tick_ns = None
+        self.ticks = 0
+        self.missed_deadlines = 0
+        self.lateness_ns = []
+        self.tick_ns = []
+
+    def set_targets(self, changed_actions):
+        self.targets.update(changed_actions)
+
+    def hold(self, device_name, value):
+        """Target and output set to value by the caller (failsafe), the output stops there."""
+        self.targets[device_name] = value
+        self.velocities[device_name] = 0.0
+
+    def forget(self, device_name):
+        self.targets.pop(device_name, None)
+        self.velocities.pop(device_name, None)
+
+    def time_to_deadline(self):
+        return max(0, self.next_deadline_ns - time.monotonic_ns()) / 1e9
+
+    def run_due(self):
+        """Tick if the deadline has passed, return the number of outputs written or None when not due."""
+        now_ns = time.monotonic_ns()
+        lateness_ns = now_ns - self.next_deadline_ns
+        if lateness_ns < 0:
+            return None
+        if lateness_ns >= self.period_ns:
+            missed = lateness_ns // self.period_ns
+            self.missed_deadlines += missed
+            self.next_deadline_ns += missed * self.period_ns
+        self.next_deadline_ns += self.period_ns
+        self.lateness_ns.append(lateness_ns)
+        # real elapsed time, a late tick may move further but never faster than the limits allow
+        dt = self.period_ns / 1e9 if self.last_tick_ns is None else min(now_ns - self.last_tick_ns, 4 * self.period_ns) / 1e9
+        self.last_tick_ns = now_ns
+        written = self.tick(dt)
+        self.tick_ns.append(time.monotonic_ns() - now_ns)
+        self.ticks += 1
+        return written
+
+    def tick(self, dt):
+        gpio_controller = self.gpio_controller
+        changed_actions = []
+        for device_name, target in self.targets.items():
+            device_settings = gpio_controller.device_setups.get(device_name)
+            if device_settings is None:
+                continue
+            current = gpio_controller.applied_values.get(device_name)
+            if current is None:
+                current = float(device_settings['config_kwargs'].get('initial_value') or 0)
+            if current == target:
+                continue
+            value = self._step(device_name, current, target, device_settings.get('max_rate'), device_settings.get('max_accel'), dt)
+            changed_actions.append((device_name, value))
+        return gpio_controller._apply(changed_actions)
+
+    def _step(self, device_name, current, target, max_rate, max_accel, dt):
+        error = target - current
+        direction = 1 if error > 0 else -1
+        if not max_rate and not max_accel:
+            return target
+        # fastest speed that still stops at the target with max_accel
+        speed = max_rate or math.inf
+        if max_accel:
+            speed = min(speed, math.sqrt(2 * max_accel * abs(error)))
+            velocity = self.velocities.get(device_name, 0.0)
+            velocity += max(-max_accel * dt, min(max_accel * dt, direction * speed - velocity))
+        else:
+            velocity = direction * speed
+        step = velocity * dt
+        if step * direction >= abs(error):
+            self.velocities[device_name] = 0.0
+            return target
+        self.velocities[device_name] = velocity
+        # a reversal overshoots while it slows down, never past the output range
+        return max(-1.0, min(1.0, current + step))
+
+    def stats(self):
+        """Ticks, missed deadlines, tick lateness (jitter) and duration since the last call, in microseconds."""
+        def percentiles(samples_ns):
+            if not samples_ns:
+                return None
+            samples_ns = sorted(samples_ns)
+            return {'p50': round(samples_ns[len(samples_ns) // 2] / 1000, 1),
+                    'p99': round(samples_ns[min(len(samples_ns) - 1, len(samples_ns) * 99 // 100)] / 1000, 1),
+                    'max': round(samples_ns[-1] / 1000, 1)}
+        stats = {'rate_hz': round(1e9 / self.period_ns, 1), 'ticks': self.ticks, 'missed_deadlines': self.missed_deadlines,
+                 'lateness_us': percentiles(self.lateness_ns), 'tick_us': percentiles(self.tick_ns)}
+        self.ticks = 0
+        self.missed_deadlines = 0
+        self.lateness_ns = []
+        self.tick_ns = []
+        return stats
@@ -0,0 +1,100 @@
+import cv2
+import numpy as np
+import simplejpeg
+
+# picamera2 formats are named after the 32-bit pixel word, in memory RGB888 is B, G, R like OpenCV expects
+JPEG_COLORSPACES = {'RGB888': 'BGR', 'BGR888': 'RGB', 'XRGB8888': 'BGRX', 'XBGR8888': 'RGBX'}
+
+class AdaptiveQualityController(object):
+    """
+    Feedback controller for the video stream sent over NetGear.
+    Each server.send() round trip time and payload size is fed to update(), the smoothed round trip time then steps the
+    operating point (JPEG quality, downscale factor, frame rate) down when it rises above rtt_high_ms and back up when it
+    stays below rtt_low_ms. Steps down are at least down_hold_frames apart, steps up hold_frames, so congestion is left
+    quickly and the link can settle before quality comes back.
+    Stepping down lowers quality first, then resolution, which both shrink every frame, then frame rate.
+    Stepping up restores them in reverse order.
+    Above twice rtt_high_ms the quality drops straight to its minimum.
+    """
+    def __init__(self, options):
+        self.quality_min, self.quality_max = options['quality_range']
+        self.quality_step = options.get('quality_step', 10)
+        self.fps_min, self.fps_max = options['fps_range']
+        self.fps_step = options.get('fps_step', 5)
+        self.scale_factors = options.get('scale_factors', [1, 2])
+        self.rtt_low_ms = options.get('rtt_low_ms', 40)
+        self.rtt_high_ms = options.get('rtt_high_ms', 120)
+        self.hold_frames = options.get('hold_frames', 10)
+        self.down_hold_frames = options.get('down_hold_frames', 3)
+        self.smoothing = options.get('smoothing', 0.2)
+        self.quality = self.quality_max
+        self.fps = self.fps_max
+        self.scale_index = 0
+        self.rtt_ms = None
+        self.throughput_kbps = None
+        self._frames_since_step = 0
+
+    @property
+    def scale(self):
+        return self.scale_factors[self.scale_index]
+
+    @property
+    def frame_interval(self):
+        return 1.0 / self.fps
+
+    def update(self, rtt_s, sent_bytes):
+        """Feed one measured send round trip, returns True when the operating point changed."""
+        rtt_ms = rtt_s * 1000
+        throughput_kbps = sent_bytes * 8 / 1000 / rtt_s if rtt_s > 0 else 0
+        if self.rtt_ms is None:
+            self.rtt_ms, self.throughput_kbps = rtt_ms, throughput_kbps
+        else:
+            self.rtt_ms += self.smoothing * (rtt_ms - self.rtt_ms)
+            self.throughput_kbps += self.smoothing * (throughput_kbps - self.throughput_kbps)
+        self._frames_since_step += 1
+        if self.rtt_ms > self.rtt_high_ms and self._frames_since_step >= self.down_hold_frames:
+            changed = self._step_down()
+        elif self.rtt_ms < self.rtt_low_ms and self._frames_since_step >= self.hold_frames:
+            changed = self._step_up()
+        else:
+            changed = False
+        if changed:
+            self._frames_since_step = 0
+        return changed
+
+    def _step_down(self):
+        if self.quality > self.quality_min:
+            if self.rtt_ms > 2 * self.rtt_high_ms:
+                self.quality = self.quality_min
+            else:
+                self.quality = max(self.quality_min, self.quality - self.quality_step)
+        elif self.scale_index < len(self.scale_factors) - 1:
+            self.scale_index += 1
+        elif self.fps > self.fps_min:
+            self.fps = max(self.fps_min, self.fps - self.fps_step)
+        else:
+            return False
+        return True
+
+    def _step_up(self):
+        if self.fps < self.fps_max:
+            self.fps = min(self.fps_max, self.fps + self.fps_step)
+        elif self.scale_index > 0:
+            self.scale_index -= 1
+        elif self.quality < self.quality_max:
+            self.quality = min(self.quality_max, self.quality + self.quality_step)
+        else:
+            return False
+        return True
+
+    def operating_point(self):
+        return {'quality': self.quality, 'scale': self.scale, 'fps': self.fps,
+                'rtt_ms': round(self.rtt_ms, 1) if self.rtt_ms is not None else None,
+                'throughput_kbps': round(self.throughput_kbps) if self.throughput_kbps is not None else None}
+
+def encode_frame(frame, quality, scale, colorspace='BGR'):
+    """Downscale and JPEG encode frame, returns the JPEG as a 1-D uint8 array NetGear can send without its own compression."""
+    if scale > 1:
+        frame = cv2.resize(frame, (frame.shape[1] // scale, frame.shape[0] // scale), interpolation=cv2.INTER_AREA)
+    jpeg = simplejpeg.encode_jpeg(frame, quality=quality, colorspace=colorspace, fastdct=True)
+    return np.frombuffer(jpeg, dtype=np.uint8)
@@ -0,0 +1,70 @@
+import time
+import logging
+from picamera2.encoders import MJPEGEncoder, H264Encoder
+from picamera2.outputs import Output
+
+# video_params encoding of each camera_config encoder, hardware MJPEG frames decode like the adaptive video JPEGs
+ENCODINGS = {'mjpeg': 'jpeg', 'h264': 'h264'}
+
+def create_encoder(camera_config):
+    encoder_options = camera_config.get('encoder_options', {})
+    if camera_config['encoder'] == 'mjpeg':
+        return MJPEGEncoder(bitrate=encoder_options.get('bitrate'))
+    if camera_config['encoder'] == 'h264':
+        # SPS/PPS repeated with every keyframe, the PC can start decoding at any of them
+        return H264Encoder(bitrate=encoder_options.get('bitrate'), repeat=True, iperiod=encoder_options.get('iperiod', 30))
+    raise ValueError(f"Unknown camera encoder: {camera_config['encoder']}")
+
+class RingOutput(Output):
+    """picamera2 output writing every encoded buffer into an EncodedFrameRing, called from the encoder thread."""
+    def __init__(self, encoded_ring):
+        super().__init__()
+        self.encoded_ring = encoded_ring
+        self.oversized = 0
+
+    def outputframe(self, frame, keyframe=True, timestamp=None, *args, **kwargs):
+        # stamped when the encoder hands the buffer over, later than the sensor timestamp by the encode time
+        if self.encoded_ring.write_encoded(frame, keyframe, time.monotonic_ns()) is None:
+            self.oversized += 1
+            logging.warning(f'Encoded frame of {len(frame)} bytes dropped, encoded_buffer_kb is {self.encoded_ring.capacity // 1024}.')
+
+class EncodedFrameReader(object):
+    """
+    Hands server_data_process the encoded frames to send. MJPEG frames stand alone, only the newest is sent.
+    H.264 frames are sent in order; after a gap (slots reused before they were sent, a send that timed out or a new connection) every frame
+    up to the next keyframe is skipped, the PC could not decode them.
+    """
+    def __init__(self, encoded_ring, encoder):
+        self.encoded_ring = encoded_ring
+        self.in_order = encoder == 'h264'
+        self.next_seq = 1
+        self.waiting_keyframe = True
+        self.frames_lost = 0
+        self.frames_skipped = 0
+
+    def wait_keyframe(self):
+        self.waiting_keyframe = True
+
+    def next(self):
+        """Return (seq, payload, keyframe) of the next frame to send, None if there is none yet."""
+        write_seq = self.encoded_ring.write_seq
+        while self.next_seq <= write_seq:
+            seq = self.next_seq if self.in_order else write_seq
+            self.next_seq = seq + 1
+            encoded = self.encoded_ring.read(seq)
+            if encoded is None:
+                # overwritten before it was sent
+                self.frames_lost += 1
+                self.waiting_keyframe = True
+                self.next_seq = max(self.next_seq, self.encoded_ring.write_seq - self.encoded_ring.slots + 2)
+                continue
+            payload, keyframe = encoded
+            if self.in_order and self.waiting_keyframe and not keyframe:
+                self.frames_skipped += 1
+                continue
+            self.waiting_keyframe = False
+            return seq, payload, keyframe
+        return None
+
+    def stats(self):
+        return {'frames_lost': self.frames_lost, 'frames_skipped': self.frames_skipped}
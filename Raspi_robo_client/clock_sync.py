@@ -0,0 +1,24 @@
+from collections import deque
+
+class ClockOffsetEstimator(object):
+    """
+    Estimates the PC monotonic clock minus the Pi monotonic clock from NetGear round trips, NTP style.
+    Every reply gives the round trip of one sent message. The PC echoes the send_ns of a message it received together with
+    its own receive stamp, offset = pc_recv_ns - (send_ns + rtt / 2). The sample with the shortest round trip of the
+    last window samples is the least disturbed by queueing and is used as the estimate.
+    """
+    def __init__(self, window=64):
+        self.window = window
+        self.offset_ns = None
+        self._round_trips = {}
+        self._samples = deque(maxlen=window)
+
+    def on_reply(self, send_ns, reply_ns, echo=None):
+        self._round_trips[send_ns] = reply_ns - send_ns
+        if len(self._round_trips) > 4 * self.window:
+            del self._round_trips[next(iter(self._round_trips))]
+        if echo and echo.get('send_ns') in self._round_trips:
+            rtt_ns = self._round_trips.pop(echo['send_ns'])
+            self._samples.append((rtt_ns, echo['recv_ns'] - (echo['send_ns'] + rtt_ns // 2)))
+            self.offset_ns = min(self._samples)[1]
+        return self.offset_ns
@@ -0,0 +1,51 @@
+import struct
+import base64
+import binascii
+
+# Command packet: header, then one little-endian float32 per device in the order of the device index sent with the
+# GPIO_setups, NaN for a device without a command yet. Encoded on the PC by command_codec.CommandEncoder.
+# header: magic, version, device count, sequence number, setups_id (CTime_ID of the GPIO_setups), event_ns (monotonic
+# stamp of the snapshot), send_ns (stamped by the sender, 0 if not traced)
+HEADER = struct.Struct('<2sBBIqqq')
+MAGIC = b'GC'
+VERSION = 1
+
+def packet_header(packet):
+    magic, version, count, seq, setups_id, event_ns, send_ns = HEADER.unpack_from(packet)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f'Not a command packet of version {VERSION}')
+    return {'count': count, 'seq': seq, 'setups_id': setups_id, 'event_ns': event_ns, 'send_ns': send_ns}
+
+class CommandDecoder(object):
+    """
+    Decodes command packets with the device index received with the GPIO_setups.
+    Packets encoded for other GPIO_setups (another setups_id or device count) and malformed ones (bad base64, foreign
+    header, truncated) are rejected.
+    """
+    def __init__(self):
+        self.devices = []
+        self.setups_id = None
+        self.rejected = 0
+        self._values = struct.Struct('<0f')
+
+    def set_index(self, devices, setups_id):
+        self.devices = list(devices)
+        self.setups_id = setups_id
+        self._values = struct.Struct(f'<{len(self.devices)}f')
+
+    def decode(self, packet):
+        """Return (header, values) with values a tuple of floats in index order, None if rejected."""
+        try:
+            if isinstance(packet, str):
+                # base64 text from NetGear return_data
+                packet = base64.b64decode(packet)
+            header = packet_header(packet)
+            if len(packet) != HEADER.size + self._values.size:
+                raise ValueError(f'command packet of {len(packet)} bytes')
+        except (binascii.Error, ValueError, TypeError, struct.error):
+            self.rejected += 1
+            return None
+        if header['setups_id'] != self.setups_id or header['count'] != len(self.devices):
+            self.rejected += 1
+            return None
+        return header, self._values.unpack_from(packet, HEADER.size)
@@ -0,0 +1,63 @@
+import time
+import pickle
+import multiprocessing
+
+class CommandMailbox(object):
+    """
+    Mailbox for the latest data received from the PC, with one slot per source (NetGear return data, control channel).
+    Sources publish a new version, the GPIO process sleeps until a version newer than the one it holds arrives.
+    Only the newest payload of each source is kept, a slow reader skips intermediate versions of a source
+    but never loses the last message of another one.
+    There is one reader. Publishing only takes the lock for the copy and posts a semaphore, it never waits for the reader
+    to wake up like a multiprocessing.Condition notify does, the reader unpickles after releasing the lock.
+    """
+    def __init__(self, capacity=65536, sources=1):
+        self.capacity = capacity
+        self.sources = sources
+        self._lock = multiprocessing.Lock()
+        self._wakeup = multiprocessing.Semaphore(0)
+        self._version = multiprocessing.RawValue('q', 0)
+        self._source_versions = multiprocessing.RawArray('q', sources)
+        self._lengths = multiprocessing.RawArray('q', sources)
+        self._payload = multiprocessing.RawArray('B', capacity * sources)
+
+    @property
+    def version(self):
+        return self._version.value
+
+    def publish(self, data, source=0):
+        """Store data as the newest version of source and wake up the reader. Returns the new version."""
+        payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.capacity:
+            raise ValueError(f'Command of {len(payload)} bytes exceeds mailbox capacity of {self.capacity} bytes')
+        offset = source * self.capacity
+        with self._lock:
+            memoryview(self._payload).cast('B')[offset:offset + len(payload)] = payload
+            self._lengths[source] = len(payload)
+            self._version.value += 1
+            self._source_versions[source] = version = self._version.value
+        self._wakeup.release()
+        return version
+
+    def wait(self, last_version, timeout=None):
+        """
+        Block until a version newer than last_version is published.
+        Returns (version, [data of every source updated since last_version]), the list is empty on timeout.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        # a post left from a version already read only costs one more pass
+        while self._version.value == last_version:
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                return last_version, []
+            if not self._wakeup.acquire(timeout=remaining):
+                return last_version, []
+        payloads = []
+        with self._lock:
+            version = self._version.value
+            buffer = memoryview(self._payload).cast('B')
+            for source in range(self.sources):
+                if self._source_versions[source] > last_version:
+                    offset = source * self.capacity
+                    payloads.append(bytes(buffer[offset:offset + self._lengths[source]]))
+        return version, [pickle.loads(payload) for payload in payloads]
@@ -0,0 +1,71 @@
+import zmq
+import json
+import struct
+import logging
+from command_codec import packet_header, HEADER
+from link_watchdog import beat
+
+class ControlReceiver(object):
+    """
+    Receiving end of the optional control channel: a ZMQ PULL socket connected to the PC, separate from the NetGear video link.
+    Only the newest queued snapshot is kept (ZMQ_CONFLATE) and snapshots with a sequence number not newer than the
+    last applied one are discarded. A new session id from the PC (PC restarted) resets the sequence.
+    Snapshots are command packets (the setups_id is the session) or JSON dicts, malformed ones are counted and dropped.
+    """
+    def __init__(self, options):
+        self.context = zmq.Context.instance()
+        self.socket = self.context.socket(zmq.PULL)
+        self.socket.setsockopt(zmq.CONFLATE, 1)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.connect(f"tcp://{options['address']}:{options['port']}")
+        self.poller = zmq.Poller()
+        self.poller.register(self.socket, zmq.POLLIN)
+        self.session = None
+        self.last_seq = 0
+        self.stale_snapshots = 0
+        self.rejected_snapshots = 0
+
+    def recv(self, timeout_ms=None):
+        """Return the next fresh snapshot, or None on timeout or when the snapshot is stale."""
+        if not self.poller.poll(timeout_ms):
+            return None
+        payload = self.socket.recv()
+        try:
+            if payload.startswith(b'{'):
+                snapshot = json.loads(payload)
+                session, seq = snapshot.get('session'), int(snapshot['seq'])
+            else:
+                header = packet_header(payload)
+                if len(payload) != HEADER.size + 4 * header['count']:
+                    raise ValueError(f"command packet for {header['count']} devices is {len(payload)} bytes")
+                session, seq = header['setups_id'], header['seq']
+                snapshot = {'command_packet': payload}
+        except (ValueError, KeyError, TypeError, AttributeError, struct.error) as exp:
+            # truncated or foreign payload, the channel keeps receiving
+            self.rejected_snapshots += 1
+            logging.error(f'Control channel snapshot of {len(payload)} bytes rejected: {exp!r}')
+            return None
+        if session != self.session:
+            self.session = session
+            self.last_seq = 0
+        if seq <= self.last_seq:
+            self.stale_snapshots += 1
+            return None
+        self.last_seq = seq
+        return snapshot
+
+    def close(self):
+        self.socket.close()
+
+def control_channel_process(cc_input, command_mailbox, source, heartbeat=None):
+    receiver = ControlReceiver(cc_input['control_channel'])
+    logging.info(f"Control channel connected to {cc_input['control_channel']['address']}:{cc_input['control_channel']['port']}")
+    try:
+        while True:
+            snapshot = receiver.recv()
+            if snapshot is not None:
+                command_mailbox.publish(snapshot, source=source)
+                if heartbeat is not None:
+                    beat(heartbeat)
+    finally:
+        receiver.close()
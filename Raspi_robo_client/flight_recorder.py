@@ -0,0 +1,188 @@
+import os
+import mmap
+import json
+import glob
+import heapq
+import queue
+import base64
+import struct
+import logging
+import threading
+import time
+import numpy as np
+
+# Segment files <stream>-<index>.rec in the session directory. A segment starts with SEGMENT_MAGIC, then records:
+# RECORD header (kind, monotonic t_ns, meta length, blob length), meta as JSON, blob (frame bytes, may be empty).
+SEGMENT_MAGIC = b'WPFR0001'
+RECORD = struct.Struct('<BqII')
+FRAME = 1
+COMMAND = 2
+TIMING = 3
+KIND_NAMES = {FRAME: 'frame', COMMAND: 'command', TIMING: 'timing'}
+
+def json_safe_command(received_data):
+    # command packets from the control channel are bytes, stored as the base64 text NetGear return_data carries
+    if isinstance(received_data.get('command_packet'), bytes):
+        return dict(received_data, command_packet=base64.b64encode(received_data['command_packet']).decode('ascii'))
+    return received_data
+
+class FlightRecorder(object):
+    """
+    Appends frames, command snapshots and timing stamps of one process (stream) to segment files of session_dir.
+    The caller only queues records, a background thread JPEG encodes raw frames and writes them. The queue holds at most
+    max_queue_mb, records that do not fit are dropped and counted, the caller never waits for the disk.
+    A new segment starts every segment_mb, only the newest max_segments are kept (0 keeps all).
+    Queued meta dicts and frames must not be changed by the caller afterwards, raw frames are copied.
+    """
+    def __init__(self, options, stream):
+        self.session_dir = options['session_dir']
+        self.stream = stream
+        self.segment_bytes = int(options.get('segment_mb', 64) * 1e6)
+        self.max_segments = options.get('max_segments', 0)
+        self.max_queue_bytes = int(options.get('max_queue_mb', 32) * 1e6)
+        self.frame_interval = options.get('frame_interval', 1)
+        self.quality = options.get('quality', 80)
+        self.colorspace = options.get('colorspace', 'BGR')
+        # raw frames are JPEG encoded like adaptive_video does, simplejpeg is needed only when recording
+        from adaptive_video import encode_frame
+        self._encode_frame = encode_frame
+        self.frames_seen = 0
+        self.recorded = 0
+        self.dropped = 0
+        self._dropping = False
+        self.bytes_written = 0
+        self._queued_bytes = 0
+        self._queue_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._segments = []
+        self._file = None
+        self._writer = None
+
+    def record(self, kind, meta, blob=None, t_ns=None):
+        """Queue a record, blob is a frame (raw frames are encoded by the writer) or bytes. Returns False if dropped."""
+        if self._writer is None:
+            # started in the process that records, not in the one that built the recorder
+            os.makedirs(self.session_dir, exist_ok=True)
+            self._writer = threading.Thread(target=self._write_loop, daemon=True)
+            self._writer.start()
+        size = blob.nbytes if isinstance(blob, np.ndarray) else len(blob or b'')
+        with self._queue_lock:
+            if self._queued_bytes + size > self.max_queue_bytes:
+                if not self._dropping:
+                    logging.warning(f'Flight recorder {self.stream}: writer behind, dropping records.')
+                self._dropping = True
+                self.dropped += 1
+                return False
+            self._dropping = False
+            self._queued_bytes += size
+        if isinstance(blob, np.ndarray) and blob.ndim == 3:
+            # a view into the shared frame slot, the camera overwrites it
+            blob = blob.copy()
+        self._queue.put((kind, t_ns or time.monotonic_ns(), meta, blob, size))
+        self.recorded += 1
+        return True
+
+    def record_frame(self, frame, meta, t_ns=None):
+        """Record every frame_interval-th frame."""
+        self.frames_seen += 1
+        if (self.frames_seen - 1) % self.frame_interval:
+            return False
+        return self.record(FRAME, meta, frame, t_ns)
+
+    def close(self):
+        if self._writer:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+
+    def stats(self):
+        return {'stream': self.stream, 'recorded': self.recorded, 'dropped': self.dropped, 'bytes_written': self.bytes_written,
+                'queued_bytes': self._queued_bytes, 'segments': len(self._segments)}
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            kind, t_ns, meta, blob, size = item
+            try:
+                if isinstance(blob, np.ndarray) and blob.ndim == 3:
+                    meta = dict(meta, video_params={'encoding': 'jpeg', 'colorspace': self.colorspace, 'scale': 1,
+                                                    'quality': self.quality, 'frame_size': [blob.shape[1], blob.shape[0]]})
+                    blob = self._encode_frame(blob, self.quality, 1, self.colorspace)
+                self._write(kind, t_ns, json.dumps(meta).encode(), b'' if blob is None else memoryview(blob).cast('B'))
+                if self._queue.empty():
+                    self._file.flush()
+            except Exception as exp:
+                logging.error(f'Flight recorder {self.stream}: {exp}')
+            finally:
+                with self._queue_lock:
+                    self._queued_bytes -= size
+        if self._file:
+            self._file.close()
+
+    def _write(self, kind, t_ns, meta, blob):
+        if self._file is None or self._file.tell() >= self.segment_bytes:
+            self._next_segment()
+        self._file.write(RECORD.pack(kind, t_ns, len(meta), len(blob)))
+        self._file.write(meta)
+        self._file.write(blob)
+        self.bytes_written += RECORD.size + len(meta) + len(blob)
+
+    def _next_segment(self):
+        if self._file:
+            self._file.close()
+        path = os.path.join(self.session_dir, f'{self.stream}-{len(self._segments) + 1:05d}.rec')
+        self._file = open(path, 'wb')
+        self._file.write(SEGMENT_MAGIC)
+        self._segments.append(path)
+        if self.max_segments and len(self._segments) > self.max_segments:
+            os.remove(self._segments[-self.max_segments - 1])
+
+class FlightLog(object):
+    """
+    Reads a session directory written by FlightRecorder through memory-mapped segments.
+    records() yields (kind, t_ns, meta, blob) of every stream merged in time order, blob is a memoryview into the mapping,
+    copy it to keep it past the segment.
+    """
+    def __init__(self, session_dir):
+        self.session_dir = session_dir
+        self.streams = {}
+        for path in sorted(glob.glob(os.path.join(session_dir, '*-*.rec'))):
+            stream = os.path.basename(path).rsplit('-', 1)[0]
+            self.streams.setdefault(stream, []).append(path)
+        if not self.streams:
+            raise FileNotFoundError(f'No flight recorder segments in {session_dir}')
+
+    def stream_records(self, stream):
+        for path in self.streams[stream]:
+            with open(path, 'rb') as file:
+                size = os.fstat(file.fileno()).st_size
+                if size <= len(SEGMENT_MAGIC):
+                    continue
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            if mapped[:len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+                mapped.close()
+                raise ValueError(f'{path} is not a flight recorder segment')
+            view = memoryview(mapped)
+            offset = len(SEGMENT_MAGIC)
+            while offset + RECORD.size <= size:
+                kind, t_ns, meta_length, blob_length = RECORD.unpack_from(mapped, offset)
+                meta_start = offset + RECORD.size
+                blob_start = meta_start + meta_length
+                offset = blob_start + blob_length
+                if offset > size:
+                    # cut short by a crash or power loss
+                    logging.warning(f'{path}: truncated record dropped')
+                    break
+                yield kind, t_ns, json.loads(bytes(view[meta_start:blob_start])), view[blob_start:offset]
+            del view
+            try:
+                mapped.close()
+            except BufferError:
+                # a blob of the last record is still referenced, the mapping goes with it
+                pass
+
+    def records(self):
+        # every stream is in time order already
+        return heapq.merge(*(self.stream_records(stream) for stream in self.streams), key=lambda record: record[1])
@@ -0,0 +1,127 @@
+import sys
+import time
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+class FrameRingBuffer(object):
+    """
+    Ring of preallocated frame slots in shared memory with latest-frame-wins semantics.
+    One writer (video_process) fills the slots in turn, readers (server_data_process) use the newest frame in place.
+
+    Shared memory layout: int64 header [write_seq, slot_seq_0 .. slot_seq_N-1, capture_ns_0 .. capture_ns_N-1]
+    followed by the frame slots. A slot_seq of -1 means the slot is empty or being written.
+    """
+    def __init__(self, shape, dtype=np.uint8, slots=4, name=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.slots = slots
+        self.frame_nbytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        self._header_nbytes = (1 + 2 * slots) * np.dtype(np.int64).itemsize
+        self._owner = name is None
+        if self._owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=self._header_nbytes + slots * self.frame_nbytes)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            if sys.version_info < (3, 13):
+                # attaching registers the segment again, the tracker would then unlink it when this process exits
+                resource_tracker.unregister(self.shm._name, 'shared_memory')
+        self._header = np.ndarray((1 + 2 * slots,), dtype=np.int64, buffer=self.shm.buf)
+        self._frames = np.ndarray((slots,) + self.shape, dtype=self.dtype, buffer=self.shm.buf, offset=self._header_nbytes)
+        if self._owner:
+            self._header[0] = 0
+            self._header[1:1 + slots] = -1
+            self._header[1 + slots:] = 0
+
+    def __reduce__(self):
+        # child processes attach to the same segment by name instead of copying it
+        return (self.__class__, (self.shape, self.dtype.str, self.slots, self.shm.name))
+
+    @property
+    def write_seq(self):
+        return int(self._header[0])
+
+    def begin_write(self):
+        """Return (seq, slot) where slot is the array to fill with the next frame."""
+        seq = int(self._header[0]) + 1
+        index = seq % self.slots
+        self._header[1 + index] = -1
+        return seq, self._frames[index]
+
+    def commit_write(self, seq, capture_ns=None):
+        """Publish the slot filled after begin_write(), capture_ns is a time.monotonic_ns() stamp of the capture."""
+        index = seq % self.slots
+        self._header[1 + self.slots + index] = capture_ns if capture_ns is not None else time.monotonic_ns()
+        self._header[1 + index] = seq
+        self._header[0] = seq
+
+    def write(self, frame, capture_ns=None):
+        seq, slot = self.begin_write()
+        np.copyto(slot, frame, casting='unsafe')
+        self.commit_write(seq, capture_ns)
+        return seq
+
+    def read_latest(self):
+        """Return (seq, frame) for the newest complete frame, frame is a view into shared memory. (0, None) if nothing written yet."""
+        seq = int(self._header[0])
+        if seq == 0:
+            return 0, None
+        return seq, self._frames[seq % self.slots]
+
+    def capture_ns(self, seq):
+        return int(self._header[1 + self.slots + seq % self.slots])
+
+    def is_current(self, seq):
+        """True while the slot of seq has not been reused by the writer."""
+        return int(self._header[1 + seq % self.slots]) == seq
+
+    def close(self):
+        self._header = None
+        self._frames = None
+        self.shm.close()
+
+    def unlink(self):
+        if self._owner:
+            self.shm.unlink()
+
+class EncodedFrameRing(FrameRingBuffer):
+    """
+    FrameRingBuffer of variable-size encoded frames (picamera2 hardware encoder output).
+    Every slot holds the payload length and a keyframe flag (int64 each) followed by up to capacity payload bytes.
+    H.264 readers need every buffer in order, read(seq) tells when the writer already reused the slot of seq.
+    """
+    SLOT_HEADER_NBYTES = 16
+
+    def __init__(self, capacity, slots=16, name=None):
+        # slots stay 8-byte aligned for the int64 slot header
+        self.capacity = -(-int(capacity) // 8) * 8
+        super().__init__((self.SLOT_HEADER_NBYTES + self.capacity,), np.uint8, slots, name)
+
+    def __reduce__(self):
+        return (self.__class__, (self.capacity, self.slots, self.shm.name))
+
+    def write_encoded(self, data, keyframe, capture_ns=None):
+        """Store one encoded frame, return its seq, None if it does not fit in a slot."""
+        payload = np.frombuffer(data, dtype=np.uint8)
+        if payload.size > self.capacity:
+            return None
+        seq, slot = self.begin_write()
+        slot[:self.SLOT_HEADER_NBYTES].view(np.int64)[:] = (payload.size, keyframe)
+        slot[self.SLOT_HEADER_NBYTES:self.SLOT_HEADER_NBYTES + payload.size] = payload
+        self.commit_write(seq, capture_ns)
+        return seq
+
+    def read(self, seq):
+        """Return (payload copy, keyframe) of seq, None if seq is not written yet or its slot was reused."""
+        if seq > self.write_seq or not self.is_current(seq):
+            return None
+        slot = self._frames[seq % self.slots]
+        length, keyframe = slot[:self.SLOT_HEADER_NBYTES].view(np.int64)
+        payload = slot[self.SLOT_HEADER_NBYTES:self.SLOT_HEADER_NBYTES + length].copy()
+        # the writer may have started on the slot while it was copied
+        if not self.is_current(seq):
+            return None
+        return payload, bool(keyframe)
+
+def frame_shape_from_camera_config(camera_config):
+    channels = 4 if camera_config['format'] in ('XBGR8888', 'XRGB8888') else 3
+    return (camera_config['size'][1], camera_config['size'][0], channels)
@@ -0,0 +1,32 @@
+import time
+import multiprocessing
+
+def new_heartbeat():
+    """Shared time.monotonic_ns() stamp of the last message from the PC, 0 before the first contact."""
+    return multiprocessing.RawValue('q', 0)
+
+def beat(heartbeat):
+    heartbeat.value = time.monotonic_ns()
+
+class LinkWatchdog(object):
+    """
+    Trips when the PC has been silent for longer than timeout_s. Every NetGear reply and every control channel snapshot
+    stamps the shared heartbeat, GPIO_process calls check() at least every check_interval_s.
+    The watchdog is not armed before the first contact.
+    """
+    def __init__(self, options, heartbeat):
+        self.timeout_ns = int(options.get('timeout_s', 0.5) * 1e9)
+        self.check_interval_s = options.get('timeout_s', 0.5) / 4
+        self.heartbeat = heartbeat
+        self.tripped = False
+
+    def check(self):
+        """Return 'tripped' when the link just went silent, 'restored' when it came back, None otherwise."""
+        last_beat_ns = self.heartbeat.value
+        if not last_beat_ns:
+            return None
+        silent = time.monotonic_ns() - last_beat_ns > self.timeout_ns
+        if silent != self.tripped:
+            self.tripped = silent
+            return 'tripped' if silent else 'restored'
+        return None
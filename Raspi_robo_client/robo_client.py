@@ -1,25 +1,40 @@
 # use picamera2 instead of PiGear
 from picamera2.picamera2 import Picamera2
+from picamera2.request import MappedArray
+from libcamera import Transform
 from vidgear.gears import NetGear
 from gpiozero import Servo, OutputDevice, Motor
 from gpiozero.pins.pigpio import PiGPIOFactory
-import datetime
+import os
+import sys
 import multiprocessing
 import numpy as np
-from copy import deepcopy
 import logging
 import json
+import time
+from frame_buffer import FrameRingBuffer, EncodedFrameRing, frame_shape_from_camera_config
+from camera_encoder import create_encoder, RingOutput, EncodedFrameReader, ENCODINGS
+from command_mailbox import CommandMailbox
+from command_codec import CommandDecoder
+from control_channel import control_channel_process
+from clock_sync import ClockOffsetEstimator
+from link_watchdog import LinkWatchdog, new_heartbeat, beat
+from actuation_loop import ActuationLoop
+from flight_recorder import FlightRecorder, json_safe_command, COMMAND, TIMING
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s: %(message)s')
 
+# CommandMailbox sources
+NETGEAR_SOURCE = 0
+CONTROL_CHANNEL_SOURCE = 1
+
 class L298N_Motor:
     """
     Improved class for DC motor control via L298N driver with enhanced initialization and error handling.
     """
-    def __init__(self, forward_pin, backward_pin, enable_pin=None, pigiofactory=False):
-        factory = PiGPIOFactory() if pigiofactory else None
-        self.motor = Motor(forward=forward_pin, backward=backward_pin, enable=enable_pin, pin_factory=factory)
+    def __init__(self, forward_pin, backward_pin, enable_pin=None, pin_factory=None):
+        self.motor = Motor(forward=forward_pin, backward=backward_pin, enable=enable_pin, pin_factory=pin_factory)
 
     def set_value(self, speed):
         if speed > 0:
@@ -33,9 +48,8 @@ class L298N_Motor:
         self.motor.close()
 
 class MyServo:
-    def __init__(self, pin, initial_value=0, min_pulse_width=0.0005, max_pulse_width=0.0025, frame_width=0.02, pigiofactory=False):
-        factory = PiGPIOFactory() if pigiofactory else None
-        self.servo = Servo(pin, initial_value=initial_value, min_pulse_width=min_pulse_width, max_pulse_width=max_pulse_width, frame_width=frame_width, pin_factory=factory)
+    def __init__(self, pin, initial_value=0, min_pulse_width=0.0005, max_pulse_width=0.0025, frame_width=0.02, pin_factory=None):
+        self.servo = Servo(pin, initial_value=initial_value, min_pulse_width=min_pulse_width, max_pulse_width=max_pulse_width, frame_width=frame_width, pin_factory=pin_factory)
 
     def set_value(self, value):
         self.servo.value = value
@@ -44,9 +58,8 @@ class MyServo:
         self.servo.close()
 
 class MyOutputDevice:
-    def __init__(self, pin, active_high=True, initial_value=False, pigiofactory=False):
-        factory = PiGPIOFactory() if pigiofactory else None
-        self.output_device = OutputDevice(pin, active_high=active_high, initial_value=initial_value, pin_factory=factory)
+    def __init__(self, pin, active_high=True, initial_value=False, pin_factory=None):
+        self.output_device = OutputDevice(pin, active_high=active_high, initial_value=initial_value, pin_factory=pin_factory)
     
     def set_value(self, value):
         self.output_device.value = value
@@ -59,25 +72,77 @@ class GPIOController:
         self.config = {'Last_setup_Time_ID': None}
         self.Last_command_Time_ID = None
         self.devices = {}
+        # last value written to each device, unchanged values are not written again
+        self.applied_values = {}
+        # GPIO_setups entry each live device was built from
+        self.device_setups = {}
+        # one pigpiod connection shared by every device with pigiofactory, kept across reconfigurations
+        self.pigpio_factory = None
+        # command packets address the devices by the index sent with the GPIO_setups
+        self.command_decoder = CommandDecoder()
+        self.last_packet_header = None
+        # with an ActuationLoop commands only set its targets, the loop writes the outputs
+        self.actuation_loop = None
         self.update_config(config_json)
 
+    def _device_kwargs(self, config_kwargs):
+        device_kwargs = dict(config_kwargs)
+        if device_kwargs.pop('pigiofactory', False):
+            if self.pigpio_factory is None:
+                self.pigpio_factory = PiGPIOFactory()
+            device_kwargs['pin_factory'] = self.pigpio_factory
+        return device_kwargs
+
     def _setup_gpio(self):
-        self.close_all_devices()
+        # setups are resent on every reconnect, only added, removed or changed devices are rebuilt,
+        # unchanged devices keep running with their last value
         logging.info(f'Output set with= {self.config}')
-        for device_name, device_settings in self.config['GPIO_setups'].items():
+        new_setups = self.config['GPIO_setups']
+        for device_name in list(self.devices):
+            if self.device_setups.get(device_name) != new_setups.get(device_name):
+                self.close_device(device_name)
+        for device_name, device_settings in new_setups.items():
+            if device_name in self.devices:
+                continue
             mode = device_settings['mode']
-            config_kwargs = device_settings['config_kwargs']
+            config_kwargs = self._device_kwargs(device_settings['config_kwargs'])
             if mode == 'Servo':
                 self.devices[device_name] = MyServo(**config_kwargs)
             elif mode == 'OutputDevice':
                 self.devices[device_name] = MyOutputDevice(**config_kwargs)
             elif mode == 'L298N_Motor':
                 self.devices[device_name] = L298N_Motor(**config_kwargs)
+            else:
+                logging.error(f'Unknown mode for device {device_name}: {mode}')
+                continue
+            self.device_setups[device_name] = device_settings
+            logging.info(f'Device {device_name} set with= {device_settings}')
+
+    def failsafe(self):
+        # outputs with a failsafe_value in GPIO_setups (motors stop by default) are set to it, the others keep their value
+        for device_name, device_settings in self.device_setups.items():
+            failsafe_value = device_settings.get('failsafe_value', 0 if device_settings['mode'] == 'L298N_Motor' else None)
+            if failsafe_value is None:
+                continue
+            if self.actuation_loop:
+                # straight to the failsafe value, no slew limit
+                self.actuation_loop.hold(device_name, failsafe_value)
+            if self.applied_values.get(device_name) != failsafe_value:
+                self.devices[device_name].set_value(failsafe_value)
+                self.applied_values[device_name] = failsafe_value
+
+    def close_device(self, device_name):
+        logging.info(f'Closing device {device_name}')
+        self.devices.pop(device_name).close()
+        self.device_setups.pop(device_name, None)
+        self.applied_values.pop(device_name, None)
+        if self.actuation_loop:
+            self.actuation_loop.forget(device_name)
 
     def close_all_devices(self):
         logging.info(f'Closing all devices... {self.devices}')
-        for each_device in self.devices:
-            self.devices[each_device].close()
+        for each_device in list(self.devices):
+            self.close_device(each_device)
 
     def update_config(self, new_config_json):
         if 'GPIO_command' in new_config_json:
@@ -85,93 +150,348 @@ class GPIOController:
             self.config['Last_command_Time_ID'] = new_config_json['CTime_ID']
             if new_config_json['GPIO_command'] is not None:
                 self.control()
+        if 'command_packet' in new_config_json:
+            self.control_packet(new_config_json['command_packet'])
         if 'GPIO_setups' in new_config_json and new_config_json['CTime_ID'] != self.config['Last_setup_Time_ID']:
             self.config['GPIO_setups'] = new_config_json['GPIO_setups']
             self.config['Last_setup_Time_ID'] = new_config_json['CTime_ID']
             self._setup_gpio()
+            self.command_decoder.set_index(new_config_json.get('device_index', []), new_config_json['CTime_ID'])
 
     def control(self):
         if self.Last_command_Time_ID != self.config['Last_command_Time_ID']:
             self.Last_command_Time_ID = self.config['Last_command_Time_ID']
             logging.info(self.config['Last_command_Time_ID'])
+        changed_actions = []
+        last_values = self._last_values()
         for device_name, action in self.config['GPIO_command'].items():
             if device_name in self.devices:
                 if isinstance(action, (int, float)) and -1 <= action <= 1:
-                    self.devices[device_name].set_value(action)
+                    if last_values.get(device_name) != action:
+                        changed_actions.append((device_name, action))
                 else:
                     logging.error(f'Invalid action for device {device_name}: {action}')
             else:
                 logging.error(f'Unknown device: {device_name}')
+        return self._command(changed_actions)
+
+    def control_packet(self, packet):
+        # binary snapshot, NaN marks a device without a command
+        decoded = self.command_decoder.decode(packet)
+        if decoded is None:
+            self.last_packet_header = None
+            logging.error('Command packet malformed or for other GPIO_setups, dropped.')
+            return 0
+        self.last_packet_header, values = decoded
+        changed_actions = []
+        last_values = self._last_values()
+        for device_name, action in zip(self.command_decoder.devices, values):
+            if action != action:
+                continue
+            if device_name not in self.devices:
+                logging.error(f'Unknown device: {device_name}')
+            elif not -1 <= action <= 1:
+                logging.error(f'Invalid action for device {device_name}: {action}')
+            elif last_values.get(device_name) != action:
+                changed_actions.append((device_name, action))
+        return self._command(changed_actions)
+
+    def _last_values(self):
+        return self.actuation_loop.targets if self.actuation_loop else self.applied_values
+
+    def _command(self, changed_actions):
+        if self.actuation_loop:
+            self.actuation_loop.set_targets(changed_actions)
+            return len(changed_actions)
+        return self._apply(changed_actions)
 
-def GPIO_process(gpio_input):
-    gpio_controller = GPIOController(deepcopy(gpio_input['received_data']))
+    def _apply(self, changed_actions):
+        # the whole snapshot is validated first, then only the changed outputs are written in one pass
+        for device_name, action in changed_actions:
+            self.devices[device_name].set_value(action)
+            self.applied_values[device_name] = action
+        return len(changed_actions)
+
+def GPIO_process(gpio_input, command_mailbox, heartbeat, applied_setups_id):
+    gpio_controller = GPIOController({})
+    watchdog = LinkWatchdog(gpio_input['watchdog'], heartbeat) if gpio_input['watchdog']['enabled'] else None
+    actuation_options = gpio_input['actuation_loop']
+    if actuation_options['enabled']:
+        gpio_controller.actuation_loop = ActuationLoop(actuation_options, gpio_controller)
+        stats_interval_s = actuation_options.get('stats_interval_s', 10)
+        next_stats_time = time.monotonic() + stats_interval_s
+    actuation_loop = gpio_controller.actuation_loop
+    recorder = FlightRecorder(gpio_input['flight_recorder'], 'gpio') if gpio_input['flight_recorder']['enabled'] else None
+    command_version = 0
     while True:
-        local_received = deepcopy(gpio_input['received_data'])
-        gpio_controller.update_config(local_received)
+        # sleeps until server_data_process or control_channel_process publishes new data, or the watchdog or the next
+        # actuation tick is due
+        if actuation_loop:
+            timeout = actuation_loop.time_to_deadline()
+        else:
+            timeout = watchdog.check_interval_s if watchdog else None
+        command_version, received_data = command_mailbox.wait(command_version, timeout)
+        for each_received in received_data:
+            if recorder:
+                recorder.record(COMMAND, json_safe_command(each_received))
+            gpio_controller.update_config(each_received)
+            if 'GPIO_setups' in each_received:
+                applied_setups_id.value = gpio_controller.config['Last_setup_Time_ID']
+            gpio_data = None
+            if each_received.get('GPIO_command') is not None and 'trace' in each_received:
+                # reported back to the PC with the next frame for stick-to-wheel latency
+                gpio_data = dict(each_received['trace'], apply_ns=time.monotonic_ns())
+            elif 'command_packet' in each_received and gpio_controller.last_packet_header:
+                packet_header = gpio_controller.last_packet_header
+                gpio_data = {'event_ns': packet_header['event_ns'], 'send_ns': packet_header['send_ns'] or None,
+                             'apply_ns': time.monotonic_ns()}
+            if gpio_data:
+                gpio_input['gpio_data_to_send'] = gpio_data
+                if recorder:
+                    recorder.record(TIMING, {'gpio_data': gpio_data})
+        if watchdog:
+            link_state = watchdog.check()
+            if recorder and link_state:
+                recorder.record(TIMING, {'watchdog': link_state})
+            if link_state == 'tripped':
+                gpio_controller.failsafe()
+                logging.warning('Watchdog: no data from the PC, actuators stopped.')
+            elif link_state == 'restored':
+                logging.info('Watchdog: link restored.')
+        if actuation_loop:
+            actuation_loop.run_due()
+            if time.monotonic() >= next_stats_time:
+                next_stats_time += stats_interval_s
+                actuation_stats = actuation_loop.stats()
+                logging.info(f'Actuation loop: {actuation_stats}')
+                if recorder:
+                    recorder.record(TIMING, {'actuation_loop': actuation_stats})
+
+def camera_rotation(camera_config):
+    # the sensor can only flip, 180 degrees is a horizontal plus a vertical flip
+    rotation = camera_config.get('rotation', 0)
+    if rotation not in (0, 180):
+        logging.error(f'Unsupported camera rotation {rotation}, only 0 and 180 are supported.')
+        return 0
+    return rotation
 
-def video_process(video_input):
+def video_process(video_input, frame_buffer):
+    camera_config = video_input['camera_config']
+    encoder = None
     try:
         # Initialize picamera2
         picamera2 = Picamera2()
-        video_size = (video_input['camera_config']['size'][0], video_input['camera_config']['size'][1])
-        preview_config = picamera2.create_preview_configuration(main={"size": video_size, "format": video_input['camera_config']['format']})
+        video_size = (camera_config['size'][0], camera_config['size'][1])
+        # rotated by libcamera, the frames leave the camera upright and the PC does not rotate them again
+        transform = Transform(hflip=1, vflip=1) if camera_rotation(camera_config) == 180 else Transform()
+        if camera_config.get('encoder'):
+            # the hardware encoder fills frame_buffer (an EncodedFrameRing), nothing passes through Python per frame
+            video_config = picamera2.create_video_configuration(main={"size": video_size, "format": camera_config['format']}, transform=transform)
+            picamera2.configure(video_config)
+            encoder = create_encoder(camera_config)
+            picamera2.start_recording(encoder, RingOutput(frame_buffer))
+            while video_input['commands'] != 'STOP_video_process':
+                time.sleep(0.1)
+            return
+        preview_config = picamera2.create_preview_configuration(main={"size": video_size, "format": camera_config['format']}, transform=transform)
         picamera2.configure(preview_config)
         picamera2.start()
         while video_input['commands'] != 'STOP_video_process':
-            video_input['video_frame'] = picamera2.capture_array()
+            # copy straight from the camera buffer into the next shared slot, no intermediate array
+            request = picamera2.capture_request()
+            capture_ns = time.monotonic_ns()
+            try:
+                with MappedArray(request, 'main') as mapped:
+                    seq, slot = frame_buffer.begin_write()
+                    np.copyto(slot, mapped.array)
+                    frame_buffer.commit_write(seq, capture_ns)
+            finally:
+                request.release()
     finally:
-        picamera2.stop()
+        if encoder:
+            picamera2.stop_recording()
+        else:
+            picamera2.stop()
+        frame_buffer.close()
 
-def server_data_process(sdv_input):
+def server_data_process(sdv_input, frame_buffer, command_mailbox, heartbeat, applied_setups_id):
     def server_connect():
         # server = NetGear(address=sdv_input['server_ip'], port="58954", protocol="tcp", source=None, logging=True, bidirectional_mode=True)
+        # request_timeout (seconds, at least 4) and max_retries bound how long a send waits for the PC before reconnecting
+        retry_options = {key: sdv_input['netgear_options'][key] for key in ('request_timeout', 'max_retries') if key in sdv_input['netgear_options']}
         server = NetGear(address=sdv_input['netgear_options']['address'], port=sdv_input['netgear_options']['port'],
                           protocol=sdv_input['netgear_options']['protocol'], source=None, logging=sdv_input['netgear_options']['logging'],
-                            bidirectional_mode=sdv_input['netgear_options']['bidirectional_mode'])
+                            bidirectional_mode=sdv_input['netgear_options']['bidirectional_mode'],
+                            **({'jpeg_compression': False} if quality_controller or tile_encoder or encoded_reader else {}), **retry_options)
         return server
 
+    camera_config = sdv_input['camera_config']
+    # hardware encoded frames are forwarded as they left the encoder, adaptive and tile video need raw frames
+    encoded_reader = EncodedFrameReader(frame_buffer, camera_config['encoder']) if camera_config.get('encoder') else None
+    if encoded_reader and (sdv_input['adaptive_video']['enabled'] or sdv_input['tile_video']['enabled']):
+        logging.warning('adaptive_video and tile_video are ignored with a camera encoder.')
+    # with adaptive or tile video the frames are JPEG encoded here, NetGear only forwards the bytes. Imported only then,
+    # simplejpeg is not needed otherwise
+    quality_controller = None
+    tile_encoder = None
+    if (sdv_input['adaptive_video']['enabled'] or sdv_input['tile_video']['enabled']) and not encoded_reader:
+        from adaptive_video import AdaptiveQualityController, encode_frame, JPEG_COLORSPACES
+        colorspace = JPEG_COLORSPACES.get(camera_config['format'], 'BGR')
+        if sdv_input['adaptive_video']['enabled']:
+            quality_controller = AdaptiveQualityController(sdv_input['adaptive_video'])
+        else:
+            # tile video sends only the tiles that changed, adaptive video takes precedence when both are enabled
+            from tile_video import TileDeltaEncoder
+            tile_encoder = TileDeltaEncoder(sdv_input['tile_video'], frame_buffer.shape, colorspace)
+    rotation = camera_rotation(camera_config)
+    recorder = FlightRecorder(sdv_input['flight_recorder'], 'video') if sdv_input['flight_recorder']['enabled'] else None
+    next_frame_time = 0
+    clock_offset = ClockOffsetEstimator()
     server = server_connect()
     last_recv_data = None
+    last_frame_seq = 0
+    torn_frames = 0
+    blank_frame = np.zeros(frame_buffer.shape, dtype=frame_buffer.dtype)
     while True:
         try:
             if sdv_input['commands'] == 'STOP_server':
                 server.close()
                 break
-            Time_ID = datetime.datetime.now()
-            data_for_client = {'STime_ID': str(Time_ID), 'message': 'Hello, I am a Server.', 'gpio_data': sdv_input['gpio_data_to_send']}
-            if sdv_input['video_frame'] is None:
-                sdv_input['video_frame'] = np.array(np.zeros((480, 640, 3)), dtype=np.uint8)
+            if quality_controller:
+                frame_wait = next_frame_time - time.monotonic()
+                if frame_wait > 0:
+                    time.sleep(frame_wait)
+                    continue
+            if encoded_reader:
+                encoded = encoded_reader.next()
+                if encoded is None:
+                    # wait for the encoder
+                    time.sleep(0.001)
+                    continue
+                frame_seq, frame, keyframe = encoded
+            else:
+                frame_seq, frame = frame_buffer.read_latest()
+                if frame is None:
+                    frame = blank_frame
+                elif frame_seq == last_frame_seq:
+                    # latest frame already sent, wait for the camera
+                    time.sleep(0.001)
+                    continue
+                last_frame_seq = frame_seq
+            data_for_client = {'message': 'Hello, I am a Server.', 'gpio_data': sdv_input['gpio_data_to_send'],
+                               'trace': {'capture_ns': frame_buffer.capture_ns(frame_seq) if frame_seq else None,
+                                         'clock_offset_ns': clock_offset.offset_ns},
+                               'session': {'setups_id': applied_setups_id.value or None}, 'camera_rotation': rotation}
+            if encoded_reader:
+                data_for_client['video_params'] = {'encoding': ENCODINGS[camera_config['encoder']], 'keyframe': keyframe,
+                                                   'colorspace': 'BGR', 'scale': 1, 'frame_size': camera_config['size']}
+            elif quality_controller:
+                frame = encode_frame(frame, quality_controller.quality, quality_controller.scale, colorspace)
+                data_for_client['video_params'] = dict(quality_controller.operating_point(), encoding='jpeg', colorspace=colorspace,
+                                                       frame_size=sdv_input['camera_config']['size'])
+            elif tile_encoder:
+                frame, data_for_client['video_params'] = tile_encoder.encode(frame)
+            if (quality_controller or tile_encoder) and frame_seq and not frame_buffer.is_current(frame_seq):
+                # the camera reused the slot during the encode, a newer frame is already there
+                torn_frames += 1
+                logging.warning(f'Frame {frame_seq} overwritten while encoding, skipped ({torn_frames} so far).')
+                if tile_encoder:
+                    # the reference holds the torn tiles
+                    tile_encoder.request_keyframe()
+                continue
+            if quality_controller:
+                next_frame_time = time.monotonic() + quality_controller.frame_interval
 
-            recv_data = server.send(frame = sdv_input['video_frame'], message=data_for_client)
+            # raw frames are a view into the shared slot, NetGear encodes them in place
+            send_ns = data_for_client['trace']['send_ns'] = time.monotonic_ns()
+            if recorder:
+                # raw frames are copied here and JPEG encoded by the recorder's writer thread
+                recorder.record_frame(frame, dict(data_for_client, frame_seq=frame_seq), send_ns)
+            recv_data = server.send(frame=frame, message=data_for_client)
+            reply_ns = time.monotonic_ns()
+            if recv_data is not None and not (encoded_reader or quality_controller or tile_encoder) and frame_seq \
+                    and not frame_buffer.is_current(frame_seq):
+                # the camera reused the slot while NetGear encoded it (or the recorder copied it), the PC got a torn
+                # frame: the newer frame already in the buffer is sent right away
+                torn_frames += 1
+                logging.warning(f'Frame {frame_seq} overwritten while sending, resending the newest ({torn_frames} so far).')
+            if recv_data is None:
+                # the PC answers every frame, None is a timed out send: the frame may be lost, resync at a keyframe
+                if tile_encoder:
+                    tile_encoder.request_keyframe()
+                if encoded_reader:
+                    encoded_reader.wait_keyframe()
+            beat(heartbeat)
+            if recorder:
+                recorder.record(TIMING, {'frame_seq': frame_seq, 'send_ns': send_ns, 'reply_ns': reply_ns, 'frame_bytes': frame.nbytes}, t_ns=reply_ns)
+            if quality_controller and quality_controller.update((reply_ns - send_ns) / 1e9, frame.nbytes):
+                logging.info(f'Video operating point -> {quality_controller.operating_point()}')
+            # the echo changes with every reply, keep it out of the comparison and of the GPIO commands
+            trace_echo = recv_data.pop('trace_echo', None) if isinstance(recv_data, dict) else None
+            clock_offset.on_reply(send_ns, reply_ns, trace_echo)
             if recv_data and recv_data != last_recv_data:
                 logging.info(f'Server data process -> {recv_data}')
                 last_recv_data = recv_data
-                sdv_input['received_data'] = recv_data
+                command_mailbox.publish(recv_data, source=NETGEAR_SOURCE)
         except Exception as exp:
             logging.error(exp)
             server.close()
             if '[NetGear:ERROR] :: Client(s) seems to be offline, Abandoning.' in str(exp):
                 logging.info('Reloading server.')
                 server = server_connect()
+                if tile_encoder:
+                    # the PC may have missed tiles, start the new connection from a full frame
+                    tile_encoder.request_keyframe()
+                if encoded_reader:
+                    # the PC may have missed H.264 frames, the new connection starts at a keyframe
+                    encoded_reader.wait_keyframe()
             else:
                 break
+    if recorder:
+        recorder.close()
 
 
-if __name__ == '__main__':
+def main(config_path='config.json'):
 
-    with open('config.json', 'r') as file:
+    with open(config_path, 'r') as file:
         configs = json.load(file)
 
     manager = multiprocessing.Manager()
-    mp_variable = manager.dict(video_frame=None, gpio_data_to_send=None, commands=None, received_data={})
+    mp_variable = manager.dict(gpio_data_to_send=None, commands=None)
     mp_variable['netgear_options'] = configs["netgear_options"]
     mp_variable['camera_config'] = configs["camera_config"]
+    mp_variable['control_channel'] = configs.get("control_channel", {'enabled': False})
+    mp_variable['adaptive_video'] = configs.get("adaptive_video", {'enabled': False})
+    mp_variable['tile_video'] = configs.get("tile_video", {'enabled': False})
+    mp_variable['watchdog'] = configs.get("watchdog", {'enabled': False})
+    mp_variable['actuation_loop'] = configs.get("actuation_loop", {'enabled': False})
+    flight_recorder = configs.get("flight_recorder", {'enabled': False})
+    if flight_recorder['enabled']:
+        from adaptive_video import JPEG_COLORSPACES
+        # one directory per run, each process writes its own stream of segments into it
+        flight_recorder = dict(flight_recorder, session_dir=os.path.join(flight_recorder.get('directory', 'flight_logs'), time.strftime('%Y%m%d-%H%M%S')),
+                               colorspace=JPEG_COLORSPACES.get(configs["camera_config"]['format'], 'BGR'))
+        logging.info(f"Flight recorder -> {flight_recorder['session_dir']}")
+    mp_variable['flight_recorder'] = flight_recorder
+    heartbeat = new_heartbeat()
+    if configs["camera_config"].get('encoder'):
+        frame_buffer = EncodedFrameRing(configs["camera_config"].get('encoded_buffer_kb', 512) * 1024,
+                                        slots=configs["camera_config"].get('encoded_buffer_slots', 16))
+    else:
+        frame_buffer = FrameRingBuffer(frame_shape_from_camera_config(configs["camera_config"]),
+                                       slots=configs["camera_config"].get('frame_buffer_slots', 4))
+    command_mailbox = CommandMailbox(sources=2)
+    # CTime_ID of the GPIO_setups GPIO_process has applied, reported to the PC which sends the setups until it matches.
+    # A command published after the setups replaces them in the mailbox, so handing them over is not enough.
+    applied_setups_id = multiprocessing.RawValue('q', 0)
 
     processes = [
-        multiprocessing.Process(target=server_data_process, args=(mp_variable,)),
-        multiprocessing.Process(target=video_process, args=(mp_variable,)),
-        multiprocessing.Process(target=GPIO_process, args=(mp_variable,))
+        multiprocessing.Process(target=server_data_process, args=(mp_variable, frame_buffer, command_mailbox, heartbeat, applied_setups_id)),
+        multiprocessing.Process(target=video_process, args=(mp_variable, frame_buffer)),
+        multiprocessing.Process(target=GPIO_process, args=(mp_variable, command_mailbox, heartbeat, applied_setups_id))
     ]
+    if mp_variable['control_channel']['enabled']:
+        processes.append(multiprocessing.Process(target=control_channel_process, args=(mp_variable, command_mailbox, CONTROL_CHANNEL_SOURCE, heartbeat)))
 
     for p in processes:
         p.start()
@@ -182,4 +502,10 @@ if __name__ == '__main__':
         p.terminate()
         p.join()
 
+    frame_buffer.close()
+    frame_buffer.unlink()
     logging.info("Processes terminated.")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else 'config.json')
@@ -0,0 +1,70 @@
+import numpy as np
+import simplejpeg
+from adaptive_video import encode_frame
+
+class TileDeltaEncoder(object):
+    """
+    Sends only the parts of the frame that changed since they were last sent.
+    The frame is split in tile_size x tile_size tiles, a tile counts as changed when its mean absolute difference to the
+    reference (the tiles as last sent) is above threshold. Changed tiles are stacked into one strip and JPEG encoded
+    together, message params list their indices. A full frame (keyframe) is sent every keyframe_interval frames, on
+    request and when more than max_changed_fraction of the tiles changed, where one JPEG of the frame is smaller.
+    tile_size should be a multiple of 16 so the JPEG blocks of the strip never mix two tiles.
+    """
+    def __init__(self, options, frame_shape, colorspace='BGR'):
+        self.tile_size = options.get('tile_size', 32)
+        self.threshold = options.get('threshold', 3)
+        self.keyframe_interval = options.get('keyframe_interval', 60)
+        self.max_changed_fraction = options.get('max_changed_fraction', 0.6)
+        self.quality = options.get('quality', 80)
+        self.colorspace = colorspace
+        self.frame_shape = tuple(frame_shape)
+        height, width, channels = self.frame_shape
+        self.tile_rows = -(-height // self.tile_size)
+        self.tile_cols = -(-width // self.tile_size)
+        padded_shape = (self.tile_rows * self.tile_size, self.tile_cols * self.tile_size, channels)
+        # frames whose size is not a multiple of tile_size are copied into a padded buffer, the border stays black
+        self._padded = np.zeros(padded_shape, dtype=np.uint8) if padded_shape != self.frame_shape else None
+        self._reference = np.zeros(padded_shape, dtype=np.uint8)
+        self._difference = np.empty(padded_shape, dtype=np.int16)
+        self._changed_limit = self.threshold * self.tile_size * self.tile_size * channels
+        self._frames_since_keyframe = None
+        self.keyframes = 0
+        self.delta_frames = 0
+
+    def _tiles_view(self, array):
+        return array.reshape(self.tile_rows, self.tile_size, self.tile_cols, self.tile_size, array.shape[2])
+
+    def request_keyframe(self):
+        self._frames_since_keyframe = None
+
+    def encode(self, frame):
+        """Return (payload, params): the JPEG as a 1-D uint8 array and the video_params describing it."""
+        if self._padded is not None:
+            self._padded[:frame.shape[0], :frame.shape[1]] = frame
+            frame = self._padded
+        params = {'encoding': 'tiles', 'tile_size': self.tile_size, 'colorspace': self.colorspace, 'quality': self.quality,
+                  'frame_size': [self.frame_shape[1], self.frame_shape[0]]}
+        keyframe = self._frames_since_keyframe is None or self._frames_since_keyframe >= self.keyframe_interval - 1
+        if not keyframe:
+            np.subtract(frame, self._reference, out=self._difference, dtype=np.int16)
+            np.abs(self._difference, out=self._difference)
+            tile_sums = self._tiles_view(self._difference).sum(axis=(1, 3, 4))
+            rows, cols = np.nonzero(tile_sums > self._changed_limit)
+            keyframe = len(rows) > self.max_changed_fraction * self.tile_rows * self.tile_cols
+        if keyframe:
+            np.copyto(self._reference, frame)
+            self._frames_since_keyframe = 0
+            self.keyframes += 1
+            return encode_frame(frame[:self.frame_shape[0], :self.frame_shape[1]], self.quality, 1, self.colorspace), dict(params, keyframe=True)
+        self._frames_since_keyframe += 1
+        self.delta_frames += 1
+        params.update(keyframe=False, tiles=(rows * self.tile_cols + cols).tolist())
+        if not len(rows):
+            return np.empty(0, dtype=np.uint8), params
+        frame_tiles = self._tiles_view(frame)
+        tiles = frame_tiles[rows, :, cols]
+        self._tiles_view(self._reference)[rows, :, cols] = tiles
+        strip = tiles.reshape(len(rows) * self.tile_size, self.tile_size, frame.shape[2])
+        jpeg = simplejpeg.encode_jpeg(strip, quality=self.quality, colorspace=self.colorspace, fastdct=True)
+        return np.frombuffer(jpeg, dtype=np.uint8), params
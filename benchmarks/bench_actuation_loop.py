@@ -0,0 +1,151 @@
+# Drives GPIOController on gpiozero's MockFactory with the synthetic driving trace at the camera rate, delivered over a
+# bursty link: most commands arrive after a few ms, every stall_every_s the link stalls for stall_ms and only the newest
+# command of the stall reaches the CommandMailbox. Compares writing on arrival (the previous behaviour) with the
+# ActuationLoop and the max_rate / max_accel of configs.json: the wheels' largest single step and change within 100 ms,
+# how far the outputs trail the received commands, pin writes, GPIO process CPU, missed deadlines and tick jitter.
+# Usage: python bench_actuation_loop.py [seconds] [--rate-hz 100] [--command-hz 30] [--stall-ms 150] [--stall-every-s 0.5]
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+# the Pi directory goes first, both sides have a control_channel module
+sys.path[:0] = [os.path.join(BENCH_DIR, 'sim_modules'), os.path.join(BENCH_DIR, '..', 'Raspi_robo_client'),
+                os.path.join(BENCH_DIR, '..', 'PC_robo_server')]
+from sim_launch import install_mock_gpio
+install_mock_gpio()
+from bench_utils import load_side_module, PinWriteCounter
+from controller import Controller, ControllerTransformer
+from replay_gamepad import ReplayGamepad, synthetic_drive_trace
+from command_mailbox import CommandMailbox
+from actuation_loop import ActuationLoop
+
+robo_client = load_side_module('pi', 'robo_client')
+logging.disable(logging.INFO)
+
+WHEELS = ('wheels_Left', 'wheels_Right')
+WINDOW_S = 0.1
+
+def load_configs():
+    with open(os.path.join(BENCH_DIR, '..', 'PC_robo_server', 'configs.json'), 'r') as file:
+        return json.load(file)
+
+def command_schedule(controls_GPIO, seconds, command_hz, poll_hz=250):
+    # the controller state at each command send time, as controller_process sends it with every frame
+    controller = Controller(gamepad=ReplayGamepad(synthetic_drive_trace(int(seconds * poll_hz) + 1, poll_hz)))
+    ctrltrans = ControllerTransformer(controls_GPIO)
+    schedule = []
+    reads_per_command = poll_hz / command_hz
+    for read in range(int(seconds * poll_hz)):
+        ctrltrans.transform_batch(controller.process_events())
+        if read >= len(schedule) * reads_per_command:
+            schedule.append(dict(ctrltrans.last_transformed_values))
+    return schedule
+
+def feeder(command_mailbox, schedule, start_time, command_hz, stall_s, stall_every_s, latency_s=0.004):
+    for i, GPIO_command in enumerate(schedule):
+        send_time = i / command_hz
+        arrival = send_time + latency_s
+        stall_start = send_time // stall_every_s * stall_every_s
+        if send_time - stall_start < stall_s:
+            # stalled link, delivered at the end of the stall (the mailbox keeps only the newest)
+            arrival = stall_start + stall_s + latency_s
+        wait = start_time + arrival - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        command_mailbox.publish({'CTime_ID': i, 'GPIO_command': GPIO_command})
+    command_mailbox.publish({'stop': True})
+
+def run_case(mode, configs, schedule, args, pin_writes):
+    gpio_controller = robo_client.GPIOController({'CTime_ID': 0, 'GPIO_setups': configs['GPIO_setups']})
+    actuation_loop = None
+    if mode == 'actuation_loop':
+        actuation_loop = gpio_controller.actuation_loop = ActuationLoop({'rate_hz': args.rate_hz}, gpio_controller)
+    writes, received = [], []
+    apply = gpio_controller._apply
+
+    def recorded_apply(changed_actions):
+        now = time.monotonic()
+        writes.extend((now, device_name, value) for device_name, value in changed_actions if device_name in WHEELS)
+        return apply(changed_actions)
+
+    gpio_controller._apply = recorded_apply
+    pin_writes.writes = 0
+    command_mailbox = CommandMailbox()
+    start_time = time.monotonic() + 0.2
+    feed = multiprocessing.Process(target=feeder, args=(command_mailbox, schedule, start_time, args.command_hz,
+                                                        args.stall_ms / 1000, args.stall_every_s))
+    feed.start()
+    command_version = 0
+    cpu_start = time.process_time()
+    running = True
+    if actuation_loop:
+        actuation_loop.next_deadline_ns = time.monotonic_ns()
+        actuation_loop.stats()
+    # GPIO_process without the watchdog
+    while running:
+        timeout = actuation_loop.time_to_deadline() if actuation_loop else None
+        command_version, received_data = command_mailbox.wait(command_version, timeout)
+        for each_received in received_data:
+            if each_received.get('stop'):
+                running = False
+                continue
+            gpio_controller.update_config(each_received)
+            received.append((time.monotonic(), each_received['GPIO_command']))
+        if actuation_loop:
+            actuation_loop.run_due()
+    cpu_s = time.process_time() - cpu_start
+    feed.join()
+    loop_stats = actuation_loop.stats() if actuation_loop else None
+    gpio_controller.close_all_devices()
+    return dict({'mode': mode, 'commands_received': len(received), 'pin_writes': pin_writes.writes,
+                 'gpio_process_cpu_pct': round(100 * cpu_s / (time.monotonic() - start_time), 1)},
+                **wheel_motion(writes, received, start_time), actuation_loop=loop_stats)
+
+def held_values(events, times):
+    # value of the last event at or before each of times, 0 before the first
+    event_times = np.array([event[0] for event in events])
+    values = np.array([0.0] + [event[1] for event in events])
+    return values[np.searchsorted(event_times, times, side='right')]
+
+def wheel_motion(writes, received, start_time):
+    motion = {'max_step_per_write': {}, 'max_change_in_100ms': {}, 'mean_lag_behind_command': {}}
+    grid = np.arange(start_time, max([write[0] for write in writes] + [received[-1][0]]) + 0.5, 0.01)
+    for wheel in WHEELS:
+        wheel_writes = [(t, value) for t, name, value in writes if name == wheel]
+        times = np.array([t for t, _ in wheel_writes])
+        values = np.array([value for _, value in wheel_writes])
+        motion['max_step_per_write'][wheel] = round(float(np.abs(np.diff(values)).max()), 3)
+        # largest change of the output within any WINDOW_S, a jump shows up whole
+        before = held_values(wheel_writes, times - WINDOW_S)
+        motion['max_change_in_100ms'][wheel] = round(float(np.abs(values - before).max()), 3)
+        applied = held_values(wheel_writes, grid)
+        commanded = held_values([(t, command[wheel]) for t, command in received if wheel in command], grid)
+        motion['mean_lag_behind_command'][wheel] = round(float(np.abs(commanded - applied).mean()), 4)
+    return motion
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('seconds', type=float, nargs='?', default=10)
+    parser.add_argument('--rate-hz', type=float, default=100)
+    parser.add_argument('--command-hz', type=float, default=30)
+    parser.add_argument('--stall-ms', type=float, default=150)
+    parser.add_argument('--stall-every-s', type=float, default=0.5)
+    args = parser.parse_args()
+    configs = load_configs()
+    pin_writes = PinWriteCounter()
+    schedule = command_schedule(configs['controls_GPIO'], args.seconds, args.command_hz)
+    limits = {wheel: {key: configs['GPIO_setups'][wheel].get(key) for key in ('max_rate', 'max_accel')} for wheel in WHEELS}
+    results = [run_case(mode, configs, schedule, args, pin_writes) for mode in ('on_arrival', 'actuation_loop')]
+    print(json.dumps({'benchmark': 'actuation_loop', 'seconds': args.seconds, 'rate_hz': args.rate_hz,
+                      'command_hz': args.command_hz, 'stall_ms': args.stall_ms, 'stall_every_s': args.stall_every_s,
+                      'limits': limits, 'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
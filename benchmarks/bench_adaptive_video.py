@@ -0,0 +1,116 @@
+# Runs AdaptiveQualityController against a link whose bandwidth drops and recovers.
+# The robot side is a real NetGear server on loopback, the PC side speaks NetGear's wire protocol on a ZMQ PAIR socket and
+# holds every reply for a base latency plus the payload serialization time, like congested WiFi does, so the controller
+# is fed the round trip times server.send() measures.
+# Compares the adaptive operating point with the fixed best-quality setting per link phase.
+# Usage: python bench_adaptive_video.py [seconds_per_phase]
+
+import sys
+import json
+import time
+import threading
+import zmq
+import numpy as np
+from vidgear.gears import NetGear
+
+from bench_utils import load_side_module
+
+adaptive_video = load_side_module('pi', 'adaptive_video')
+
+VIDEO_PORT = '58966'
+
+# (name, bandwidth in Mbit/s, base one-way latency in ms)
+LINK_PHASES = [('good', 20, 3), ('congested', 3, 15), ('bad', 1, 30), ('recovered', 20, 3)]
+
+ADAPTIVE_OPTIONS = {'enabled': True, 'quality_range': [30, 85], 'quality_step': 10, 'fps_range': [10, 30], 'fps_step': 5,
+                    'scale_factors': [1, 2, 4], 'rtt_low_ms': 40, 'rtt_high_ms': 120, 'hold_frames': 10, 'down_hold_frames': 3}
+
+class DelayedLinkReceiver(object):
+    """
+    PC end of the link: receives the NetGear frames on a PAIR socket and answers each one like a NetGear client in
+    bidirectional mode, after sleeping 2 * base_latency_ms plus the serialization time of the payload at bandwidth_mbps.
+    """
+    def __init__(self, port):
+        self.bandwidth_mbps = 20
+        self.base_latency_ms = 3
+        self.socket = zmq.Context.instance().socket(zmq.PAIR)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.bind(f'tcp://127.0.0.1:{port}')
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _serve(self):
+        while not self._stop_event.is_set():
+            if not self.socket.poll(100):
+                continue
+            msg_json = self.socket.recv_json()
+            if msg_json['terminate_flag']:
+                continue
+            payload = self.socket.recv(copy=False)
+            time.sleep(2 * self.base_latency_ms / 1000 + len(payload.buffer) * 8 / (self.bandwidth_mbps * 1e6))
+            self.socket.send_json({'return_type': 'dict', 'data': {'received_bytes': len(payload.buffer)}})
+
+    def close(self):
+        self._stop_event.set()
+        self._thread.join()
+        self.socket.close()
+
+def synthetic_frame(i, size=(640, 480)):
+    y, x = np.mgrid[0:size[1], 0:size[0]]
+    frame = np.empty((size[1], size[0], 3), dtype=np.uint8)
+    frame[..., 0] = (x + 4 * i) % 256
+    frame[..., 1] = (y + 2 * i) % 256
+    frame[..., 2] = ((x // 40 + y // 40 + i // 10) % 2) * 200
+    return frame
+
+def run_case(mode, seconds_per_phase, frames, link, server):
+    controller = adaptive_video.AdaptiveQualityController(ADAPTIVE_OPTIONS)
+    results = []
+    i = 0
+    for name, bandwidth_mbps, base_latency_ms in LINK_PHASES:
+        link.bandwidth_mbps, link.base_latency_ms = bandwidth_mbps, base_latency_ms
+        rtts = []
+        sent_bytes = 0
+        phase_end = time.monotonic() + seconds_per_phase
+        next_frame_time = 0
+        while time.monotonic() < phase_end:
+            if mode == 'adaptive':
+                wait = next_frame_time - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                next_frame_time = time.monotonic() + controller.frame_interval
+                payload = adaptive_video.encode_frame(frames[i % len(frames)], controller.quality, controller.scale)
+            else:
+                payload = adaptive_video.encode_frame(frames[i % len(frames)], ADAPTIVE_OPTIONS['quality_range'][1], 1)
+            send_start = time.perf_counter()
+            server.send(frame=payload, message={'frame': i})
+            rtt = time.perf_counter() - send_start
+            if mode == 'adaptive':
+                controller.update(rtt, payload.nbytes)
+            rtts.append(rtt * 1000)
+            sent_bytes += payload.nbytes
+            i += 1
+        results.append({'phase': name, 'bandwidth_mbps': bandwidth_mbps, 'fps': round(len(rtts) / seconds_per_phase, 1),
+                        'rtt_ms_p50': round(float(np.percentile(rtts, 50)), 1), 'rtt_ms_p99': round(float(np.percentile(rtts, 99)), 1),
+                        'kbytes_per_frame': round(sent_bytes / len(rtts) / 1000, 1),
+                        'operating_point': controller.operating_point() if mode == 'adaptive' else None})
+    return {'mode': mode, 'phases': results}
+
+def main():
+    seconds_per_phase = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    frames = [synthetic_frame(i) for i in range(30)]
+    link = DelayedLinkReceiver(VIDEO_PORT).start()
+    # as server_data_process sends adaptive video: NetGear forwards the JPEG bytes without its own compression
+    server = NetGear(address='127.0.0.1', port=VIDEO_PORT, protocol='tcp', logging=False, bidirectional_mode=True,
+                     jpeg_compression=False)
+    results = [run_case(mode, seconds_per_phase, frames, link, server) for mode in ('fixed', 'adaptive')]
+    server.close()
+    link.close()
+    print(json.dumps({'benchmark': 'adaptive_video', 'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+# Runs run_benchmark.py for the camera paths of video_process: raw frames rotated on the PC (the previous path), raw
+# frames rotated by libcamera, and the hardware MJPEG and H.264 encoders (stub encoders of sim_modules, H.264 needs
+# PyAV and is skipped without it). Reports fps, the bytes sent over the link per frame (loopback counter, the same measure
+# for every path), the RaspberryPi CPU per process and in total, the PC display process CPU and the glass-to-glass latency.
+# Usage: python bench_camera_encoder.py [--seconds 15] [--size 640 480]
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+import importlib.util
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CASES = {
+    'raw_pc_rotation': ['pi.camera_config.rotation=0'],
+    'raw_camera_rotation': ['pi.camera_config.rotation=180'],
+    'mjpeg_encoder': ['pi.camera_config.rotation=180', 'pi.camera_config.encoder="mjpeg"'],
+    'h264_encoder': ['pi.camera_config.rotation=180', 'pi.camera_config.encoder="h264"'],
+}
+
+def run_case(name, overrides, args, work_dir):
+    output = os.path.join(work_dir, f'{name}.json')
+    command = [sys.executable, os.path.join(BENCH_DIR, 'run_benchmark.py'), '--seconds', str(args.seconds),
+               '--size', *map(str, args.size), '--output', output]
+    for override in overrides + ['pi.adaptive_video.enabled=false', 'pi.tile_video.enabled=false']:
+        command += ['--set', override]
+    subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+    with open(output, 'r') as file:
+        result = json.load(file)
+    pi_processes = result['processes']['pi']
+    return {'case': name, 'fps': result['fps'], 'link_bytes_per_frame': result['link_bytes_per_frame'],
+            'pi_cpu_percent': round(sum(process['cpu_percent'] for process in pi_processes.values()), 1),
+            'pi_process_cpu_percent': {process: pi_processes[process]['cpu_percent']
+                                       for process in ('server_data_process', 'video_process') if process in pi_processes},
+            'pc_client_data_process_cpu_percent': result['processes']['pc'].get('client_data_process', {}).get('cpu_percent'),
+            'glass_to_glass_ms': {key: (result['latency'] or {}).get('glass_to_glass', {}).get(key) for key in ('p50_ms', 'p99_ms')}}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=15)
+    parser.add_argument('--size', type=int, nargs=2, default=(640, 480))
+    args = parser.parse_args()
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for name, overrides in CASES.items():
+            if name == 'h264_encoder' and importlib.util.find_spec('av') is None:
+                results.append({'case': name, 'skipped': 'PyAV not installed'})
+                continue
+            results.append(run_case(name, overrides, args, work_dir))
+    print(json.dumps({'benchmark': 'camera_encoder', 'seconds': args.seconds, 'size': list(args.size), 'cpus': os.cpu_count(),
+                      'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+# Command snapshots of a synthetic driving trace as dicts (the previous format) and as binary command packets.
+# Per snapshot: size on each hop (Manager pickle, NetGear return_data JSON, control channel message), PC encode cost
+# (build + Manager pickle + wire format), robot decode cost (wire format + CommandMailbox pickle) and the
+# GPIOController apply on gpiozero's MockFactory.
+# Usage: python bench_command_codec.py [reads]
+
+import os
+import sys
+import json
+import time
+import pickle
+import logging
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+# the Pi directory goes first, both sides have control_channel and command_codec modules
+sys.path[:0] = [os.path.join(BENCH_DIR, 'sim_modules'), os.path.join(BENCH_DIR, '..', 'Raspi_robo_client'),
+                os.path.join(BENCH_DIR, '..', 'PC_robo_server')]
+from sim_launch import install_mock_gpio
+install_mock_gpio()
+from bench_utils import load_side_module
+from controller import Controller, ControllerTransformer
+from replay_gamepad import ReplayGamepad, synthetic_drive_trace
+
+robo_client = load_side_module('pi', 'robo_client')
+pc_codec = load_side_module('pc', 'command_codec')
+logging.disable(logging.INFO)
+
+SESSION = 'a1b2c3d4'
+
+def load_configs():
+    with open(os.path.join(BENCH_DIR, '..', 'PC_robo_server', 'configs.json'), 'r') as file:
+        return json.load(file)
+
+def command_snapshots(trace, controls_GPIO):
+    controller = Controller(gamepad=ReplayGamepad(trace))
+    ctrltrans = ControllerTransformer(controls_GPIO)
+    snapshots = []
+    for _ in trace:
+        if ctrltrans.transform_batch(controller.process_events()):
+            snapshots.append(dict(ctrltrans.last_transformed_values))
+    return snapshots
+
+def encode_dict(values, event_ns):
+    ctrl_proc_msg = {'CTime_ID': time.monotonic_ns(), 'GPIO_command': dict(values), 'trace': {'event_ns': event_ns}}
+    manager_bytes = pickle.dumps(ctrl_proc_msg)
+    ctrl_proc_msg = pickle.loads(manager_bytes)
+    return_data = dict(ctrl_proc_msg, session=SESSION)
+    return manager_bytes, json.dumps(return_data).encode(), json.dumps(dict(ctrl_proc_msg, session=SESSION, seq=1)).encode()
+
+def encode_packet(encoder, values, event_ns):
+    packet = encoder.encode(values, event_ns=event_ns)
+    manager_bytes = pickle.dumps(packet)
+    packet = pickle.loads(manager_bytes)
+    return_data = {'command_packet': pc_codec.to_text(packet), 'session': SESSION}
+    return manager_bytes, json.dumps(return_data).encode(), pc_codec.stamp_send(packet, time.monotonic_ns())
+
+def decode(netgear_bytes):
+    # server_data_process gets the JSON return_data, the CommandMailbox pickles it to GPIO_process
+    return pickle.loads(pickle.dumps(json.loads(netgear_bytes), protocol=pickle.HIGHEST_PROTOCOL))
+
+def summary_us(samples_ns):
+    samples_us = np.asarray(samples_ns) / 1000
+    return {'mean': round(float(samples_us.mean()), 2), 'p50': round(float(np.percentile(samples_us, 50)), 2),
+            'p99': round(float(np.percentile(samples_us, 99)), 2)}
+
+def run_case(fmt, snapshots, GPIO_setups):
+    setups_id = time.monotonic_ns()
+    encoder = pc_codec.CommandEncoder(list(GPIO_setups), setups_id)
+    gpio_controller = robo_client.GPIOController({})
+    gpio_controller.update_config({'CTime_ID': setups_id, 'GPIO_setups': GPIO_setups, 'device_index': list(GPIO_setups)})
+    sizes = {'manager_pickle': [], 'netgear_return_data': [], 'control_channel': []}
+    encode_ns, decode_ns, apply_ns = [], [], []
+    for values in snapshots:
+        event_ns = time.monotonic_ns()
+        start = time.perf_counter_ns()
+        if fmt == 'dict':
+            messages = encode_dict(values, event_ns)
+        else:
+            messages = encode_packet(encoder, values, event_ns)
+        encode_ns.append(time.perf_counter_ns() - start)
+        for key, message in zip(sizes, messages):
+            sizes[key].append(len(message))
+        start = time.perf_counter_ns()
+        received = decode(messages[1])
+        decode_ns.append(time.perf_counter_ns() - start)
+        start = time.perf_counter_ns()
+        gpio_controller.update_config(received)
+        apply_ns.append(time.perf_counter_ns() - start)
+    applied = dict(gpio_controller.applied_values)
+    gpio_controller.close_all_devices()
+    return {'format': fmt, 'snapshots': len(snapshots),
+            'bytes': {key: round(float(np.mean(values)), 1) for key, values in sizes.items()},
+            'pc_encode_us': summary_us(encode_ns), 'robot_decode_us': summary_us(decode_ns),
+            'gpio_apply_us': summary_us(apply_ns), 'final_outputs': {key: round(value, 3) for key, value in applied.items()}}
+
+def main():
+    reads = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    configs = load_configs()
+    snapshots = command_snapshots(synthetic_drive_trace(reads), configs['controls_GPIO'])
+    results = [run_case(fmt, snapshots, configs['GPIO_setups']) for fmt in ('dict', 'packet')]
+    print(json.dumps({'benchmark': 'command_codec', 'devices': len(configs['GPIO_setups']), 'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# Compares the deepcopy busy-loop over the Manager dict with CommandMailbox for the GPIO process.
+# Reports the GPIO process CPU while idle and the command-to-actuation latency at a steady command rate.
+# Usage: python bench_command_mailbox.py [idle_seconds] [commands] [command_hz]
+
+import os
+import sys
+import json
+import time
+import multiprocessing
+import numpy as np
+from copy import deepcopy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Raspi_robo_client'))
+from command_mailbox import CommandMailbox
+
+def actuate(received_data, latencies):
+    # stand-in for GPIOController.update_config
+    if received_data and 'sent_ns' in received_data:
+        latencies.append(time.monotonic_ns() - received_data['sent_ns'])
+
+def busy_loop_gpio(shared, idle_seconds, results):
+    latencies = []
+    last_sent = None
+    idle_end = time.monotonic() + idle_seconds
+    idle_cpu = None
+    cpu_start = time.process_time()
+    while True:
+        local_received = deepcopy(shared['received_data'])
+        if idle_cpu is None and time.monotonic() >= idle_end:
+            idle_cpu = time.process_time() - cpu_start
+        if local_received.get('stop'):
+            break
+        # the original loop re-applies every iteration, only count each command once
+        if local_received.get('sent_ns') != last_sent:
+            last_sent = local_received.get('sent_ns')
+            actuate(local_received, latencies)
+    results.put({'idle_cpu': idle_cpu, 'latencies': latencies})
+
+def mailbox_gpio(command_mailbox, idle_seconds, results):
+    latencies = []
+    version = 0
+    cpu_start = time.process_time()
+    idle_end = time.monotonic() + idle_seconds
+    idle_cpu = None
+    while True:
+        timeout = idle_end - time.monotonic() if idle_cpu is None else None
+        if timeout is not None and timeout <= 0:
+            idle_cpu = time.process_time() - cpu_start
+            continue
+        version, received_data = command_mailbox.wait(version, timeout)
+        if any(each_received.get('stop') for each_received in received_data):
+            break
+        for each_received in received_data:
+            actuate(each_received, latencies)
+    results.put({'idle_cpu': idle_cpu, 'latencies': latencies})
+
+def run_case(path, idle_seconds, commands, command_hz):
+    results = multiprocessing.Queue()
+    if path == 'manager_busy_loop':
+        manager = multiprocessing.Manager()
+        shared = manager.dict(received_data={})
+        publish = lambda data: shared.__setitem__('received_data', data)
+        process = multiprocessing.Process(target=busy_loop_gpio, args=(shared, idle_seconds, results))
+    else:
+        manager = None
+        command_mailbox = CommandMailbox()
+        publish = command_mailbox.publish
+        process = multiprocessing.Process(target=mailbox_gpio, args=(command_mailbox, idle_seconds, results))
+    process.start()
+    time.sleep(idle_seconds + 0.2)
+    for i in range(commands):
+        publish({'CTime_ID': i, 'GPIO_command': {'wheels_Left': 0.5, 'wheels_Right': 0.5}, 'sent_ns': time.monotonic_ns()})
+        time.sleep(1 / command_hz)
+    publish({'stop': True})
+    result = results.get()
+    process.join()
+    if manager is not None:
+        manager.shutdown()
+    latencies_us = np.array(result['latencies']) / 1000
+    return {'path': path, 'idle_cpu_percent': round(100 * result['idle_cpu'] / idle_seconds, 1),
+            'commands_applied': len(latencies_us),
+            'latency_us_p50': round(float(np.percentile(latencies_us, 50)), 1) if len(latencies_us) else None,
+            'latency_us_p99': round(float(np.percentile(latencies_us, 99)), 1) if len(latencies_us) else None}
+
+def main():
+    idle_seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    commands = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    command_hz = float(sys.argv[3]) if len(sys.argv) > 3 else 100
+    results = [run_case(path, idle_seconds, commands, command_hz) for path in ('manager_busy_loop', 'mailbox')]
+    print(json.dumps({'benchmark': 'command_mailbox', 'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
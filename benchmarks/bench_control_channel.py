@@ -0,0 +1,118 @@
+# Command latency over loopback while NetGear streams video at full load.
+# 'netgear_return_data' piggybacks commands on client.recv() like robo_server.py does without a control channel,
+# 'control_channel' sends them with ControlSender / ControlReceiver next to the same video stream.
+# Usage: python bench_control_channel.py [seconds] [command_hz] [width] [height]
+
+import sys
+import json
+import queue
+import time
+import threading
+import multiprocessing
+import numpy as np
+from vidgear.gears import NetGear
+
+from bench_utils import load_side_module, percentiles_us
+
+VIDEO_PORT = '58964'
+CONTROL_PORT = '58965'
+
+def pi_video_sender(size, stop, results):
+    server = NetGear(address='127.0.0.1', port=VIDEO_PORT, protocol='tcp', logging=False, bidirectional_mode=True)
+    frame = np.random.default_rng(0).integers(0, 255, size=(size[1], size[0], 3), dtype=np.uint8)
+    frames = 0
+    seen_seqs = set()
+    latencies = []
+    start = time.monotonic()
+    while not stop.is_set():
+        recv_data = server.send(frame=frame, message={'frame': frames})
+        frames += 1
+        if recv_data and recv_data.get('seq') not in seen_seqs:
+            seen_seqs.add(recv_data['seq'])
+            latencies.append(time.monotonic_ns() - recv_data['sent_ns'])
+    server.close()
+    results.put({'video_fps': round(frames / (time.monotonic() - start), 1), 'return_data_commands': len(seen_seqs), 'return_data_latencies': latencies})
+
+def pi_control_receiver(stop, results):
+    control_channel = load_side_module('pi', 'control_channel')
+    receiver = control_channel.ControlReceiver({'address': '127.0.0.1', 'port': CONTROL_PORT})
+    latencies = []
+    while not stop.is_set():
+        snapshot = receiver.recv(timeout_ms=100)
+        if snapshot is not None:
+            latencies.append(time.monotonic_ns() - snapshot['sent_ns'])
+    receiver.close()
+    results.put({'control_channel_commands': len(latencies), 'control_channel_latencies': latencies, 'stale_snapshots': receiver.stale_snapshots})
+
+def pc_side(mode, command_hz, stop):
+    client = NetGear(address='127.0.0.1', port=VIDEO_PORT, protocol='tcp', receive_mode=True, logging=False, bidirectional_mode=True)
+    latest_command = {'msg': None}
+    if mode == 'control_channel':
+        control_channel = load_side_module('pc', 'control_channel')
+        control_sender = control_channel.ControlSender({'port': CONTROL_PORT})
+
+    def command_generator():
+        seq = 0
+        while not stop.is_set():
+            seq += 1
+            ctrl_proc_msg = {'CTime_ID': seq, 'GPIO_command': {'wheels_Left': 0.5, 'wheels_Right': -0.5}, 'seq': seq, 'sent_ns': time.monotonic_ns()}
+            if mode == 'control_channel':
+                control_sender.send(ctrl_proc_msg)
+            else:
+                latest_command['msg'] = ctrl_proc_msg
+            time.sleep(1 / command_hz)
+
+    generator = threading.Thread(target=command_generator, daemon=True)
+    generator.start()
+    while not stop.is_set():
+        client.recv(return_data=latest_command['msg'])
+    client.close()
+    generator.join()
+
+def collect_results(results, processes, count, timeout_s=30):
+    # a process that crashed never reports, fail instead of waiting for it
+    merged = {}
+    deadline = time.monotonic() + timeout_s
+    while count:
+        try:
+            merged.update(results.get(timeout=0.5))
+            count -= 1
+        except queue.Empty:
+            failed = [p.name for p in processes if p.exitcode not in (None, 0)]
+            if failed or time.monotonic() > deadline:
+                for p in processes:
+                    p.terminate()
+                raise RuntimeError(f'Benchmark processes failed: {failed or "timed out"}')
+    return merged
+
+def run_case(mode, seconds, command_hz, size):
+    stop = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=pc_side, args=(mode, command_hz, stop), name='pc_side'),
+                 multiprocessing.Process(target=pi_video_sender, args=(size, stop, results), name='pi_video_sender')]
+    if mode == 'control_channel':
+        processes.append(multiprocessing.Process(target=pi_control_receiver, args=(stop, results), name='pi_control_receiver'))
+    for p in processes:
+        p.start()
+    time.sleep(seconds)
+    stop.set()
+    merged = collect_results(results, processes, len(processes) - 1)
+    for p in processes:
+        p.join(timeout=10)
+        if p.is_alive():
+            p.terminate()
+    latencies = merged.pop('control_channel_latencies', None) if mode == 'control_channel' else merged.get('return_data_latencies')
+    merged.pop('return_data_latencies', None)
+    merged.update({'mode': mode, 'size': list(size), 'commands_sent_per_s': command_hz,
+                   'command_latency_us': percentiles_us(latencies or [])})
+    return merged
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    command_hz = float(sys.argv[2]) if len(sys.argv) > 2 else 100
+    size = (int(sys.argv[3]), int(sys.argv[4])) if len(sys.argv) > 4 else (1280, 720)
+    results = [run_case(mode, seconds, command_hz, size) for mode in ('netgear_return_data', 'control_channel')]
+    print(json.dumps({'benchmark': 'control_channel', 'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# Replays a synthetic DS4 trace through Controller / ControllerTransformer.
+# Compares the single last_event path with the batched transform_batch path: events per second,
+# event-to-command latency and how often the published command missed part of a read.
+# Usage: python bench_controller_events.py [reads]
+
+import os
+import sys
+import json
+import math
+import time
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'PC_robo_server'))
+from controller import Controller, ControllerTransformer
+from replay_gamepad import ReplayGamepad, synthetic_drive_trace
+
+def load_controls_GPIO():
+    with open(os.path.join(BENCH_DIR, '..', 'PC_robo_server', 'configs.json'), 'r') as file:
+        return json.load(file)['controls_GPIO']
+
+def run_case(path, trace):
+    controller = Controller(gamepad=ReplayGamepad(trace))
+    ctrltrans = ControllerTransformer(load_controls_GPIO())
+    reference = ControllerTransformer(load_controls_GPIO())
+    latencies = []
+    applied = {}
+    stale_commands = 0
+    events = sum(len(read) for read in trace)
+    start = time.perf_counter()
+    for _ in trace:
+        read_ns = time.monotonic_ns()
+        if path == 'last_event':
+            controller.process_events()
+            GPIO_command = ctrltrans.transform_ep(controller.last_event) if controller.last_event else ctrltrans.last_transformed_values
+        else:
+            changed_values = ctrltrans.transform_batch(controller.process_events())
+            GPIO_command = dict(ctrltrans.last_transformed_values) if changed_values else None
+        latencies.append(time.monotonic_ns() - read_ns)
+        if GPIO_command:
+            applied.update(GPIO_command)
+        # reference transforms every control state, the robot side should match it after each read
+        reference.transform_batch(dict(controller.controls_states))
+        if any(not math.isclose(applied.get(name, 0), value, abs_tol=1e-9) for name, value in reference.last_transformed_values.items()):
+            stale_commands += 1
+    elapsed = time.perf_counter() - start
+    latencies_us = np.array(latencies) / 1000
+    return {'path': path, 'reads': len(trace), 'events_per_s': round(events / elapsed),
+            'latency_us_p50': round(float(np.percentile(latencies_us, 50)), 2),
+            'latency_us_p99': round(float(np.percentile(latencies_us, 99)), 2),
+            'stale_command_percent': round(100 * stale_commands / len(trace), 2)}
+
+def main():
+    reads = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    trace = synthetic_drive_trace(reads)
+    results = [run_case(path, trace) for path in ('last_event', 'batched')]
+    print(json.dumps({'benchmark': 'controller_events', 'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+# Replays the synthetic DS4 trace through ControllerTransformer.transform_batch and through the previous implementation
+# kept below (normalization_func / XY_transformation called through the transform_json partials for every event), and
+# runs TransformTable.transform on the state vector after every read, one vector at a time and as one (reads, controls)
+# array. Reports transforms (reads) per second of every path and checks that they give exactly the same outputs, on the
+# controls_GPIO of configs.json and on random configs with asymmetric ranges and unequal max_turn_LR.
+# Usage: python bench_controller_transform.py [reads]
+
+import os
+import sys
+import copy
+import json
+import time
+import random
+from functools import partial
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'PC_robo_server'))
+from controller import Controller, ControllerTransformer
+from replay_gamepad import ReplayGamepad, synthetic_drive_trace
+
+def load_controls_GPIO():
+    with open(os.path.join(BENCH_DIR, '..', 'PC_robo_server', 'configs.json'), 'r') as file:
+        return json.load(file)['controls_GPIO']
+
+class PreviousTransformer(object):
+    """ControllerTransformer.transform_batch before the compiled TransformTable, the reference of this benchmark."""
+    def __init__(self, transform_json):
+        self.transform_json = copy.deepcopy(transform_json)
+        self.last_transformed_values = {}
+        pairs = {}
+        for key, ctrl_json in self.transform_json.items():
+            if ctrl_json['used_funct'] == 'normalization_func':
+                ctrl_json['funct'] = partial(self.normalization_func, ctrl_json=ctrl_json)
+            elif ctrl_json['used_funct'] == 'exact_func':
+                ctrl_json['funct'] = lambda key_value: key_value[1]
+            elif ctrl_json['used_funct'] == 'XYfunct':
+                ctrl_json['funct'] = pairs.setdefault(ctrl_json['return_name'], self.XY_transformation()).XY_transformed
+                ctrl_json['funct'](ctrl_json={key: ctrl_json})
+
+    @staticmethod
+    def normalization_func(key_value, ctrl_json):
+        return ctrl_json['output_range']["min"] + (key_value[1] - ctrl_json['ctrl_range']['min']) / (ctrl_json['ctrl_range']["max"] - ctrl_json['ctrl_range']['min']) * (ctrl_json['output_range']["max"] - ctrl_json['output_range']["min"])
+
+    class XY_transformation(object):
+        def __init__(self):
+            self.ctrl_json = {}
+            self.X_value = 0
+            self.Y_value = 0
+
+        def XY_transformed(self, key_value=None, ctrl_json=None):
+            if ctrl_json is not None:
+                self.ctrl_json.update(ctrl_json)
+                (name, axis_json), = ctrl_json.items()
+                if axis_json['XYfunct_axis'] == 'X':
+                    self.X_name = name
+                else:
+                    self.Y_name = name
+                self.max_turn_L, self.max_turn_R = axis_json['max_turn_LR']
+                self.return_name_prefix = axis_json['return_name']
+                return
+            if self.X_name == key_value[0]:
+                self.X_value = PreviousTransformer.normalization_func(key_value, self.ctrl_json[key_value[0]])
+            elif self.Y_name == key_value[0]:
+                self.Y_value = PreviousTransformer.normalization_func(key_value, self.ctrl_json[key_value[0]])
+            if self.X_value >= 0:
+                if self.Y_value >= 0:
+                    return {f"{self.return_name_prefix}_Left": self.Y_value, f"{self.return_name_prefix}_Right": self.Y_value - self.max_turn_R * self.X_value}
+                else:
+                    return {f"{self.return_name_prefix}_Left": self.Y_value, f"{self.return_name_prefix}_Right": self.Y_value + self.max_turn_R * self.X_value}
+            else:
+                if self.Y_value >= 0:
+                    return {f"{self.return_name_prefix}_Left": self.Y_value + self.max_turn_L * self.X_value, f"{self.return_name_prefix}_Right": self.Y_value}
+                else:
+                    return {f"{self.return_name_prefix}_Left": self.Y_value - self.max_turn_L * self.X_value, f"{self.return_name_prefix}_Right": self.Y_value}
+
+    def transform_batch(self, event_dict):
+        previous_values = dict(self.last_transformed_values)
+        for key, value in event_dict.items():
+            if key in self.transform_json:
+                transformed_value = self.transform_json[key]['funct']((key, value))
+                if "return_only_value" in self.transform_json[key] and self.transform_json[key]["return_only_value"]:
+                    self.last_transformed_values.update(transformed_value)
+                else:
+                    self.last_transformed_values[self.transform_json[key]['return_name']] = transformed_value
+        return {name: value for name, value in self.last_transformed_values.items()
+                if name not in previous_values or previous_values[name] != value}
+
+def random_controls_GPIO(rng):
+    # asymmetric and reversed ranges, unequal turn factors, wheels returned as values or nested under return_name
+    def ranges():
+        low = rng.randint(-40000, 1000)
+        output = sorted([rng.uniform(-1, 1), rng.uniform(-1, 1)], reverse=rng.random() < 0.5)
+        return {'ctrl_range': {'min': low, 'max': low + rng.randint(1, 70000)}, 'output_range': {'min': output[0], 'max': output[1]}}
+    max_turn_LR = [rng.uniform(0, 1), rng.uniform(0, 1)]
+    return_only_value = rng.random() < 0.5
+    return {'Absolute-ABS_RX': dict(ranges(), return_name='servo', used_funct='normalization_func'),
+            'Key-BTN_WEST': {'return_name': 'led', 'used_funct': 'exact_func'},
+            'Absolute-ABS_X': dict(ranges(), return_name='wheels', used_funct='XYfunct', XYfunct_axis='X',
+                                   max_turn_LR=max_turn_LR, return_only_value=return_only_value),
+            'Absolute-ABS_Y': dict(ranges(), return_name='wheels', used_funct='XYfunct', XYfunct_axis='Y',
+                                   max_turn_LR=max_turn_LR, return_only_value=return_only_value)}
+
+def mismatched_reads(controls_GPIO, reads):
+    previous, compiled = PreviousTransformer(controls_GPIO), ControllerTransformer(copy.deepcopy(controls_GPIO))
+    mismatches = 0
+    for read in reads:
+        changed = (previous.transform_batch(read), compiled.transform_batch(read))
+        mismatches += changed[0] != changed[1] or previous.last_transformed_values != compiled.last_transformed_values
+    return mismatches
+
+def flat_outputs(last_transformed_values):
+    # XYfunct outputs not returned as values are nested under their return_name
+    outputs = {}
+    for name, value in last_transformed_values.items():
+        if isinstance(value, dict):
+            outputs.update(value)
+        else:
+            outputs[name] = value
+    return outputs
+
+def state_vectors(table, reads):
+    states = {}
+    vectors = []
+    for read in reads:
+        states.update(read)
+        vectors.append(table.state_vector(states))
+    return np.array(vectors)
+
+def vectorized_mismatched_reads(controls_GPIO, reads):
+    # the outputs of transform() after every read against the writers, an output is compared once all its controls were
+    # read (the state vector holds 0 for the others, the writers hold an unmoved XY axis at 0 after normalization)
+    compiled = ControllerTransformer(copy.deepcopy(controls_GPIO))
+    table = compiled.table
+    output_controls = ([[table.controls[row]] for row in table.direct_rows] +
+                       2 * [[table.controls[X_row], table.controls[Y_row]] for X_row, Y_row in zip(table.X_rows, table.Y_rows)])
+    seen = set()
+    mismatches = 0
+    for read, outputs in zip(reads, table.transform(state_vectors(table, reads)).tolist()):
+        compiled.transform_batch(read)
+        seen.update(read)
+        values = flat_outputs(compiled.last_transformed_values)
+        mismatches += any(values[name] != value for name, value, controls in zip(table.outputs, outputs, output_controls)
+                          if seen.issuperset(controls))
+    return mismatches
+
+def record_reads(reads):
+    # merged events of each read, the gamepad side is not measured
+    controller = Controller(gamepad=ReplayGamepad(synthetic_drive_trace(reads)))
+    return [dict(controller.process_events()) for _ in range(reads)]
+
+def timed(transformer_class, controls_GPIO, reads, repeat=5):
+    best = None
+    for _ in range(repeat):
+        ctrltrans = transformer_class(copy.deepcopy(controls_GPIO))
+        start = time.perf_counter()
+        for read in reads:
+            ctrltrans.transform_batch(read)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def timed_call(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+def main():
+    read_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    controls_GPIO = load_controls_GPIO()
+    reads = record_reads(read_count)
+    rng = random.Random(0)
+    random_mismatches = {'compiled': 0, 'vectorized': 0}
+    for _ in range(50):
+        random_reads = [{rng.choice(('Absolute-ABS_RX', 'Key-BTN_WEST', 'Absolute-ABS_X', 'Absolute-ABS_Y')): rng.randint(-40000, 40000)
+                         for _ in range(rng.randint(1, 3))} for _ in range(400)]
+        random_config = random_controls_GPIO(rng)
+        random_mismatches['compiled'] += mismatched_reads(random_config, random_reads)
+        random_mismatches['vectorized'] += vectorized_mismatched_reads(random_config, random_reads)
+    events = sum(len(read) for read in reads)
+    results = []
+    for path, transformer_class in (('previous', PreviousTransformer), ('compiled', ControllerTransformer)):
+        elapsed = timed(transformer_class, controls_GPIO, reads)
+        results.append({'path': path, 'transforms_per_s': round(read_count / elapsed), 'events_per_s': round(events / elapsed),
+                        'us_per_transform': round(1e6 * elapsed / read_count, 3)})
+    table = ControllerTransformer(copy.deepcopy(controls_GPIO)).table
+    vectors = state_vectors(table, reads)
+    for path, function in (('vectorized_single', lambda: [table.transform(vector) for vector in vectors]),
+                           ('vectorized_array', lambda: table.transform(vectors))):
+        elapsed = min(timed_call(function) for _ in range(5))
+        results.append({'path': path, 'transforms_per_s': round(read_count / elapsed), 'events_per_s': None,
+                        'us_per_transform': round(1e6 * elapsed / read_count, 3)})
+    print(json.dumps({'benchmark': 'controller_transform', 'reads': read_count, 'events': events,
+                      'mismatched_reads': {'configs.json': {'compiled': mismatched_reads(controls_GPIO, reads),
+                                                            'vectorized': vectorized_mismatched_reads(controls_GPIO, reads)},
+                                           'random_configs': random_mismatches},
+                      'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+# Kills and restores the robot link and measures failover. The robot's NetGear connects through a TCP proxy on loopback;
+# killing the proxy drops every connection and refuses new ones until it is restored.
+# Reports per outage: kill -> actuators stopped by the watchdog, kill/restore -> first frame through the link again,
+# whether the robot applied GPIO_setups again on resume and how often the PC reconnected.
+# Usage: python bench_failover.py [--outages 1 3 6] [--seconds-between 5]
+
+import os
+import json
+import time
+import socket
+import shutil
+import argparse
+import datetime
+import tempfile
+import threading
+
+from run_benchmark import benchmark_configs, run_sides
+
+class LinkProxy(object):
+    """TCP proxy from listen_port to target_port that can be killed and restored, stamps frame-sized robot-to-PC chunks."""
+    def __init__(self, listen_port, target_port):
+        self.listen_port = listen_port
+        self.target_port = target_port
+        self.frame_chunk_times = []
+        self._connections = []
+        self._lock = threading.Lock()
+        self._listener = None
+        self.restore()
+
+    def restore(self):
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(('127.0.0.1', self.listen_port))
+        self._listener.listen()
+        threading.Thread(target=self._accept, args=(self._listener,), daemon=True).start()
+
+    def kill(self):
+        # shutdown wakes the accept() blocked in the other thread, close alone would leave the socket listening
+        try:
+            self._listener.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._listener.close()
+        with self._lock:
+            for connection in self._connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                connection.close()
+            self._connections = []
+
+    def _accept(self, listener):
+        while True:
+            try:
+                robot_side, _ = listener.accept()
+            except OSError:
+                return
+            try:
+                pc_side = socket.create_connection(('127.0.0.1', self.target_port))
+            except OSError:
+                # the PC is between two NetGear connections, the robot retries
+                robot_side.close()
+                continue
+            with self._lock:
+                self._connections += [robot_side, pc_side]
+            threading.Thread(target=self._pump, args=(robot_side, pc_side, True), daemon=True).start()
+            threading.Thread(target=self._pump, args=(pc_side, robot_side, False), daemon=True).start()
+
+    def _pump(self, source, destination, from_robot):
+        try:
+            while True:
+                chunk = source.recv(65536)
+                if not chunk:
+                    break
+                if from_robot and len(chunk) >= 1000:
+                    self.frame_chunk_times.append(time.time())
+                destination.sendall(chunk)
+        except OSError:
+            pass
+
+def log_times(log_path, text):
+    """Wall clock times of the log lines containing text, robo_client.py logs as [%Y-%m-%d %H:%M:%S,mmm]."""
+    times = []
+    with open(log_path, 'r', errors='replace') as log:
+        for line in log:
+            if text in line and line.startswith('['):
+                stamp = datetime.datetime.strptime(line[1:24], '%Y-%m-%d %H:%M:%S,%f')
+                times.append(stamp.timestamp())
+    return times
+
+def first_after(times, start):
+    later = [each_time for each_time in times if each_time >= start]
+    return round(later[0] - start, 3) if later else None
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--outages', type=float, nargs='+', default=[1, 3, 6])
+    parser.add_argument('--seconds-between', type=float, default=8)
+    parser.add_argument('--warmup', type=float, default=4)
+    parser.add_argument('--size', type=int, nargs=2, default=(320, 240))
+    parser.add_argument('--camera-fps', type=float, default=30)
+    parser.add_argument('--port', type=int, default=58974)
+    parser.add_argument('--proxy-port', type=int, default=58984)
+    parser.add_argument('--log-dir', help='keep pc.log and pi.log here')
+    args = parser.parse_args()
+    args.set = []
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        configs = benchmark_configs(args, work_dir)
+        configs['pi']['netgear_options']['port'] = str(args.proxy_port)
+        configs['pi']['netgear_options']['logging'] = True
+        proxy = LinkProxy(args.proxy_port, args.port)
+        outages = []
+
+        def kill_and_restore():
+            for outage_s in args.outages:
+                time.sleep(args.seconds_between / 2)
+                kill_time = time.time()
+                proxy.kill()
+                time.sleep(outage_s)
+                restore_time = time.time()
+                proxy.restore()
+                outages.append((outage_s, kill_time, restore_time))
+                time.sleep(args.seconds_between / 2)
+
+        def start_outages():
+            threading.Thread(target=kill_and_restore, daemon=True).start()
+
+        seconds = sum(args.outages) + args.seconds_between * len(args.outages) + 2
+        env = dict(os.environ, SIM_CAMERA_FPS=str(args.camera_fps))
+        trace_stats, _, _ = run_sides(configs, work_dir, seconds, args.warmup, env, on_warm=start_outages)
+        pi_log = os.path.join(work_dir, 'pi.log')
+        watchdog_trips = log_times(pi_log, 'Watchdog: no data from the PC')
+        setups_applied = log_times(pi_log, 'Output set with=')
+        if args.log_dir:
+            os.makedirs(args.log_dir, exist_ok=True)
+            for side in ('pc', 'pi'):
+                shutil.copy(os.path.join(work_dir, f'{side}.log'), args.log_dir)
+        results = []
+        for outage_s, kill_time, restore_time in outages:
+            results.append({'outage_s': outage_s,
+                            'kill_to_actuators_stopped_s': first_after(watchdog_trips, kill_time),
+                            'kill_to_first_frame_s': first_after(proxy.frame_chunk_times, kill_time + 0.05),
+                            'restore_to_first_frame_s': first_after(proxy.frame_chunk_times, restore_time),
+                            'setups_reapplied': sum(1 for each_time in setups_applied if each_time >= kill_time)})
+    print(json.dumps({'benchmark': 'failover', 'watchdog': configs['pi'].get('watchdog'),
+                      'heartbeat': configs['pc'].get('heartbeat'),
+                      'netgear_retry': {key: configs['pi']['netgear_options'].get(key) for key in ('request_timeout', 'max_retries')},
+                      'fps': trace_stats.get('fps'), 'outages': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# Loopback scaling of the fleet server: one simulated PC fleet server driving 1, 4 and 8 simulated robots,
+# each robot a separate robo_client.py on its own NetGear port. Reports total fps, per-robot fps,
+# per-robot command latency (send_to_apply) and the CPU of the PC process.
+# Usage: python bench_fleet.py [--robots 1 4 8] [--seconds 15] [--size 320 240]
+
+import os
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+from run_benchmark import PI_CONFIG, PC_CONFIG, load_json, write_json, launch, ProcessSampler
+
+def fleet_configs(robots, args, work_dir):
+    pc_configs = load_json(PC_CONFIG)
+    pc_configs['netgear_options'].update(address='127.0.0.1', logging=False)
+    pc_configs['tracing'] = {'enabled': True, 'overlay': False}
+    pc_configs['fleet'] = {'enabled': True, 'stats_interval_s': 1, 'stats_path': os.path.join(work_dir, 'fleet_stats.json'),
+                           'robots': [{'name': f'robot_{i}', 'netgear_options': {'port': str(args.port + 10 * i)}, 'gamepad': 0}
+                                      for i in range(robots)]}
+    pi_configs = []
+    for i in range(robots):
+        pi_config = load_json(PI_CONFIG)
+        pi_config['netgear_options'].update(address='127.0.0.1', port=str(args.port + 10 * i), logging=False)
+        pi_config['camera_config']['size'] = list(args.size)
+        pi_configs.append(pi_config)
+    return pc_configs, pi_configs
+
+def run_case(robots, args):
+    with tempfile.TemporaryDirectory() as work_dir:
+        pc_configs, pi_configs = fleet_configs(robots, args, work_dir)
+        pid_dir = os.path.join(work_dir, 'pids')
+        os.makedirs(pid_dir)
+        env = dict(os.environ, SIM_CAMERA_FPS=str(args.camera_fps))
+        launched = {}
+        config_path = os.path.join(work_dir, 'pc_config.json')
+        write_json(pc_configs, config_path)
+        launched['pc'] = launch('pc', config_path, pid_dir, env)
+        for i, pi_config in enumerate(pi_configs):
+            config_path = os.path.join(work_dir, f'pi_{i}_config.json')
+            write_json(pi_config, config_path)
+            launched[f'pi_{i}'] = launch('pi', config_path, pid_dir, env)
+        sampler = ProcessSampler({'pc': launched['pc']})
+        try:
+            time.sleep(args.warmup)
+            end = time.monotonic() + args.seconds
+            while time.monotonic() < end:
+                sampler.sample()
+                time.sleep(0.5)
+            sampler.sample()
+            time.sleep(1.5)
+        finally:
+            for popen in launched.values():
+                try:
+                    popen.communicate(input=b'\n', timeout=15)
+                except subprocess.TimeoutExpired:
+                    popen.kill()
+        stats_path = pc_configs['fleet']['stats_path']
+        stats = load_json(stats_path) if os.path.exists(stats_path) else {'robots': {}, 'total_fps': None}
+        per_robot = {name: {'fps': robot['fps'], 'frames_dropped': robot['frames_dropped'],
+                            'send_to_apply_ms': {key: robot['latency']['send_to_apply'][key] for key in ('p50_ms', 'p99_ms')}}
+                     for name, robot in stats['robots'].items()}
+        return {'robots': robots, 'total_fps': stats['total_fps'], 'per_robot': per_robot,
+                'pc_processes': sampler.report(pid_dir).get('pc')}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--robots', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--seconds', type=float, default=15)
+    parser.add_argument('--warmup', type=float, default=5)
+    parser.add_argument('--size', type=int, nargs=2, default=(320, 240))
+    parser.add_argument('--camera-fps', type=float, default=30)
+    parser.add_argument('--port', type=int, default=59100)
+    args = parser.parse_args()
+    results = [run_case(robots, args) for robots in args.robots]
+    print(json.dumps({'benchmark': 'fleet', 'size': list(args.size), 'camera_fps': args.camera_fps, 'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
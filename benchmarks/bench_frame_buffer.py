@@ -0,0 +1,101 @@
+# Compares the Manager dict frame hand-off with FrameRingBuffer between a producer (video_process) and a consumer (server_data_process).
+# Usage: python bench_frame_buffer.py [seconds_per_case]
+
+import os
+import sys
+import json
+import time
+import resource
+import multiprocessing
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Raspi_robo_client'))
+from frame_buffer import FrameRingBuffer
+
+SIZES = [(640, 480), (1280, 720)]
+
+def synthetic_frames(shape, count=8):
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, size=shape, dtype=np.uint8) for _ in range(count)]
+
+def manager_producer(shared, shape, stop):
+    frames = synthetic_frames(shape)
+    i = 0
+    while not stop.is_set():
+        i += 1
+        # the sequence number travels with the frame, every read unpickles a new array
+        shared['video_frame'] = (i, frames[i % len(frames)])
+
+def manager_consumer(shared, stop, result):
+    count = 0
+    last_seq = 0
+    while not stop.is_set():
+        seq, frame = shared['video_frame']
+        if frame is None or seq == last_seq:
+            continue
+        last_seq = seq
+        int(frame[::64, ::64, 0].sum())
+        count += 1
+    result.value = count
+
+def ring_producer(frame_buffer, stop):
+    frames = synthetic_frames(frame_buffer.shape)
+    i = 0
+    while not stop.is_set():
+        frame_buffer.write(frames[i % len(frames)])
+        i += 1
+
+def ring_consumer(frame_buffer, stop, result):
+    count = 0
+    last_seq = 0
+    while not stop.is_set():
+        seq, frame = frame_buffer.read_latest()
+        if frame is None or seq == last_seq:
+            time.sleep(0.0001)
+            continue
+        last_seq = seq
+        int(frame[::64, ::64, 0].sum())
+        count += 1
+    result.value = count
+
+def children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def run_case(path, size, seconds):
+    shape = (size[1], size[0], 3)
+    stop = multiprocessing.Event()
+    result = multiprocessing.Value('q', 0)
+    cpu_before = children_cpu()
+    if path == 'manager':
+        manager = multiprocessing.Manager()
+        shared = manager.dict(video_frame=(0, None))
+        processes = [multiprocessing.Process(target=manager_producer, args=(shared, shape, stop)),
+                     multiprocessing.Process(target=manager_consumer, args=(shared, stop, result))]
+    else:
+        manager = None
+        frame_buffer = FrameRingBuffer(shape)
+        processes = [multiprocessing.Process(target=ring_producer, args=(frame_buffer, stop)),
+                     multiprocessing.Process(target=ring_consumer, args=(frame_buffer, stop, result))]
+    for p in processes:
+        p.start()
+    time.sleep(seconds)
+    stop.set()
+    for p in processes:
+        p.join()
+    if manager is not None:
+        manager.shutdown()
+    else:
+        frame_buffer.close()
+        frame_buffer.unlink()
+    cpu = children_cpu() - cpu_before
+    return {'path': path, 'size': list(size), 'fps': round(result.value / seconds, 1),
+            'cpu_s_per_s': round(cpu / seconds, 3), 'cpu_ms_per_frame': round(1000 * cpu / max(result.value, 1), 3)}
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    results = [run_case(path, size, seconds) for size in SIZES for path in ('manager', 'ring_buffer')]
+    print(json.dumps({'benchmark': 'frame_buffer', 'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
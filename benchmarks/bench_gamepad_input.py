@@ -0,0 +1,89 @@
+# GamepadInput with replayed gamepads: two pads polled at 250 Hz plus one that is unplugged and plugged back.
+# Reports polling rate and jitter per gamepad, read-to-consumer latency of the event queue, the time from plugging the
+# gamepad back in to its first delivered event, the latter also for the previous Controller loop (sleeps 1 s on unplug).
+# Usage: python bench_gamepad_input.py [seconds]
+
+import os
+import sys
+import json
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(BENCH_DIR, 'sim_modules'), os.path.join(BENCH_DIR, '..', 'PC_robo_server')]
+import inputs
+from controller import Controller
+from gamepad_input import GamepadInput
+from replay_gamepad import ReplayGamepad, synthetic_drive_trace
+from bench_utils import percentiles_us
+
+POLL_HZ = 250
+
+class HotplugGamepad(ReplayGamepad):
+    """Replays a trace while plugged, read() raises UnpluggedError while unplugged like a pulled USB cable."""
+    def __init__(self, trace):
+        super().__init__(trace, loop=True, read_interval=1 / POLL_HZ)
+        self.plugged = True
+        self.name = 'Hotplug Replay Gamepad'
+
+    def read(self):
+        if not self.plugged:
+            raise inputs.UnpluggedError('gamepad unplugged')
+        return super().read()
+
+def run_gamepad_input(seconds, trace):
+    gamepads = [ReplayGamepad(trace, loop=True, read_interval=1 / POLL_HZ) for _ in range(2)]
+    hotplug = HotplugGamepad(trace)
+    scan = lambda: gamepads + ([hotplug] if hotplug.plugged else [])
+    gamepad_input = GamepadInput({'rescan_interval_s': 0.25, 'max_gamepads': 4}, scan_gamepads=scan).start()
+    delivery_ns = []
+    unplug_time = time.monotonic() + seconds / 3
+    replug_time = unplug_time + 1.5
+    replug_ns = None
+    replug_to_event_ns = None
+    hotplug_slot = None
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        now = time.monotonic()
+        if hotplug.plugged and unplug_time <= now < replug_time:
+            hotplug.plugged = False
+        elif not hotplug.plugged and now >= replug_time and replug_ns is None:
+            hotplug.plugged = True
+            replug_ns = time.monotonic_ns()
+        gamepad_read = gamepad_input.get(timeout=0.01)
+        if gamepad_read is None:
+            continue
+        slot, events, read_ns = gamepad_read
+        delivery_ns.append(time.monotonic_ns() - read_ns)
+        if hotplug_slot is None and slot == 2:
+            hotplug_slot = slot
+        if replug_ns and replug_to_event_ns is None and slot == hotplug_slot and read_ns > replug_ns:
+            replug_to_event_ns = time.monotonic_ns() - replug_ns
+    summary = gamepad_input.summary()
+    gamepad_input.stop()
+    return {'path': 'gamepad_input', 'queue_delivery_us': percentiles_us(delivery_ns),
+            'replug_to_first_event_ms': round(replug_to_event_ns / 1e6, 1) if replug_to_event_ns else None, **summary}
+
+def run_legacy_controller(seconds, trace):
+    # the previous controller_process loop: one Controller, process_events() in a loop
+    hotplug = HotplugGamepad(trace)
+    controller = Controller(gamepad=hotplug)
+    unplug_time = time.monotonic() + seconds / 3
+    replug_time = unplug_time + 1.5
+    replug_to_event_ns = None
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        now = time.monotonic()
+        hotplug.plugged = not (unplug_time <= now < replug_time)
+        if controller.process_events() and now >= replug_time and replug_to_event_ns is None:
+            replug_to_event_ns = time.monotonic_ns() - int(replug_time * 1e9)
+    return {'path': 'legacy_controller',
+            'replug_to_first_event_ms': round(replug_to_event_ns / 1e6, 1) if replug_to_event_ns else None}
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 6
+    trace = synthetic_drive_trace(int(POLL_HZ * seconds))
+    results = [run_gamepad_input(seconds, trace), run_legacy_controller(seconds, trace)]
+    print(json.dumps({'benchmark': 'gamepad_input', 'poll_hz': POLL_HZ, 'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
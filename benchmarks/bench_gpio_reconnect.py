@@ -0,0 +1,71 @@
+# Measures what a reconnect costs on the robot: the PC resends GPIO_setups with a new CTime_ID and then the next command.
+# Compares rebuilding every device (the previous behaviour) with the incremental reconfiguration on gpiozero's MockFactory:
+# reconnect-to-first-command time, pin writes and how many outputs were reset away from their driving value meanwhile.
+# Usage: python bench_gpio_reconnect.py [reconnects]
+
+import os
+import sys
+import json
+import time
+import logging
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(BENCH_DIR, 'sim_modules'), os.path.join(BENCH_DIR, '..', 'Raspi_robo_client')]
+from sim_launch import install_mock_gpio
+install_mock_gpio()
+from bench_utils import load_side_module, percentiles_us, PinWriteCounter
+
+robo_client = load_side_module('pi', 'robo_client')
+logging.disable(logging.INFO)
+
+DRIVING_COMMAND = {'servo_horizontal': 0.5, 'servo_vertical': -0.25, 'led_blue': 1, 'led_red': 0,
+                   'wheels_Left': 0.8, 'wheels_Right': 0.6}
+
+class RebuildAllGPIOController(robo_client.GPIOController):
+    """The previous behaviour: every device is closed and created again on each GPIO_setups."""
+    def _setup_gpio(self):
+        self.close_all_devices()
+        super()._setup_gpio()
+
+def load_setups():
+    with open(os.path.join(BENCH_DIR, '..', 'PC_robo_server', 'configs.json'), 'r') as file:
+        return json.load(file)['GPIO_setups']
+
+def output_values(gpio_controller):
+    values = {}
+    for device_name, device in gpio_controller.devices.items():
+        gpiozero_device = getattr(device, 'servo', None) or getattr(device, 'output_device', None) or device.motor
+        values[device_name] = gpiozero_device.value
+    return values
+
+def run_case(path, reconnects, setups, pin_writes):
+    controller_class = RebuildAllGPIOController if path == 'rebuild_all' else robo_client.GPIOController
+    gpio_controller = controller_class({'CTime_ID': 0, 'GPIO_setups': setups})
+    CTime_ID = 1
+    gpio_controller.update_config({'CTime_ID': CTime_ID, 'GPIO_command': DRIVING_COMMAND})
+    driving_values = output_values(gpio_controller)
+    durations = []
+    reset_outputs = 0
+    pin_writes.writes = 0
+    for _ in range(reconnects):
+        CTime_ID += 1
+        start = time.perf_counter_ns()
+        gpio_controller.update_config({'CTime_ID': CTime_ID, 'GPIO_setups': setups})
+        reset_outputs += sum(value != driving_values[name] for name, value in output_values(gpio_controller).items())
+        CTime_ID += 1
+        gpio_controller.update_config({'CTime_ID': CTime_ID, 'GPIO_command': DRIVING_COMMAND})
+        durations.append(time.perf_counter_ns() - start)
+    gpio_controller.close_all_devices()
+    return {'path': path, 'reconnects': reconnects, 'reconnect_to_first_command_us': percentiles_us(durations),
+            'pin_writes_per_reconnect': round(pin_writes.writes / reconnects, 1),
+            'outputs_reset_per_reconnect': round(reset_outputs / reconnects, 2)}
+
+def main():
+    reconnects = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    setups = load_setups()
+    pin_writes = PinWriteCounter()
+    results = [run_case(path, reconnects, setups, pin_writes) for path in ('rebuild_all', 'incremental')]
+    print(json.dumps({'benchmark': 'gpio_reconnect', 'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# Replays a synthetic driving trace through ControllerTransformer and GPIOController on gpiozero's MockFactory.
+# Compares writing every device on every command (the previous behaviour) with the delta-only path:
+# pin writes per second, commands per second and pigpio connections opened for two GPIO_setups of configs.json.
+# Usage: python bench_gpio_writes.py [reads]
+
+import os
+import sys
+import json
+import time
+import logging
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+# the Pi directory goes first, both sides have a control_channel module
+sys.path[:0] = [os.path.join(BENCH_DIR, 'sim_modules'), os.path.join(BENCH_DIR, '..', 'Raspi_robo_client'),
+                os.path.join(BENCH_DIR, '..', 'PC_robo_server')]
+from sim_launch import install_mock_gpio
+install_mock_gpio()
+from bench_utils import load_side_module, PinWriteCounter
+from controller import Controller, ControllerTransformer
+from replay_gamepad import ReplayGamepad, synthetic_drive_trace
+
+robo_client = load_side_module('pi', 'robo_client')
+# GPIOController logs every command, keep the output readable
+logging.disable(logging.INFO)
+
+class FactoryCounter(object):
+    def __init__(self):
+        self.created = 0
+        self._factory = robo_client.PiGPIOFactory
+        robo_client.PiGPIOFactory = self
+
+    def __call__(self, *args, **kwargs):
+        self.created += 1
+        return self._factory(*args, **kwargs)
+
+def load_configs():
+    with open(os.path.join(BENCH_DIR, '..', 'PC_robo_server', 'configs.json'), 'r') as file:
+        return json.load(file)
+
+def command_snapshots(trace, controls_GPIO):
+    controller = Controller(gamepad=ReplayGamepad(trace))
+    ctrltrans = ControllerTransformer(controls_GPIO)
+    snapshots = []
+    for _ in trace:
+        if ctrltrans.transform_batch(controller.process_events()):
+            snapshots.append(dict(ctrltrans.last_transformed_values))
+    return snapshots
+
+class PreviousGPIOController(robo_client.GPIOController):
+    """The previous behaviour: one pigpio connection per device, every device rebuilt on setups and written on every command."""
+    def _setup_gpio(self):
+        self.close_all_devices()
+        super()._setup_gpio()
+
+    def _device_kwargs(self, config_kwargs):
+        device_kwargs = dict(config_kwargs)
+        if device_kwargs.pop('pigiofactory', False):
+            device_kwargs['pin_factory'] = robo_client.PiGPIOFactory()
+        return device_kwargs
+
+    def control(self):
+        for device_name, action in self.config['GPIO_command'].items():
+            self.devices[device_name].set_value(action)
+
+def run_case(path, snapshots, configs, pin_writes, factories):
+    controller_class = PreviousGPIOController if path == 'every_device' else robo_client.GPIOController
+    factories.created = 0
+    gpio_controller = controller_class({'CTime_ID': 0, 'GPIO_setups': configs['GPIO_setups']})
+    # setups again with a new CTime_ID, as after a reconnect, to show whether the pigpio connections are reused
+    gpio_controller.update_config({'CTime_ID': 1, 'GPIO_setups': configs['GPIO_setups']})
+    pin_writes.writes = 0
+    start = time.perf_counter()
+    for i, GPIO_command in enumerate(snapshots):
+        gpio_controller.update_config({'CTime_ID': 2 + i, 'GPIO_command': GPIO_command})
+    elapsed = time.perf_counter() - start
+    gpio_controller.close_all_devices()
+    return {'path': path, 'commands': len(snapshots), 'commands_per_s': round(len(snapshots) / elapsed),
+            'pin_writes': pin_writes.writes, 'pin_writes_per_command': round(pin_writes.writes / len(snapshots), 2),
+            'pin_writes_per_s': round(pin_writes.writes / elapsed), 'pigpio_connections_two_setups': factories.created}
+
+def main():
+    reads = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    configs = load_configs()
+    snapshots = command_snapshots(synthetic_drive_trace(reads), configs['controls_GPIO'])
+    pin_writes, factories = PinWriteCounter(), FactoryCounter()
+    results = [run_case(path, snapshots, configs, pin_writes, factories) for path in ('every_device', 'delta_only')]
+    print(json.dumps({'benchmark': 'gpio_writes', 'reads': reads, 'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
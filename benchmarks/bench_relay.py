@@ -0,0 +1,87 @@
+# End-to-end run with the relay enabled and 0 or 10 MJPEG viewers attached (half of them slow readers).
+# Shows PC CPU, robot-side latency (capture_to_send, send_to_recv) and what the viewers received.
+# Usage: python bench_relay.py [--viewers 0 10] [--seconds 15] [--raw]  (--raw: NetGear JPEG, the relay encodes once)
+
+import os
+import json
+import time
+import argparse
+import tempfile
+import threading
+import urllib.request
+
+from run_benchmark import benchmark_configs, run_sides
+
+class MJPEGViewer(object):
+    """Reads the multipart MJPEG stream, a slow viewer pauses after every frame."""
+    def __init__(self, url, frame_delay_s=0):
+        self.url = url
+        self.frame_delay_s = frame_delay_s
+        self.frames = 0
+        self.bytes = 0
+        self.start = None
+        self.stopped = False
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        try:
+            stream = urllib.request.urlopen(self.url, timeout=10)
+        except OSError:
+            return
+        self.start = time.monotonic()
+        while not self.stopped:
+            line = stream.readline()
+            if not line:
+                break
+            if line.lower().startswith(b'content-length:'):
+                length = int(line.split(b':')[1])
+                stream.readline()
+                self.bytes += len(stream.read(length))
+                self.frames += 1
+                if self.frame_delay_s:
+                    time.sleep(self.frame_delay_s)
+
+    def fps(self):
+        return round(self.frames / (time.monotonic() - self.start), 1) if self.start else 0
+
+def run_case(viewer_count, args):
+    with tempfile.TemporaryDirectory() as work_dir:
+        args.set = [] if args.raw else ['pi.adaptive_video.enabled=true']
+        configs = benchmark_configs(args, work_dir)
+        configs['pc']['relay'] = {'enabled': True, 'http_port': args.http_port, 'zmq_port': None, 'queue_size': 2}
+        viewers = []
+
+        def attach_viewers():
+            for i in range(viewer_count):
+                viewers.append(MJPEGViewer(f'http://127.0.0.1:{args.http_port}/stream', 0.2 if i % 2 else 0))
+
+        env = dict(os.environ, SIM_CAMERA_FPS=str(args.camera_fps))
+        trace_stats, processes, _ = run_sides(configs, work_dir, args.seconds, args.warmup, env, on_warm=attach_viewers)
+        viewer_fps = [viewer.fps() for viewer in viewers]
+        for viewer in viewers:
+            viewer.stopped = True
+    latency = trace_stats.get('latency', {})
+    pc_processes = processes.get('pc', {})
+    return {'viewers': viewer_count, 'fps': trace_stats.get('fps'),
+            'pc_cpu_percent': round(sum(process['cpu_percent'] or 0 for process in pc_processes.values()), 1),
+            'client_data_process_cpu_percent': pc_processes.get('client_data_process', {}).get('cpu_percent'),
+            'capture_to_send_ms': {key: latency.get('capture_to_send', {}).get(key) for key in ('p50_ms', 'p99_ms')},
+            'send_to_recv_ms': {key: latency.get('send_to_recv', {}).get(key) for key in ('p50_ms', 'p99_ms')},
+            'fast_viewer_fps': viewer_fps[0::2], 'slow_viewer_fps': viewer_fps[1::2]}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--viewers', type=int, nargs='+', default=[0, 10])
+    parser.add_argument('--seconds', type=float, default=15)
+    parser.add_argument('--warmup', type=float, default=4)
+    parser.add_argument('--size', type=int, nargs=2, default=(640, 480))
+    parser.add_argument('--camera-fps', type=float, default=30)
+    parser.add_argument('--port', type=int, default=58974)
+    parser.add_argument('--http-port', type=int, default=58990)
+    parser.add_argument('--raw', action='store_true')
+    args = parser.parse_args()
+    results = [run_case(viewer_count, args) for viewer_count in args.viewers]
+    print(json.dumps({'benchmark': 'relay', 'payload': 'netgear_raw' if args.raw else 'robot_jpeg', 'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# Tile video (only changed tiles plus keyframes) against a full JPEG per frame on synthetic camera sequences:
+# static scene with sensor noise, slow pan (1 px per frame) and fast motion (16 px per frame plus moving blocks).
+# Reports bytes per second at the camera rate, encode CPU on the robot, decode CPU on the PC and the PSNR of the
+# frame the PC shows against the camera frame.
+# Usage: python bench_tile_video.py [frames] [--size 640 480]
+
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import cv2
+
+from bench_utils import SIDE_DIRS, load_side_module
+
+# tile_video imports adaptive_video from its own directory
+sys.path.insert(0, SIDE_DIRS['pi'])
+adaptive_video = load_side_module('pi', 'adaptive_video')
+tile_video = load_side_module('pi', 'tile_video')
+frame_pipeline = load_side_module('pc', 'frame_pipeline')
+
+CAMERA_FPS = 30
+TILE_OPTIONS = {'tile_size': 32, 'threshold': 3, 'keyframe_interval': 60, 'max_changed_fraction': 0.6, 'quality': 80}
+
+def scene(width, height, rng):
+    # smooth shading with hard edged objects, wide enough to pan across
+    texture = cv2.resize(rng.integers(0, 256, (height // 32 + 1, width // 32 + 1, 3), dtype=np.uint8), (width, height),
+                         interpolation=cv2.INTER_CUBIC)
+    for _ in range(width // 40):
+        x, y = int(rng.integers(0, width - 60)), int(rng.integers(0, height - 60))
+        color = tuple(int(value) for value in rng.integers(0, 256, 3))
+        cv2.rectangle(texture, (x, y), (x + int(rng.integers(10, 60)), y + int(rng.integers(10, 60))), color, -1)
+    return texture
+
+def sequence(name, frames, size, seed=1):
+    width, height = size
+    rng = np.random.default_rng(seed)
+    pan_step = {'static': 0, 'slow_pan': 1, 'fast_motion': 16}[name]
+    background = scene(width + pan_step * frames + 1, height, rng)
+    for i in range(frames):
+        frame = background[:, pan_step * i:pan_step * i + width].copy()
+        if name == 'fast_motion':
+            for block in range(4):
+                x = (37 * i + 150 * block) % (width - 64)
+                y = (23 * i + 90 * block) % (height - 64)
+                frame[y:y + 64, x:x + 64] = (60 * block, 255 - 60 * block, 128)
+        # sensor noise, about 1.5 levels standard deviation
+        noise = rng.normal(0, 1.5, frame.shape)
+        yield np.clip(frame + noise, 0, 255).astype(np.uint8)
+
+def psnr(reference, frame):
+    mse = np.mean((reference.astype(np.float32) - frame.astype(np.float32)) ** 2)
+    return 99.0 if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+
+def run_case(name, mode, frames, size):
+    encoder = tile_video.TileDeltaEncoder(TILE_OPTIONS, (size[1], size[0], 3)) if mode == 'tiles' else None
+    assembler = frame_pipeline.TileFrameAssembler()
+    sent_bytes = 0
+    encode_s = decode_s = 0.0
+    psnrs = []
+    for frame in sequence(name, frames, size):
+        start = time.process_time()
+        if encoder:
+            payload, video_params = encoder.encode(frame)
+        else:
+            payload = adaptive_video.encode_frame(frame, TILE_OPTIONS['quality'], 1)
+            video_params = {'encoding': 'jpeg', 'colorspace': 'BGR', 'scale': 1, 'frame_size': list(size)}
+        encode_s += time.process_time() - start
+        sent_bytes += payload.nbytes
+        message = {'video_params': video_params}
+        start = time.process_time()
+        if encoder:
+            shown = assembler.apply(payload, message)
+        else:
+            shown = frame_pipeline.decode_frame(payload, message)
+        decode_s += time.process_time() - start
+        psnrs.append(psnr(frame, shown))
+    result = {'sequence': name, 'mode': mode, 'kbytes_per_s': round(sent_bytes / frames * CAMERA_FPS / 1000, 1),
+              'kbytes_per_frame': round(sent_bytes / frames / 1000, 2),
+              'encode_ms_per_frame': round(encode_s / frames * 1000, 2), 'decode_ms_per_frame': round(decode_s / frames * 1000, 2),
+              'psnr_db_mean': round(float(np.mean(psnrs)), 2), 'psnr_db_min': round(float(np.min(psnrs)), 2)}
+    if encoder:
+        result['keyframes'] = encoder.keyframes
+    return result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('frames', type=int, nargs='?', default=300)
+    parser.add_argument('--size', type=int, nargs=2, default=(640, 480))
+    args = parser.parse_args()
+    results = [run_case(name, mode, args.frames, tuple(args.size))
+               for name in ('static', 'slow_pan', 'fast_motion') for mode in ('full_jpeg', 'tiles')]
+    print(json.dumps({'benchmark': 'tile_video', 'camera_fps': CAMERA_FPS, 'size': args.size, 'tile_options': TILE_OPTIONS,
+                      'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
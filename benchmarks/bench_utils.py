@@ -0,0 +1,50 @@
+import os
+import sys
+import importlib.util
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SIDE_DIRS = {'pc': os.path.join(BENCH_DIR, '..', 'PC_robo_server'),
+             'pi': os.path.join(BENCH_DIR, '..', 'Raspi_robo_client')}
+
+def load_side_module(side, module):
+    """
+    Import module from the PC or Pi directory under a side-prefixed name, both sides use some of the same module names.
+    The side directory is on sys.path while the module loads, its own imports of sibling modules resolve from there.
+    """
+    name = f'{side}_{module}'
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(SIDE_DIRS[side], f'{module}.py'))
+    loaded = importlib.util.module_from_spec(spec)
+    sys.modules[name] = loaded
+    sys.path.insert(0, SIDE_DIRS[side])
+    try:
+        spec.loader.exec_module(loaded)
+    except Exception:
+        del sys.modules[name]
+        raise
+    finally:
+        sys.path.remove(SIDE_DIRS[side])
+    return loaded
+
+def percentiles_us(samples_ns, points=(50, 99)):
+    if not len(samples_ns):
+        return {f'p{point}': None for point in points}
+    samples_us = np.asarray(samples_ns) / 1000
+    return {f'p{point}': round(float(np.percentile(samples_us, point)), 1) for point in points}
+
+class PinWriteCounter(object):
+    """Counts state and frequency writes reaching gpiozero's mock pins, each one is a pigpio call on the robot."""
+    def __init__(self):
+        from gpiozero.pins.mock import MockPin, MockPWMPin
+        self.writes = 0
+        for pin_class in (MockPin, MockPWMPin):
+            for method_name in ('_set_state', '_set_frequency'):
+                setattr(pin_class, method_name, self._counted(getattr(pin_class, method_name)))
+
+    def _counted(self, method):
+        def counted(pin, value):
+            self.writes += 1
+            return method(pin, value)
+        return counted
@@ -0,0 +1,101 @@
+# VisionStage with synthetic frames published at the camera rate: a moving ArUco marker over a floor with a dark line.
+# Plugins: ArucoDetector, LineFollower and a slow analyzer (sleeps like a heavy detector) with one and with two workers.
+# Reports per plugin results per second, skipped frames and lag (frame published -> result), the time VisionStage
+# adds to the display loop, and the frame rate the display loop could reach running the same plugins inline.
+# Usage: python bench_vision.py [seconds] [--fps 30] [--slow-ms 80]
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import cv2
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [BENCH_DIR, os.path.join(BENCH_DIR, '..', 'PC_robo_server')]
+from vision import VisionStage, VisionPlugin, load_plugin
+from command_codec import CommandEncoder
+from bench_utils import percentiles_us
+
+class SlowAnalyzer(VisionPlugin):
+    """Stands in for a heavy detector, sleeps for delay_ms per frame."""
+    def process(self, frame):
+        time.sleep(self.options.get('delay_ms', 80) / 1000)
+        return {'mean': float(frame[::16, ::16].mean())}
+
+def synthetic_frames(count, size=(640, 480)):
+    width, height = size
+    marker = cv2.aruco.generateImageMarker(cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_50), 7, 120)
+    marker = cv2.copyMakeBorder(marker, 20, 20, 20, 20, cv2.BORDER_CONSTANT, value=255)
+    frames = []
+    for i in range(count):
+        frame = np.full((height, width, 3), 170, dtype=np.uint8)
+        line_x = int(width / 2 + width / 4 * np.sin(i / 20))
+        cv2.line(frame, (line_x, height // 2), (width // 2, height), (20, 20, 20), 24)
+        x = int((width - marker.shape[1]) * (0.5 + 0.4 * np.sin(i / 15)))
+        frame[20:20 + marker.shape[0], x:x + marker.shape[1]] = marker[..., None]
+        frames.append(frame)
+    return frames
+
+def run_stage(options, frames, seconds, fps):
+    vision = VisionStage(options)
+    loop_ns = []
+    frame_interval = 1 / fps
+    next_frame_time = time.monotonic()
+    end = next_frame_time + seconds
+    i = 0
+    while time.monotonic() < end:
+        wait = next_frame_time - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        next_frame_time += frame_interval
+        # what client_data_process does per displayed frame
+        frame = frames[i % len(frames)].copy()
+        start = time.perf_counter_ns()
+        vision.publish(frame)
+        vision.poll_results()
+        vision.overlay(frame)
+        loop_ns.append(time.perf_counter_ns() - start)
+        i += 1
+    stats = vision.stats()
+    fresh_results = vision.fresh_results()
+    command_encoder = CommandEncoder(['wheels_Left', 'wheels_Right'], setups_id=1)
+    merged_packet = vision.merge_command(None, command_encoder)
+    vision.close()
+    # the first publish starts the workers
+    return {'display_loop_added': percentiles_us(loop_ns[1:]), 'frames_published': stats['frames_published'],
+            'published_fps': round(stats['frames_published'] / seconds, 1),
+            'last_markers': [marker['id'] for marker in fresh_results.get('ArucoDetector', {}).get('markers', [])],
+            'last_merged_command': dict(zip(command_encoder.devices, command_encoder.decode_values(merged_packet).round(2).tolist())), 'plugins': stats['plugins']}
+
+def run_inline(options, frames, repeat=30):
+    # every plugin in the display loop, one after the other
+    plugins = [load_plugin(dict(plugin_options)) for plugin_options in options['plugins']]
+    start = time.perf_counter()
+    for i in range(repeat):
+        for plugin in plugins:
+            plugin.process(frames[i % len(frames)])
+    per_frame_s = (time.perf_counter() - start) / repeat
+    return {'ms_per_frame': round(per_frame_s * 1000, 2), 'max_fps': round(1 / per_frame_s, 1)}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('seconds', type=float, nargs='?', default=10)
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--slow-ms', type=float, default=80)
+    args = parser.parse_args()
+    frames = synthetic_frames(60)
+    results = []
+    for slow_workers in (1, 2):
+        options = {'enabled': True, 'frame_slots': 4, 'max_result_age_s': 0.5, 'plugins': [
+            {'plugin': 'vision_plugins.ArucoDetector', 'options': {'dictionary': 'DICT_4X4_50'}},
+            {'plugin': 'vision_plugins.LineFollower', 'merge_command': True},
+            {'plugin': 'bench_vision.SlowAnalyzer', 'workers': slow_workers, 'options': {'delay_ms': args.slow_ms}}]}
+        results.append({'slow_analyzer_workers': slow_workers, 'stage': run_stage(options, frames, args.seconds, args.fps),
+                        'inline': run_inline(options, frames)})
+    print(json.dumps({'benchmark': 'vision', 'fps': args.fps, 'seconds': args.seconds, 'cpus': os.cpu_count(),
+                      'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
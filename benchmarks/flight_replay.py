@@ -0,0 +1,100 @@
+# Replays a flight recorder session of robo_client.py: the recorded commands go through GPIOController (gpiozero's
+# MockFactory unless --real-gpio) and the frames through the PC's tile assembly, decode and rotation, shown with
+# --display. The segments are read memory-mapped, at the recorded pace or, with --speed max, as fast as possible, which
+# makes a recorded session a repeatable benchmark input. Prints a JSON summary: records, replay pace, frame decode and
+# GPIO apply costs, the recorded send round trips, watchdog trips and the final outputs.
+# Usage: python flight_replay.py <session_dir> [--speed original|max] [--display] [--real-gpio]
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+# the Pi directory goes first, both sides have a control_channel module
+sys.path[:0] = [os.path.join(BENCH_DIR, '..', 'Raspi_robo_client'), os.path.join(BENCH_DIR, '..', 'PC_robo_server')]
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('session_dir')
+    parser.add_argument('--speed', choices=('original', 'max'), default='original')
+    parser.add_argument('--display', action='store_true')
+    parser.add_argument('--real-gpio', action='store_true', help='drive the GPIO pins of this RaspberryPi')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if not args.real_gpio:
+        sys.path.insert(0, os.path.join(BENCH_DIR, 'sim_modules'))
+        from sim_launch import install_mock_gpio
+        install_mock_gpio()
+    import cv2
+    from bench_utils import load_side_module, percentiles_us
+    robo_client = load_side_module('pi', 'robo_client')
+    flight_recorder = load_side_module('pi', 'flight_recorder')
+    frame_pipeline = load_side_module('pc', 'frame_pipeline')
+    logging.disable(logging.INFO)
+
+    log = flight_recorder.FlightLog(args.session_dir)
+    gpio_controller = robo_client.GPIOController({})
+    tile_assembler = frame_pipeline.TileFrameAssembler()
+    h264_decoder = frame_pipeline.H264FrameDecoder()
+    frame_rotator = frame_pipeline.FrameRotator()
+    counts = {name: 0 for name in flight_recorder.KIND_NAMES.values()}
+    decode_ns, apply_ns, round_trip_ns = [], [], []
+    watchdog_trips = 0
+    setups_in_log = False
+    first_t_ns = last_t_ns = None
+    start_ns = time.monotonic_ns()
+    for kind, t_ns, meta, blob in log.records():
+        if first_t_ns is None:
+            first_t_ns = t_ns
+        last_t_ns = t_ns
+        if args.speed == 'original':
+            wait_s = (t_ns - first_t_ns - (time.monotonic_ns() - start_ns)) / 1e9
+            if wait_s > 0:
+                time.sleep(wait_s)
+        counts[flight_recorder.KIND_NAMES[kind]] += 1
+        if kind == flight_recorder.COMMAND:
+            setups_in_log |= 'GPIO_setups' in meta
+            start = time.perf_counter_ns()
+            gpio_controller.update_config(meta)
+            apply_ns.append(time.perf_counter_ns() - start)
+        elif kind == flight_recorder.FRAME:
+            start = time.perf_counter_ns()
+            frame = h264_decoder.apply(tile_assembler.apply(np.frombuffer(blob, dtype=np.uint8), meta), meta)
+            if frame is None:
+                continue
+            frame = frame_rotator.rotate(frame_pipeline.decode_frame(frame, meta), meta)
+            decode_ns.append(time.perf_counter_ns() - start)
+            if args.display:
+                cv2.imshow('Flight replay', frame)
+                if cv2.waitKey(1) == ord('q'):
+                    break
+        elif 'reply_ns' in meta:
+            round_trip_ns.append(meta['reply_ns'] - meta['send_ns'])
+        elif meta.get('watchdog') == 'tripped':
+            watchdog_trips += 1
+    elapsed_s = (time.monotonic_ns() - start_ns) / 1e9
+    recorded_s = (last_t_ns - first_t_ns) / 1e9 if first_t_ns is not None else 0
+    summary = {'session_dir': args.session_dir, 'streams': {stream: len(paths) for stream, paths in log.streams.items()},
+               'records': counts, 'setups_in_log': setups_in_log, 'speed': args.speed,
+               'recorded_s': round(recorded_s, 2), 'replay_s': round(elapsed_s, 2),
+               'speedup': round(recorded_s / elapsed_s, 1) if elapsed_s else None,
+               'records_per_s': round(sum(counts.values()) / elapsed_s) if elapsed_s else None,
+               'frame_decode_us': percentiles_us(decode_ns), 'gpio_apply_us': percentiles_us(apply_ns),
+               'recorded_send_round_trip_us': percentiles_us(round_trip_ns),
+               'watchdog_trips': watchdog_trips,
+               'command_packets_rejected': gpio_controller.command_decoder.rejected,
+               'final_outputs': {name: round(value, 3) for name, value in gpio_controller.applied_values.items()},
+               'stream_decoders': dict(tile_assembler.stats(), **h264_decoder.stats())}
+    gpio_controller.close_all_devices()
+    if args.display:
+        cv2.destroyAllWindows()
+    print(json.dumps(summary, indent=2))
+
+if __name__ == '__main__':
+    main()
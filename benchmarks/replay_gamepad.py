@@ -0,0 +1,60 @@
+# Gamepad stand-in for the inputs library that replays recorded or synthetic event traces.
+# A trace is a list of reads, each read a list of [ev_type, code, state] like one gamepad.read() result.
+
+import json
+import math
+import time
+from collections import namedtuple
+
+ReplayEvent = namedtuple('ReplayEvent', ['ev_type', 'code', 'state'])
+
+class ReplayGamepad(object):
+    def __init__(self, trace, loop=False, read_interval=0):
+        self.trace = trace
+        self.loop = loop
+        self.read_interval = read_interval
+        self.position = 0
+        self.name = 'Replay Gamepad'
+
+    def read(self):
+        if self.position >= len(self.trace):
+            if not self.loop:
+                raise EOFError
+            self.position = 0
+        if self.read_interval:
+            time.sleep(self.read_interval)
+        events = [ReplayEvent(*event) for event in self.trace[self.position]]
+        self.position += 1
+        return events
+
+def load_trace(path):
+    with open(path, 'r') as file:
+        return json.load(file)
+
+def save_trace(trace, path):
+    with open(path, 'w') as file:
+        json.dump(trace, file)
+
+def record_trace(reads, gamepad=None):
+    """Record reads from a real gamepad, usable later with ReplayGamepad."""
+    if gamepad is None:
+        import inputs
+        gamepad = inputs.devices.gamepads[0]
+    return [[[event.ev_type, event.code, event.state] for event in gamepad.read()] for _ in range(reads)]
+
+def synthetic_drive_trace(reads, poll_hz=250):
+    """DS4-like trace: left stick driving in circles, right stick panning the camera, face buttons toggling, one Sync per read."""
+    trace = []
+    for i in range(reads):
+        t = i / poll_hz
+        read = [['Absolute', 'ABS_X', int(32767 * math.sin(2 * math.pi * 0.5 * t))],
+                ['Absolute', 'ABS_Y', int(32767 * math.cos(2 * math.pi * 0.5 * t))]]
+        if i % 3 == 0:
+            read.append(['Absolute', 'ABS_RX', int(32767 * math.sin(2 * math.pi * 0.2 * t))])
+        if i % 50 == 0:
+            read.append(['Key', 'BTN_WEST', (i // 50) % 2])
+        if i % 125 == 0:
+            read.append(['Key', 'BTN_EAST', (i // 125) % 2])
+        read.append(['Sync', 'SYN_REPORT', 0])
+        trace.append(read)
+    return trace
@@ -0,0 +1,196 @@
+# End-to-end benchmark without a Pi, camera or gamepad: runs robo_server.py and robo_client.py through sim_launch.py
+# over NetGear on loopback and prints fps, bytes per frame, per-process CPU and RSS and the tracing latencies as JSON.
+# Usage: python run_benchmark.py [--seconds 20] [--size 640 480] [--camera-fps 30] [--set pi.adaptive_video.enabled=true] [--output results.json]
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import psutil
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PI_CONFIG = os.path.join(BENCH_DIR, '..', 'Raspi_robo_client', 'config.json')
+PC_CONFIG = os.path.join(BENCH_DIR, '..', 'PC_robo_server', 'configs.json')
+
+def load_json(path):
+    with open(path, 'r') as file:
+        return json.load(file)
+
+def write_json(data, path):
+    with open(path, 'w') as file:
+        json.dump(data, file, indent=2)
+
+def apply_override(configs, override):
+    # "pi.camera_config.size=[1280, 720]" sets configs['pi']['camera_config']['size']
+    path, value = override.split('=', 1)
+    keys = path.split('.')
+    target = configs
+    for key in keys[:-1]:
+        target = target.setdefault(key, {})
+    target[keys[-1]] = json.loads(value)
+
+def benchmark_configs(args, work_dir):
+    pi_configs, pc_configs = load_json(PI_CONFIG), load_json(PC_CONFIG)
+    pi_configs['netgear_options'].update(address='127.0.0.1', port=str(args.port), logging=False)
+    pc_configs['netgear_options'].update(address='127.0.0.1', port=str(args.port), logging=False)
+    pi_configs['camera_config']['size'] = list(args.size)
+    pi_configs.setdefault('control_channel', {}).update(address='127.0.0.1', port=str(args.port + 1))
+    pc_configs.setdefault('control_channel', {}).update(port=str(args.port + 1))
+    pc_configs['tracing'] = {'enabled': True, 'overlay': False, 'dump_interval_s': 1,
+                             'dump_path': os.path.join(work_dir, 'trace_stats.json')}
+    configs = {'pi': pi_configs, 'pc': pc_configs}
+    for override in args.set:
+        apply_override(configs, override)
+    return configs
+
+def launch(side, config_path, pid_dir, env, log_path=None):
+    command = [sys.executable, os.path.join(BENCH_DIR, 'sim_launch.py'), side, config_path, '--pid-dir', pid_dir]
+    if not log_path:
+        return subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env)
+    with open(log_path, 'w') as log:
+        return subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=log, env=env)
+
+def loopback_bytes():
+    # both sides talk over loopback only, so its counter is what crossed the link whatever encoded the frames (NetGear's
+    # JPEG compression included). None where psutil has no loopback counter (Windows)
+    counters = psutil.net_io_counters(pernic=True).get('lo')
+    return counters.bytes_sent if counters else None
+
+class ProcessSampler(object):
+    """Samples CPU time and RSS of each launched side and all of its children."""
+    def __init__(self, launched):
+        self.launched = launched
+        self.first = {}
+        self.last = {}
+        self.rss_peak = {}
+        self.cmdlines = {}
+        self.link_first = None
+        self.link_last = None
+
+    def sample(self):
+        now = time.monotonic()
+        link_bytes = loopback_bytes()
+        if link_bytes is not None:
+            self.link_first = self.link_first or (now, link_bytes)
+            self.link_last = (now, link_bytes)
+        for side, popen in self.launched.items():
+            try:
+                root = psutil.Process(popen.pid)
+                processes = [root] + root.children(recursive=True)
+            except psutil.NoSuchProcess:
+                continue
+            for process in processes:
+                try:
+                    cpu = sum(process.cpu_times()[:2])
+                    rss = process.memory_info().rss
+                except psutil.NoSuchProcess:
+                    continue
+                key = (side, process.pid)
+                if key not in self.first:
+                    self.first[key] = (now, cpu)
+                    self.cmdlines[key] = ' '.join(process.cmdline())
+                self.last[key] = (now, cpu)
+                self.rss_peak[key] = max(self.rss_peak.get(key, 0), rss)
+
+    def link_bytes_per_s(self):
+        if not self.link_first or self.link_last[0] <= self.link_first[0]:
+            return None
+        return (self.link_last[1] - self.link_first[1]) / (self.link_last[0] - self.link_first[0])
+
+    def report(self, pid_dir):
+        names = {}
+        for pid_file in os.listdir(pid_dir):
+            with open(os.path.join(pid_dir, pid_file), 'r') as file:
+                names[int(pid_file)] = file.read()
+        report = {}
+        for (side, pid), (start, cpu_start) in self.first.items():
+            end, cpu_end = self.last[(side, pid)]
+            if pid == self.launched[side].pid:
+                name = 'main'
+            elif pid in names:
+                name = names[pid]
+            else:
+                # helpers started outside multiprocessing.Process, e.g. the resource tracker
+                name = 'resource_tracker' if 'resource_tracker' in self.cmdlines[(side, pid)] else str(pid)
+            report.setdefault(side, {})[name] = {
+                'cpu_percent': round(100 * (cpu_end - cpu_start) / (end - start), 1) if end > start else None,
+                'rss_mb_peak': round(self.rss_peak[(side, pid)] / 2**20, 1)}
+        return report
+
+def run_sides(configs, work_dir, seconds, warmup, env, on_warm=None):
+    """
+    Run both sides with configs, return (trace stats, process report, loopback bytes per second while sampling).
+    on_warm() is called once the warmup is over.
+    The log (stderr) of each side is kept in work_dir as pc.log and pi.log.
+    """
+    pid_dir = os.path.join(work_dir, 'pids')
+    os.makedirs(pid_dir, exist_ok=True)
+    launched = {}
+    for side in ('pc', 'pi'):
+        config_path = os.path.join(work_dir, f'{side}_config.json')
+        write_json(configs[side], config_path)
+        launched[side] = launch(side, config_path, pid_dir, env, os.path.join(work_dir, f'{side}.log'))
+    sampler = ProcessSampler(launched)
+    try:
+        time.sleep(warmup)
+        if on_warm:
+            on_warm()
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            sampler.sample()
+            time.sleep(0.5)
+        sampler.sample()
+        # give the tracer one more dump interval before the processes are terminated
+        time.sleep(configs['pc']['tracing']['dump_interval_s'] + 0.5)
+    finally:
+        for popen in launched.values():
+            try:
+                popen.communicate(input=b'\n', timeout=15)
+            except subprocess.TimeoutExpired:
+                popen.kill()
+    trace_path = configs['pc']['tracing']['dump_path']
+    trace_stats = load_json(trace_path) if os.path.exists(trace_path) else {}
+    return trace_stats, sampler.report(pid_dir), sampler.link_bytes_per_s()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--size', type=int, nargs=2, default=(640, 480))
+    parser.add_argument('--camera-fps', type=float, default=30)
+    parser.add_argument('--gamepad-trace', help='recorded trace, see replay_gamepad.py, synthetic driving trace if omitted')
+    parser.add_argument('--port', type=int, default=58974)
+    parser.add_argument('--set', action='append', default=[], help='config override like pi.adaptive_video.enabled=true')
+    parser.add_argument('--output', help='also write the JSON result to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        configs = benchmark_configs(args, work_dir)
+        env = dict(os.environ, SIM_CAMERA_FPS=str(args.camera_fps))
+        if args.gamepad_trace:
+            env['SIM_GAMEPAD_TRACE'] = os.path.abspath(args.gamepad_trace)
+        trace_stats, processes, link_bytes_per_s = run_sides(configs, work_dir, args.seconds, args.warmup, env)
+        fps = trace_stats.get('fps')
+        result = {'benchmark': 'end_to_end',
+                  'settings': {'seconds': args.seconds, 'size': list(args.size), 'camera_fps': args.camera_fps,
+                               'gamepad_trace': args.gamepad_trace, 'overrides': args.set},
+                  'fps': fps,
+                  'bytes_per_frame': trace_stats.get('bytes_per_frame'),
+                  'link_bytes_per_s': round(link_bytes_per_s) if link_bytes_per_s is not None else None,
+                  'link_bytes_per_frame': round(link_bytes_per_s / fps) if link_bytes_per_s is not None and fps else None,
+                  'frames_received': trace_stats.get('frames_received'),
+                  'frames_displayed': trace_stats.get('frames_displayed'),
+                  'frames_dropped': trace_stats.get('frames_dropped'),
+                  'latency': trace_stats.get('latency'),
+                  'processes': processes}
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output)
+
+if __name__ == '__main__':
+    main()
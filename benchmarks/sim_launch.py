@@ -0,0 +1,64 @@
+# Runs robo_client.py or robo_server.py unchanged on simulated hardware:
+# picamera2 and inputs come from sim_modules, gpiozero uses MockFactory (also for pigiofactory devices),
+# cv2 windows are disabled. Every multiprocessing child writes its pid and target name to --pid-dir.
+# Usage: python sim_launch.py pi|pc <config.json> [--pid-dir DIR]
+
+import os
+import sys
+import argparse
+import runpy
+import types
+import multiprocessing.process
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SIDE_SCRIPTS = {'pi': os.path.join(BENCH_DIR, '..', 'Raspi_robo_client', 'robo_client.py'),
+                'pc': os.path.join(BENCH_DIR, '..', 'PC_robo_server', 'robo_server.py')}
+
+def install_mock_gpio():
+    from gpiozero import Device
+    from gpiozero.pins.mock import MockFactory, MockPWMPin
+    Device.pin_factory = MockFactory(pin_class=MockPWMPin)
+    # gpiozero.pins.pigpio needs the pigpio daemon, every PiGPIOFactory() returns the shared mock factory instead
+    pigpio_pins = types.ModuleType('gpiozero.pins.pigpio')
+    pigpio_pins.PiGPIOFactory = lambda *args, **kwargs: Device.pin_factory
+    sys.modules['gpiozero.pins.pigpio'] = pigpio_pins
+
+def disable_display():
+    import cv2
+    cv2.imshow = lambda *args, **kwargs: None
+    cv2.waitKey = lambda *args, **kwargs: -1
+    cv2.destroyAllWindows = lambda *args, **kwargs: None
+
+def record_process_names(pid_dir):
+    original_run = multiprocessing.process.BaseProcess.run
+
+    def run(self):
+        target = getattr(self, '_target', None)
+        name = getattr(target, '__name__', type(self).__name__).lstrip('_')
+        with open(os.path.join(pid_dir, str(os.getpid())), 'w') as file:
+            file.write(name)
+        original_run(self)
+
+    multiprocessing.process.BaseProcess.run = run
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('side', choices=SIDE_SCRIPTS)
+    parser.add_argument('config')
+    parser.add_argument('--pid-dir')
+    args = parser.parse_args()
+
+    script = os.path.abspath(SIDE_SCRIPTS[args.side])
+    sys.path[:0] = [os.path.join(BENCH_DIR, 'sim_modules'), BENCH_DIR, os.path.dirname(script)]
+    if args.side == 'pi':
+        install_mock_gpio()
+    else:
+        disable_display()
+    if args.pid_dir:
+        record_process_names(args.pid_dir)
+    sys.argv = [script, os.path.abspath(args.config)]
+    os.chdir(os.path.dirname(script))
+    runpy.run_path(script, run_name='__main__')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+# inputs stand-in with one gamepad replaying SIM_GAMEPAD_TRACE, or a synthetic driving trace, at SIM_GAMEPAD_POLL_HZ.
+# DeviceManager() rescans like the real one and finds the same replayed gamepad.
+
+import os
+
+from replay_gamepad import ReplayGamepad, load_trace, synthetic_drive_trace
+
+class UnpluggedError(RuntimeError):
+    pass
+
+def _replayed_gamepads():
+    poll_hz = float(os.environ.get('SIM_GAMEPAD_POLL_HZ', 250))
+    trace_path = os.environ.get('SIM_GAMEPAD_TRACE')
+    trace = load_trace(trace_path) if trace_path else synthetic_drive_trace(int(60 * poll_hz), poll_hz)
+    return [ReplayGamepad(trace, loop=True, read_interval=1 / poll_hz)]
+
+_gamepads = _replayed_gamepads()
+
+class DeviceManager(object):
+    def __init__(self):
+        self.gamepads = list(_gamepads)
+
+devices = DeviceManager()
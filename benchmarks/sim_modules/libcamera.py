@@ -0,0 +1,8 @@
+class Transform(object):
+    def __init__(self, hflip=0, vflip=0, transpose=0):
+        self.hflip = int(hflip)
+        self.vflip = int(vflip)
+        self.transpose = int(transpose)
+
+    def __repr__(self):
+        return f'<libcamera.Transform hflip={self.hflip} vflip={self.vflip} transpose={self.transpose}>'
@@ -0,0 +1,2 @@
+from .picamera2 import Picamera2
+from .request import MappedArray
@@ -0,0 +1,46 @@
+# Stand-ins for picamera2's hardware encoders: every frame of the synthetic camera is encoded once up front, the
+# recording then costs as little CPU as the VideoCore encoder on the RaspberryPi.
+
+import simplejpeg
+
+JPEG_COLORSPACES = {'RGB888': 'BGR', 'BGR888': 'RGB', 'XRGB8888': 'BGRX', 'XBGR8888': 'RGBX'}
+
+class Encoder(object):
+    def __init__(self, bitrate=None):
+        self.bitrate = bitrate
+
+    def encode_all(self, frames, camera_format):
+        """Return [(payload, keyframe)] to repeat in a loop."""
+        raise NotImplementedError
+
+class MJPEGEncoder(Encoder):
+    def encode_all(self, frames, camera_format):
+        colorspace = JPEG_COLORSPACES.get(camera_format, 'BGR')
+        return [(simplejpeg.encode_jpeg(frame, quality=85, colorspace=colorspace), True) for frame in frames]
+
+class H264Encoder(Encoder):
+    """Needs PyAV with libx264, the packets are Annex B with SPS/PPS repeated at every keyframe like the hardware encoder."""
+    def __init__(self, bitrate=None, repeat=True, iperiod=None, **kwargs):
+        super().__init__(bitrate)
+        self.repeat = repeat
+        self.iperiod = iperiod or 30
+
+    def encode_all(self, frames, camera_format):
+        import av
+        height, width = frames[0].shape[:2]
+        codec = av.CodecContext.create('libx264', 'w')
+        codec.width, codec.height, codec.pix_fmt = width, height, 'yuv420p'
+        codec.bit_rate = self.bitrate or 3000000
+        codec.gop_size = self.iperiod
+        codec.max_b_frames = 0
+        codec.options = {'tune': 'zerolatency', 'x264-params': f'repeat-headers={int(self.repeat)}:keyint_min={self.iperiod}:scenecut=0'}
+        pixel_format = {'RGB888': 'bgr24', 'BGR888': 'rgb24', 'XRGB8888': 'bgra', 'XBGR8888': 'rgba'}.get(camera_format, 'bgr24')
+        # a whole number of keyframe periods, the loop restarts at a keyframe
+        count = -(-len(frames) // self.iperiod) * self.iperiod
+        packets = []
+        for i in range(count):
+            video_frame = av.VideoFrame.from_ndarray(frames[i % len(frames)], format=pixel_format)
+            video_frame.pts = i
+            packets.extend(codec.encode(video_frame))
+        packets.extend(codec.encode(None))
+        return [(bytes(packet), packet.is_keyframe) for packet in packets]
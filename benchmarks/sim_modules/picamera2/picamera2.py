@@ -0,0 +1,98 @@
+# Synthetic Picamera2: frames with a moving pattern at the configured size, paced at SIM_CAMERA_FPS.
+# The transform of the configuration flips the frames, start_recording runs a stub encoder from .encoders.
+
+import os
+import time
+import threading
+import numpy as np
+
+from .request import CompletedRequest
+
+CHANNELS = {'RGB888': 3, 'BGR888': 3, 'XRGB8888': 4, 'XBGR8888': 4}
+
+class Picamera2(object):
+    def __init__(self, camera_num=0):
+        self.fps = float(os.environ.get('SIM_CAMERA_FPS', 30))
+        self.camera_config = None
+        self.started = False
+        self._frames = []
+        self._frame_index = 0
+        self._next_frame_time = 0
+        self._recording = None
+
+    def create_preview_configuration(self, main=None, **kwargs):
+        main = dict({'size': (640, 480), 'format': 'XBGR8888'}, **(main or {}))
+        return dict({'main': main}, **kwargs)
+
+    create_video_configuration = create_preview_configuration
+    create_still_configuration = create_preview_configuration
+
+    def configure(self, camera_config):
+        self.camera_config = camera_config
+        width, height = camera_config['main']['size']
+        channels = CHANNELS.get(camera_config['main']['format'], 3)
+        y, x = np.mgrid[0:height, 0:width]
+        self._frames = []
+        for i in range(30):
+            frame = np.empty((height, width, channels), dtype=np.uint8)
+            frame[..., 0] = (x + 8 * i) % 256
+            frame[..., 1] = (y + 4 * i) % 256
+            frame[..., 2:] = (((x + 16 * i) // 64 + y // 64) % 2 * 200)[..., None]
+            self._frames.append(frame)
+        transform = camera_config.get('transform')
+        if transform is not None:
+            # flipped by the sensor on the RaspberryPi, free here as well
+            self._frames = [np.ascontiguousarray(frame[::-1 if transform.vflip else 1, ::-1 if transform.hflip else 1])
+                            for frame in self._frames]
+
+    def start(self, *args, **kwargs):
+        self.started = True
+        self._next_frame_time = time.monotonic()
+
+    def stop(self):
+        self.started = False
+
+    def close(self):
+        self.stop()
+
+    def start_recording(self, encoder, output, *args, **kwargs):
+        encoded = encoder.encode_all(self._frames, self.camera_config['main']['format'])
+        self.start()
+        output.start()
+        stop_event = threading.Event()
+
+        def record():
+            i = 0
+            while not stop_event.is_set():
+                self._wait_for_frame()
+                payload, keyframe = encoded[i % len(encoded)]
+                output.outputframe(payload, keyframe, time.monotonic_ns() // 1000)
+                i += 1
+
+        thread = threading.Thread(target=record, daemon=True)
+        thread.start()
+        self._recording = (stop_event, thread, output)
+
+    def stop_recording(self):
+        if self._recording:
+            stop_event, thread, output = self._recording
+            stop_event.set()
+            thread.join()
+            output.stop()
+            self._recording = None
+        self.stop()
+
+    def _wait_for_frame(self):
+        wait = self._next_frame_time - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self._next_frame_time = max(self._next_frame_time + 1 / self.fps, time.monotonic())
+        frame = self._frames[self._frame_index % len(self._frames)]
+        self._frame_index += 1
+        return frame
+
+    def capture_request(self, *args, **kwargs):
+        return CompletedRequest(self._wait_for_frame(), {'SensorTimestamp': time.monotonic_ns(), 'FrameDuration': int(1e6 / self.fps)})
+
+    def capture_array(self, name='main'):
+        return self._wait_for_frame().copy()
@@ -0,0 +1,25 @@
+class CompletedRequest(object):
+    def __init__(self, frame, metadata):
+        self.frame = frame
+        self.metadata = metadata
+
+    def make_array(self, name='main'):
+        return self.frame.copy()
+
+    def get_metadata(self):
+        return dict(self.metadata)
+
+    def release(self):
+        self.frame = None
+
+class MappedArray(object):
+    def __init__(self, request, stream, write=True):
+        self.request = request
+        self.array = None
+
+    def __enter__(self):
+        self.array = self.request.frame
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.array = None